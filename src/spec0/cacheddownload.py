@@ -1,25 +1,438 @@
+import atexit
+import contextlib
+import datetime
+import importlib
+import json
 import os
 import pathlib
+import re
+import subprocess
+import sys
+import tempfile
+import threading
 import time
 import requests
 
+from spec0.httpsession import get_session
 
-CACHE_DIR = pathlib.Path.home() / ".cache" / "spec0"
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
 
+import logging
 
-def get_file(url: str, cache_path: str, ttl: int = 3600) -> str:
+_logger = logging.getLogger(__name__)
+
+
+CACHE_DIR_ENV = "SPEC0_CACHE_DIR"
+CACHE_DIR = pathlib.Path(
+    os.environ.get(CACHE_DIR_ENV) or pathlib.Path.home() / ".cache" / "spec0"
+)
+_SIZE_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3}
+
+
+def parse_size(size: str) -> int:
+    """Parse a size in bytes, with an optional K, M, or G suffix.
+
+    Raises
+    ------
+    ValueError
+        If ``size`` isn't a size.
+    """
+    size = size.strip().upper().removesuffix("B")
+    unit = size[-1:] if size[-1:] in _SIZE_UNITS else ""
+    try:
+        return int(float(size.removesuffix(unit)) * _SIZE_UNITS[unit])
+    except ValueError:
+        raise ValueError(f"Invalid size: '{size}'")
+
+
+CACHE_MAX_SIZE_ENV = "SPEC0_CACHE_MAX_SIZE"
+DEFAULT_CACHE_MAX_SIZE = 1024**3
+
+
+def _env_cache_max_size() -> int:
+    value = os.environ.get(CACHE_MAX_SIZE_ENV)
+    if not value:
+        return DEFAULT_CACHE_MAX_SIZE
+    try:
+        return parse_size(value)
+    except ValueError as e:
+        _logger.warning(f"Ignoring {CACHE_MAX_SIZE_ENV}: {e}")
+        return DEFAULT_CACHE_MAX_SIZE
+
+
+CACHE_MAX_SIZE = _env_cache_max_size()
+DEFAULT_TTL = 3600
+"""Time-to-live (in seconds) of cached files, if neither we nor the server
+say otherwise."""
+METADATA_SUFFIX = ".meta"
+LOCK_SUFFIX = ".lock"
+INDEX_NAME = "index.json"
+TEMPORARY_FILE_MAX_AGE = 3600
+"""Seconds after which a temporary download file is taken to be left over
+from an interrupted download, and removed by :meth:`CacheIndex.prune`."""
+ACCESS_TIME_RESOLUTION = 3600
+"""Seconds within which another hit on a file doesn't update its access time
+in the cache index."""
+
+_MAX_AGE_RE = re.compile(r"(?:^|,)\s*max-age\s*=\s*\"?(\d+)\"?", re.IGNORECASE)
+
+_REFRESHES = {}
+_REFRESHES_LOCK = threading.Lock()
+_DETACHED_REFRESHES = False
+_REFRESH_CODE = (
+    "import sys; from spec0.cacheddownload import _refresh_main; "
+    "_refresh_main(sys.argv[1])"
+)
+
+# hits that haven't been written to an index yet, by index path
+_PENDING_HITS = {}
+_PENDING_HITS_LOCK = threading.Lock()
+
+
+class OfflineError(Exception):
+    """Raised in offline mode when a file isn't in the cache."""
+
+
+def get_cache_dir() -> pathlib.Path:
+    """Get the cache directory.
+
+    This is ``~/.cache/spec0``, unless overridden by the ``SPEC0_CACHE_DIR``
+    environment variable or :func:`set_cache_dir`.
+    """
+    return CACHE_DIR
+
+
+def set_cache_dir(cache_dir: os.PathLike):
+    """Set the cache directory used by default by all sources."""
+    global CACHE_DIR
+    CACHE_DIR = pathlib.Path(cache_dir)
+
+
+def get_cache_max_size() -> int:
+    """Get the size (in bytes) that the cache is trimmed to as files are added.
+
+    This is 1 GiB, unless overridden by the ``SPEC0_CACHE_MAX_SIZE``
+    environment variable (in bytes, or with a K, M, or G suffix) or
+    :func:`set_cache_max_size`.
+    """
+    return CACHE_MAX_SIZE
+
+
+def set_cache_max_size(max_size: int):
+    """Set the size (in bytes) that the cache is trimmed to."""
+    global CACHE_MAX_SIZE
+    CACHE_MAX_SIZE = max_size
+
+
+def _metadata_path(cache_path) -> str:
+    return f"{cache_path}{METADATA_SUFFIX}"
+
+
+@contextlib.contextmanager
+def cache_lock(cache_path: str):
+    """Hold an exclusive, cross-process lock on a cached file.
+
+    The lock is taken on a separate ``.lock`` file next to the cached file,
+    and blocks until any other holder releases it. The lock is not
+    re-entrant: don't try to take it again while holding it.
+
+    Parameters
+    ----------
+    cache_path : str
+        Path to the cached file (not the lock file).
+    """
+    os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+    with open(f"{cache_path}{LOCK_SUFFIX}", "a+b") as lockfile:
+        if fcntl is not None:
+            fcntl.flock(lockfile.fileno(), fcntl.LOCK_EX)
+        else:  # pragma: no cover
+            lockfile.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(lockfile.fileno(), msvcrt.LK_NBLCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lockfile.fileno(), fcntl.LOCK_UN)
+            else:  # pragma: no cover
+                lockfile.seek(0)
+                msvcrt.locking(lockfile.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextlib.contextmanager
+def atomic_write(path: str, mode: str = "wb"):
+    """Open a temporary file that replaces ``path`` once it is closed.
+
+    Readers of ``path`` see either the old or the new contents, never a
+    partially written file. If an error occurs while writing, ``path`` is
+    left unchanged.
+    """
+    dirname, basename = os.path.split(path)
+    fd, tmp_path = tempfile.mkstemp(dir=dirname, prefix=f".{basename}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
+
+def read_cache_metadata(cache_path: str) -> dict:
+    """Read the HTTP metadata stored alongside a cached file.
+
+    Parameters
+    ----------
+    cache_path : str
+        Path to the cached file (not the metadata file).
+
+    Returns
+    -------
+    dict
+        The stored metadata, with keys ``url``, ``etag``, ``last_modified``,
+        and ``max_age``. Empty if there is no (readable) metadata.
+    """
+    try:
+        with open(_metadata_path(cache_path), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_cache_metadata(cache_path: str, metadata: dict):
+    """Replace the metadata stored alongside a cached file."""
+    with atomic_write(_metadata_path(cache_path), "w") as f:
+        json.dump(metadata, f)
+
+
+def _parse_max_age(cache_control: str | None) -> int | None:
+    """Get the max-age (in seconds) from a Cache-Control header, if any."""
+    if not cache_control:
+        return None
+    match = _MAX_AGE_RE.search(cache_control)
+    if match is None:
+        return None
+    return int(match.group(1))
+
+
+def _cached_metadata(url: str, cache_path: str) -> dict | None:
+    """Metadata for a cached copy of ``url``; None if there's no cached file."""
+    if not os.path.exists(cache_path):
+        return None
+    metadata = read_cache_metadata(cache_path)
+    if metadata.get("url") != url:
+        metadata = {}
+    return metadata
+
+
+def effective_ttl(metadata: dict | None, ttl: float | None) -> float:
+    """Time-to-live (in seconds) of a cached file.
+
+    A ``ttl`` given by the user takes precedence over the server's
+    ``Cache-Control: max-age`` (recorded in the file's ``metadata``); without
+    either, :data:`DEFAULT_TTL` is used.
+    """
+    if ttl is not None:
+        return ttl
+    max_age = (metadata or {}).get("max_age")
+    return DEFAULT_TTL if max_age is None else max_age
+
+
+def _is_fresh(
+    cache_path: str, metadata: dict | None, ttl: float | None, stale: float = 0
+) -> bool:
+    """Whether a cached file is younger than its time-to-live (plus ``stale``)."""
+    if metadata is None:
+        return False
+    file_age = time.time() - os.path.getmtime(cache_path)
+    return file_age < effective_ttl(metadata, ttl) + stale
+
+
+def is_cached(
+    url: str, cache_path: str, ttl: float | None = None, stale: float = 0
+) -> bool:
+    """Whether :func:`get_file` would use the cached copy of ``url`` as is.
+
+    That is, whether it is cached at ``cache_path`` and younger than its
+    time-to-live (see :func:`effective_ttl`), plus ``stale`` seconds.
+    """
+    return _is_fresh(cache_path, _cached_metadata(url, cache_path), ttl, stale)
+
+
+def set_detached_refreshes(detached: bool):
+    """Run background refreshes in detached processes instead of threads.
+
+    Short-lived programs, such as the CLI, should turn this on: a process
+    started for a refresh carries on after the program exits, so the
+    program doesn't have to wait for the download.
+    """
+    global _DETACHED_REFRESHES
+    _DETACHED_REFRESHES = detached
+
+
+def refresh_in_background(
+    cache_path: os.PathLike,
+    refresh,
+    *args,
+    session: requests.Session | None = None,
+    **kwargs,
+):
+    """Call ``refresh(*args, session=session, **kwargs)`` in the background.
+
+    Only one refresh of each cached file runs at a time; if one is already
+    running, this does nothing. Errors are logged, not raised.
+
+    By default, the refresh runs in a thread, which the interpreter waits
+    for before it exits. With :func:`set_detached_refreshes`, it runs in a
+    separate process that outlives this one instead; the process uses the
+    shared session and the same cache directory, so ``refresh`` must be a
+    module-level function, and ``args`` and ``kwargs`` must be JSON
+    serializable.
+
+    Parameters
+    ----------
+    cache_path : os.PathLike
+        The cached file that ``refresh`` updates.
+    refresh : Callable
+        Function that updates the cached file.
+    session : requests.Session, optional
+        Session for ``refresh`` to use, in a thread.
+    """
+    key = os.path.abspath(cache_path)
+    with _REFRESHES_LOCK:
+        running = _REFRESHES.get(key)
+        if running is not None and _is_running(running):
+            return
+        if _DETACHED_REFRESHES:
+            try:
+                running = _start_refresh_process(refresh, args, kwargs)
+            except OSError as e:
+                _logger.warning(f"Unable to refresh {cache_path} in background: {e}")
+                return
+        else:
+            running = threading.Thread(
+                target=_run_refresh,
+                args=(cache_path, refresh, args, dict(kwargs, session=session)),
+                name=f"spec0-refresh-{key}",
+            )
+            running.start()
+        _REFRESHES[key] = running
+
+
+def _run_refresh(cache_path, refresh, args, kwargs):
+    try:
+        refresh(*args, **kwargs)
+    except (OSError, requests.exceptions.RequestException) as e:
+        _logger.warning(f"Unable to refresh {cache_path} in background: {e}")
+
+
+def _is_running(refresh: threading.Thread | subprocess.Popen) -> bool:
+    if isinstance(refresh, threading.Thread):
+        return refresh.is_alive()
+    return refresh.poll() is None
+
+
+def _start_refresh_process(refresh, args, kwargs) -> subprocess.Popen:
+    spec = {
+        "function": f"{refresh.__module__}:{refresh.__qualname__}",
+        "args": args,
+        "kwargs": kwargs,
+    }
+    env = dict(
+        os.environ,
+        **{CACHE_DIR_ENV: str(CACHE_DIR), CACHE_MAX_SIZE_ENV: str(CACHE_MAX_SIZE)},
+    )
+    if os.name == "nt":
+        detach = {
+            "creationflags": subprocess.DETACHED_PROCESS
+            | subprocess.CREATE_NEW_PROCESS_GROUP
+        }
+    else:
+        detach = {"start_new_session": True}
+    _logger.debug(f"Starting a process to run {spec['function']}{tuple(args)}")
+    return subprocess.Popen(
+        [sys.executable, "-c", _REFRESH_CODE, json.dumps(spec)],
+        env=env,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        **detach,
+    )
+
+
+def _refresh_main(spec: str):
+    """Run a refresh in a process started by :func:`refresh_in_background`."""
+    spec = json.loads(spec)
+    module_name, name = spec["function"].split(":")
+    refresh = getattr(importlib.import_module(module_name), name)
+    refresh(*spec["args"], **spec["kwargs"])
+
+
+def wait_for_refreshes(timeout: float | None = None):
+    """Wait for background refreshes started so far to finish."""
+    with _REFRESHES_LOCK:
+        refreshes = list(_REFRESHES.values())
+    for refresh in refreshes:
+        if isinstance(refresh, threading.Thread):
+            refresh.join(timeout)
+        else:
+            with contextlib.suppress(subprocess.TimeoutExpired):
+                refresh.wait(timeout)
+
+
+def get_file(
+    url: str,
+    cache_path: str,
+    ttl: float | None = None,
+    session: requests.Session | None = None,
+    stale_while_revalidate: float = 0,
+    offline: bool = False,
+) -> str:
     """
     Retrieve a file from either a local cache or a remote URL.
 
+    The ``ETag`` and ``Last-Modified`` headers of the response are saved
+    next to the cached file. Once the cached file has expired, these are
+    used to make a conditional request, so that an unchanged file is not
+    downloaded again.
+
+    Downloads go to a temporary file that is renamed into place when
+    complete, and are made while holding a lock on the cached file, so
+    several processes sharing a cache make only one download between them.
+
     Parameters
     ----------
     url : str
         The URL from which to download the file if needed.
     cache_path : str
         Path on the local filesystem to store (and check for) the cached file.
-    ttl : int, optional
+    ttl : float, optional
         Time-to-live (in seconds). If the file in the cache is older than this,
-        it is re-downloaded. The default is 3600 (1 hour).
+        it is revalidated with the server. If None (the default), the
+        server's ``Cache-Control: max-age`` is used, or 3600 (1 hour) if it
+        didn't send one; a ``ttl`` that is given takes precedence over
+        max-age (see :func:`effective_ttl`).
+    session : requests.Session, optional
+        Session to make the request with. Defaults to the shared session
+        (see :func:`spec0.httpsession.get_session`).
+    stale_while_revalidate : float, optional
+        How long (in seconds) after it expires the cached file may still be
+        used. Within this window, the cached file is returned immediately
+        and is revalidated in the background (see
+        :func:`refresh_in_background`); after it, we wait for the download
+        as usual. The default, 0, always waits.
+    offline : bool, optional
+        If True, never make a request: return the cached file, however old
+        it is, or raise :class:`OfflineError` if there isn't one.
 
     Returns
     -------
@@ -30,22 +443,392 @@ def get_file(url: str, cache_path: str, ttl: int = 3600) -> str:
     ------
     requests.HTTPError
         If the request returned an unsuccessful status code (4xx or 5xx).
+    OfflineError
+        If ``offline`` and the file is not in the cache.
     """
-    file_needs_download = True
+    if offline:
+        return _get_offline(url, cache_path)
 
-    if os.path.exists(cache_path):
-        file_age = time.time() - os.path.getmtime(cache_path)
-        if file_age < ttl:
-            file_needs_download = False
-    else:
-        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    metadata = _cached_metadata(url, cache_path)
+    if _is_fresh(cache_path, metadata, ttl):
+        record_cache_access(cache_path, hit=True)
+        return cache_path
+
+    if stale_while_revalidate and _is_fresh(
+        cache_path, metadata, ttl, stale_while_revalidate
+    ):
+        _logger.debug(f"Using stale {cache_path} while it is refreshed")
+        refresh_in_background(
+            cache_path, get_file, url, cache_path, ttl, session=session
+        )
+        record_cache_access(cache_path, hit=True)
+        return cache_path
 
-    if file_needs_download:
-        response = requests.get(url, stream=True)
-        response.raise_for_status()
+    with cache_lock(cache_path):
+        # another process may have refreshed the file while we waited
+        metadata = _cached_metadata(url, cache_path)
+        if _is_fresh(cache_path, metadata, ttl):
+            _logger.debug(f"{cache_path} was refreshed by another process")
+            downloaded = False
+        else:
+            downloaded = _download(url, cache_path, metadata, session)
+
+    record_cache_access(cache_path, hit=not downloaded)
+    return cache_path
 
-        with open(cache_path, "wb") as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
 
+def _get_offline(url: str, cache_path: str) -> str:
+    """Get a cached file without touching the network."""
+    if not os.path.exists(cache_path):
+        raise OfflineError(
+            f"{url} is not in the cache (expected at {cache_path}) and can't "
+            "be downloaded in offline mode"
+        )
+    record_cache_access(cache_path, hit=True)
     return cache_path
+
+
+def _download(
+    url: str,
+    cache_path: str,
+    metadata: dict | None,
+    session: requests.Session | None = None,
+) -> bool:
+    """Download (or revalidate) a file; the caller must hold its lock.
+
+    Returns whether the file was downloaded (False if the server said our
+    cached copy is still valid).
+    """
+    headers = {}
+    if metadata:
+        if metadata.get("etag"):
+            headers["If-None-Match"] = metadata["etag"]
+        if metadata.get("last_modified"):
+            headers["If-Modified-Since"] = metadata["last_modified"]
+
+    if session is None:
+        session = get_session()
+    response = session.get(url, stream=True, headers=headers)
+
+    if response.status_code == 304 and headers:
+        _logger.debug(f"Cached copy of {url} is still valid")
+        response.close()
+        os.utime(cache_path)
+        if response.headers.get("ETag"):
+            metadata["etag"] = response.headers["ETag"]
+        metadata["max_age"] = _parse_max_age(response.headers.get("Cache-Control"))
+        write_cache_metadata(cache_path, metadata)
+        return False
+
+    response.raise_for_status()
+
+    with atomic_write(cache_path) as f:
+        for chunk in response.iter_content(chunk_size=8192):
+            f.write(chunk)
+
+    write_cache_metadata(
+        cache_path,
+        {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "max_age": _parse_max_age(response.headers.get("Cache-Control")),
+        },
+    )
+    return True
+
+
+class CacheIndex:
+    """Size and access bookkeeping for the files in a cache directory.
+
+    The index is a JSON file in the cache directory that records the size
+    and the creation and last-access times of each cached file, along with
+    the number of cache hits and misses. This lets us report on and trim the
+    cache without walking the directory tree. If there is no index yet (for
+    example, for a cache created by an older version), it is built by
+    scanning the directory once.
+
+    Metadata and lock files are not indexed; a file's metadata is removed
+    along with it.
+
+    So that cache hits don't rewrite the index every time, a hit on a file
+    that was used less than :data:`ACCESS_TIME_RESOLUTION` seconds ago
+    leaves its access time as it is, and is only counted in the index with
+    the next change to it (or when the process exits).
+
+    Parameters
+    ----------
+    cache_dir : os.PathLike
+        The cache directory.
+    max_size : int, optional
+        Size (in bytes) that the cache is trimmed to when files are added.
+        If None, the cache is never trimmed automatically.
+    """
+
+    def __init__(self, cache_dir: os.PathLike, max_size: int | None = None):
+        self.cache_dir = pathlib.Path(cache_dir)
+        self.max_size = max_size
+
+    @property
+    def path(self) -> pathlib.Path:
+        return self.cache_dir / INDEX_NAME
+
+    def _key(self, path: os.PathLike) -> str:
+        relpath = os.path.relpath(os.path.abspath(path), self.cache_dir.absolute())
+        return pathlib.PurePath(relpath).as_posix()
+
+    def _is_indexed(self, name: str) -> bool:
+        return not (
+            name == INDEX_NAME
+            or name.endswith((METADATA_SUFFIX, LOCK_SUFFIX))
+            or (name.startswith(".") and name.endswith(".tmp"))
+        )
+
+    def _scan(self) -> dict:
+        entries = {}
+        for dirpath, _, filenames in os.walk(self.cache_dir):
+            for name in filter(self._is_indexed, filenames):
+                stat = os.stat(os.path.join(dirpath, name))
+                entries[self._key(os.path.join(dirpath, name))] = {
+                    "size": stat.st_size,
+                    "created": stat.st_mtime,
+                    "accessed": stat.st_mtime,
+                }
+        return {"entries": entries, "hits": 0, "misses": 0}
+
+    def read(self) -> dict:
+        """Read the index.
+
+        Returns
+        -------
+        dict
+            With keys ``entries`` (a dict mapping each file's path, relative
+            to the cache directory, to its ``size``, ``created`` time and
+            ``accessed`` time), ``hits``, and ``misses``.
+        """
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return self._scan()
+
+    def _pending_hits(self, take: bool = False) -> int:
+        key = str(self.path.absolute())
+        with _PENDING_HITS_LOCK:
+            if take:
+                return _PENDING_HITS.pop(key, 0)
+            return _PENDING_HITS.get(key, 0)
+
+    def _add_pending_hit(self):
+        key = str(self.path.absolute())
+        with _PENDING_HITS_LOCK:
+            if not _PENDING_HITS:
+                atexit.register(flush_pending_hits)
+            _PENDING_HITS[key] = _PENDING_HITS.get(key, 0) + 1
+
+    def _recently_accessed(self, key: str, path: os.PathLike, now: float) -> bool:
+        if not self.path.exists():
+            return False
+        entry = self.read()["entries"].get(key)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return False
+        return (
+            entry is not None
+            and entry["size"] == size
+            and now - entry["accessed"] < ACCESS_TIME_RESOLUTION
+        )
+
+    @contextlib.contextmanager
+    def _update(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with cache_lock(self.path):
+            index = self.read()
+            index["hits"] += self._pending_hits(take=True)
+            yield index
+            with atomic_write(self.path, "w") as f:
+                json.dump(index, f)
+
+    def _remove(self, index: dict, key: str):
+        path = self.cache_dir / key
+        for filename in [path, f"{path}{METADATA_SUFFIX}"]:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(filename)
+        del index["entries"][key]
+
+    def _trim(self, index: dict, max_size: int, keep=()) -> list[str]:
+        entries = index["entries"]
+        total = sum(entry["size"] for entry in entries.values())
+        removed = []
+        by_access = sorted(entries, key=lambda key: entries[key]["accessed"])
+        for key in by_access:
+            if total <= max_size:
+                break
+            if key in keep:
+                continue
+            total -= entries[key]["size"]
+            self._remove(index, key)
+            removed.append(key)
+        if removed:
+            _logger.info(f"Removed {len(removed)} files from {self.cache_dir}")
+        return removed
+
+    def record(self, path: os.PathLike, hit: bool | None = None):
+        """Record that a cached file was used (and possibly just written).
+
+        If this takes the cache over ``max_size``, the least recently used
+        files (other than this one) are removed.
+
+        Parameters
+        ----------
+        path : os.PathLike
+            The cached file.
+        hit : bool | None
+            Whether this was a cache hit (True) or the file had to be
+            downloaded (False); None to not count it either way.
+        """
+        key = self._key(path)
+        now = time.time()
+        if hit and self._recently_accessed(key, path, now):
+            self._add_pending_hit()
+            return
+        with self._update() as index:
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                return
+            entry = index["entries"].setdefault(key, {"created": now})
+            if hit is False:
+                entry["created"] = now
+            entry["size"] = size
+            entry["accessed"] = now
+            if hit is not None:
+                index["hits" if hit else "misses"] += 1
+            if self.max_size is not None:
+                self._trim(index, self.max_size, keep={key})
+
+    def prune(self, max_size: int | None = None) -> list[str]:
+        """Remove least recently used files until the cache fits a size.
+
+        Index entries for files that no longer exist are dropped too, and
+        so are temporary files left over from interrupted downloads (older
+        than :data:`TEMPORARY_FILE_MAX_AGE`).
+
+        Parameters
+        ----------
+        max_size : int | None
+            Size (in bytes) to trim the cache to. Defaults to ``max_size``;
+            if both are None, only the missing and left over files are
+            dropped.
+
+        Returns
+        -------
+        list[str]
+            The removed files, relative to the cache directory.
+        """
+        if max_size is None:
+            max_size = self.max_size
+        with self._update() as index:
+            for key in list(index["entries"]):
+                if not (self.cache_dir / key).exists():
+                    del index["entries"][key]
+            removed = self._remove_temporary_files(TEMPORARY_FILE_MAX_AGE)
+            if max_size is None:
+                return removed
+            return removed + self._trim(index, max_size)
+
+    def clear(self):
+        """Remove all cached files and reset the statistics."""
+        with self._update() as index:
+            for key in list(index["entries"]):
+                self._remove(index, key)
+            self._remove_temporary_files(0)
+            index.update(hits=0, misses=0)
+
+    def _remove_temporary_files(self, max_age: float) -> list[str]:
+        """Remove temporary download files that are older than ``max_age``."""
+        removed = []
+        now = time.time()
+        for dirpath, _, filenames in os.walk(self.cache_dir):
+            for name in filenames:
+                if not (name.startswith(".") and name.endswith(".tmp")):
+                    continue
+                path = os.path.join(dirpath, name)
+                with contextlib.suppress(FileNotFoundError):
+                    if now - os.path.getmtime(path) >= max_age:
+                        os.remove(path)
+                        removed.append(self._key(path))
+        return removed
+
+    def info(self) -> dict:
+        """Summarize the cache.
+
+        Returns
+        -------
+        dict
+            With keys ``cache_dir``, ``entries`` (number of files), ``size``
+            (total bytes), ``max_size``, ``hits``, ``misses``, ``hit_ratio``
+            (None if there have been no lookups), and ``oldest`` and
+            ``last_access`` (datetimes, None if the cache is empty).
+        """
+        index = self.read()
+        index["hits"] += self._pending_hits()
+        entries = index["entries"].values()
+        lookups = index["hits"] + index["misses"]
+
+        def as_datetime(timestamp):
+            return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc)
+
+        return {
+            "cache_dir": str(self.cache_dir),
+            "entries": len(entries),
+            "size": sum(entry["size"] for entry in entries),
+            "max_size": self.max_size,
+            "hits": index["hits"],
+            "misses": index["misses"],
+            "hit_ratio": index["hits"] / lookups if lookups else None,
+            "oldest": (
+                as_datetime(min(entry["created"] for entry in entries))
+                if entries
+                else None
+            ),
+            "last_access": (
+                as_datetime(max(entry["accessed"] for entry in entries))
+                if entries
+                else None
+            ),
+        }
+
+
+def flush_pending_hits():
+    """Write the cache hits that haven't been counted in an index yet."""
+    with _PENDING_HITS_LOCK:
+        paths = list(_PENDING_HITS)
+    for path in paths:
+        cache_dir = pathlib.Path(path).parent
+        if not cache_dir.is_dir():
+            # the cache has been removed since
+            continue
+        try:
+            with CacheIndex(cache_dir)._update():
+                pass
+        except OSError as e:
+            _logger.warning(f"Unable to update the cache index: {e}")
+
+
+def record_cache_access(path: os.PathLike, hit: bool | None = None):
+    """Record use of a file in the index of the cache directory.
+
+    Files outside of the cache directory (see :func:`get_cache_dir`) are not
+    indexed, and this does nothing for them. See :meth:`CacheIndex.record`
+    for the parameters.
+    """
+    cache_dir = os.path.abspath(CACHE_DIR)
+    if os.path.commonpath([cache_dir, os.path.abspath(path)]) != cache_dir:
+        return
+    try:
+        CacheIndex(CACHE_DIR, CACHE_MAX_SIZE).record(path, hit)
+    except OSError as e:
+        # the index is only bookkeeping; don't fail the lookup over it
+        _logger.warning(f"Unable to update the cache index: {e}")
@@ -1,19 +1,86 @@
 import argparse
 import logging
 import os
+import sys
 
 from functools import partial
 
 from spec0.releasesource import (
     PyPIReleaseSource,
+    LocalPyPIReleaseSource,
     CondaReleaseSource,
     GitHubReleaseSource,
+    GitReleaseSource,
     DefaultReleaseSource,
+    GitError,
+)
+from spec0.cacheddownload import (
+    CACHE_DIR_ENV,
+    CACHE_MAX_SIZE_ENV,
+    DEFAULT_CACHE_MAX_SIZE,
+    CacheIndex,
+    OfflineError,
+    get_cache_dir,
+    get_cache_max_size,
+    parse_size as _parse_size,
+    set_cache_dir,
+    set_cache_max_size,
+    set_detached_refreshes,
 )
 from spec0.releasefilters import SPEC0StrictDate, SPEC0Quarter
 from spec0.output import terminal_output, json_output, specifier_output
 from spec0.main import main
 
+_logger = logging.getLogger(__name__)
+
+
+OFFLINE_ENV = "SPEC0_OFFLINE"
+CONDA_TTL_ENV = "SPEC0_CONDA_TTL"
+PYPI_TTL_ENV = "SPEC0_PYPI_TTL"
+GITHUB_TTL_ENV = "SPEC0_GITHUB_TTL"
+
+
+def _env_flag(name: str) -> bool:
+    return os.environ.get(name, "").lower() in {"1", "true", "yes", "on"}
+
+
+def _env_default(name: str, default=None):
+    """Default for an option, from an environment variable if it's set.
+
+    The variable's value is returned as is: argparse converts it with the
+    option's type when the option isn't given, so a bad value is reported
+    as a usage error (see :func:`_seconds`) rather than breaking ``--help``.
+    """
+    return os.environ.get(name) or default
+
+
+def _seconds(env: str):
+    """Option type for a number of seconds that may come from ``env``."""
+
+    def convert(value: str) -> float:
+        try:
+            return float(value)
+        except ValueError:
+            raise argparse.ArgumentTypeError(
+                f"invalid number of seconds '{value}' (given on the command "
+                f"line or in {env})"
+            )
+
+    return convert
+
+
+def add_cache_dir_argument(parser):
+    """Add the ``--cache-dir`` option to a parser."""
+    parser.add_argument(
+        "--cache-dir",
+        default=get_cache_dir(),
+        metavar="PATH",
+        help=(
+            "Directory to cache downloads in (default: the "
+            f"{CACHE_DIR_ENV} environment variable, or ~/.cache/spec0)"
+        ),
+    )
+
 
 def make_parser():
     """Make the command line parser for the spec0 CLI."""
@@ -30,6 +97,11 @@ def make_parser():
             "SPEC0 according to the exact date of the release, and outputs "
             "as a table with release dates and drop dates."
         ),
+        epilog=(
+            "'spec0 cache ...' manages the download cache (see 'spec0 cache "
+            "--help'). To look up a package named 'cache', put '--' before "
+            "it: 'spec0 [options] -- cache'."
+        ),
     )
     parser.add_argument("package", help="Python package to look up")
     parser.add_argument(
@@ -50,6 +122,16 @@ def make_parser():
         action="store_true",
         help="Use PyPI (only) as the source for release information",
     )
+    source.add_argument(
+        "--pypi-mirror",
+        metavar="PATH",
+        help=(
+            "Use a local PyPI mirror (such as one made by bandersnatch) as "
+            "the source for release information, reading its files directly "
+            "instead of querying pypi.org. PATH is the mirror directory or "
+            "its web root, or a file:// URL. Implies --pypi"
+        ),
+    )
     source.add_argument(
         "--conda-channel",
         type=str,
@@ -61,7 +143,97 @@ def make_parser():
         default=["noarch", "linux-64"],
         help=("Conda architectures to check, only used if conda-channel is specified"),
     )
+    source.add_argument(
+        "--conda-shards",
+        action="store_true",
+        help=(
+            "Use sharded repodata where the conda channel publishes it, so "
+            "only the requested package's data is downloaded. Requires "
+            "msgpack and zstandard; only used if conda-channel is specified"
+        ),
+    )
     source.add_argument("--github", action="store_true")
+    source.add_argument(
+        "--git-repo",
+        metavar="PATH",
+        help=(
+            "Use the tags of a local git repository (a clone or bare "
+            "mirror) as the source for release information, without "
+            "querying GitHub"
+        ),
+    )
+
+    cache = parser.add_argument_group(
+        "Cache",
+        description="Control how cached downloads are used.",
+    )
+    add_cache_dir_argument(cache)
+    cache.add_argument(
+        "--offline",
+        action="store_true",
+        default=_env_flag(OFFLINE_ENV),
+        help=(
+            "Never use the network; answer only from cached data, and fail "
+            f"if it isn't cached. Also set by {OFFLINE_ENV}=1"
+        ),
+    )
+    cache.add_argument(
+        "--conda-ttl",
+        type=_seconds(CONDA_TTL_ENV),
+        default=_env_default(CONDA_TTL_ENV),
+        metavar="SECONDS",
+        help=(
+            "How long cached conda repodata is used before it is checked for "
+            "updates. If given, this takes precedence over the max-age the "
+            "channel sends (in its Cache-Control header); otherwise that "
+            "max-age is used, or 3600 if the channel doesn't send one "
+            f"(default: {CONDA_TTL_ENV})"
+        ),
+    )
+    cache.add_argument(
+        "--pypi-ttl",
+        type=_seconds(PYPI_TTL_ENV),
+        default=_env_default(PYPI_TTL_ENV, 3600),
+        metavar="SECONDS",
+        help=(
+            "How long cached PyPI releases are used before PyPI is queried "
+            f"again (default: {PYPI_TTL_ENV}, or 3600)"
+        ),
+    )
+    cache.add_argument(
+        "--github-ttl",
+        type=_seconds(GITHUB_TTL_ENV),
+        default=_env_default(GITHUB_TTL_ENV, 3600),
+        metavar="SECONDS",
+        help=(
+            "How long cached GitHub releases are used before GitHub is "
+            f"queried again (default: {GITHUB_TTL_ENV}, or 3600)"
+        ),
+    )
+    cache.add_argument(
+        "--cache-max-size",
+        type=parse_size,
+        default=_env_default(CACHE_MAX_SIZE_ENV, DEFAULT_CACHE_MAX_SIZE),
+        metavar="SIZE",
+        help=(
+            "Size the cache is trimmed to as files are downloaded, in bytes "
+            "or with a K, M, or G suffix, removing the least recently used "
+            f"files first (default: {CACHE_MAX_SIZE_ENV}, or "
+            f"{format_size(DEFAULT_CACHE_MAX_SIZE)})"
+        ),
+    )
+    cache.add_argument(
+        "--stale-while-revalidate",
+        type=float,
+        default=0,
+        metavar="SECONDS",
+        help=(
+            "Use cached conda repodata for up to this many seconds after it "
+            "expires, refreshing it in the background instead of waiting "
+            "for the download. The refresh runs in a separate process, which "
+            "spec0 doesn't wait for before exiting (default: 0)"
+        ),
+    )
 
     # filter options
     filterg = parser.add_argument_group(
@@ -113,6 +285,87 @@ def make_parser():
     return parser
 
 
+def parse_size(size: str) -> int:
+    """Parse a size in bytes, with an optional K, M, or G suffix."""
+    try:
+        return _parse_size(size)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def format_size(size: int) -> str:
+    """Format a size in bytes for humans."""
+    for unit in ["B", "KiB", "MiB"]:
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+
+def make_cache_parser():
+    """Make the command line parser for the ``spec0 cache`` command."""
+    parser = argparse.ArgumentParser(
+        prog="spec0 cache",
+        description=(
+            "Inspect or clean up the download cache. The least recently "
+            "used files are removed when the cache grows beyond "
+            f"{format_size(get_cache_max_size())} (set by {CACHE_MAX_SIZE_ENV})."
+        ),
+    )
+    add_cache_dir_argument(parser)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser(
+        "info", help="Show the number and size of cached files, and hit ratio"
+    )
+    prune = commands.add_parser(
+        "prune", help="Remove the least recently used files from the cache"
+    )
+    prune.add_argument(
+        "--max-size",
+        type=parse_size,
+        default=get_cache_max_size(),
+        help=(
+            "Size to trim the cache to, in bytes or with a K, M, or G suffix "
+            f"(default: {format_size(get_cache_max_size())})"
+        ),
+    )
+    commands.add_parser("clear", help="Remove all files from the cache")
+    return parser
+
+
+def cache_main(argv=None):
+    """Run the ``spec0 cache`` command."""
+    opts = make_cache_parser().parse_args(argv)
+    index = CacheIndex(opts.cache_dir, get_cache_max_size())
+    if opts.command == "info":
+        info = index.info()
+        hit_ratio = info["hit_ratio"]
+        print(f"Cache directory: {info['cache_dir']}")
+        print(f"Entries:         {info['entries']}")
+        print(
+            f"Size:            {format_size(info['size'])} "
+            f"(limit {format_size(info['max_size'])})"
+        )
+        print(
+            f"Hit ratio:       "
+            f"{'n/a' if hit_ratio is None else f'{hit_ratio:.1%}'} "
+            f"({info['hits']} hits, {info['misses']} misses)"
+        )
+        for label, key in [
+            ("Oldest entry:", "oldest"),
+            ("Last access:", "last_access"),
+        ]:
+            when = info[key]
+            when = "n/a" if when is None else f"{when:%Y-%m-%d %H:%M} UTC"
+            print(f"{label:<17}{when}")
+    elif opts.command == "prune":
+        removed = index.prune(opts.max_size)
+        print(f"Removed {len(removed)} files")
+    elif opts.command == "clear":
+        index.clear()
+        print(f"Cleared {opts.cache_dir}")
+
+
 def select_source(opts):
     """Use CLI arguments to select the source of the release information.
 
@@ -121,23 +374,43 @@ def select_source(opts):
     opts : argparse.Namespace
         The command line arguments.
     """
-    selected_pypi = opts.pypi
+    selected_pypi = opts.pypi or opts.pypi_mirror is not None
     selected_conda = opts.conda_channel is not None
     selected_github = opts.github
-    n_selected = sum([selected_pypi, selected_conda, selected_github])
+    selected_git = opts.git_repo is not None
+    n_selected = sum([selected_pypi, selected_conda, selected_github, selected_git])
     token = os.getenv("GITHUB_TOKEN")
     if n_selected == 0:
-        source = DefaultReleaseSource(token)
+        source = DefaultReleaseSource(
+            token,
+            stale_while_revalidate=opts.stale_while_revalidate,
+            offline=opts.offline,
+            conda_ttl=opts.conda_ttl,
+            pypi_ttl=opts.pypi_ttl,
+            github_ttl=opts.github_ttl,
+        )
     elif n_selected > 1:
         raise ValueError("Only one source can be selected")
     else:
-        if selected_pypi:
-            source = PyPIReleaseSource()
+        if opts.pypi_mirror is not None:
+            source = LocalPyPIReleaseSource(opts.pypi_mirror)
+        elif selected_pypi:
+            source = PyPIReleaseSource(offline=opts.offline, ttl=opts.pypi_ttl)
         elif selected_conda:
             platforms = [f"{opts.conda_channel}/{arch}" for arch in opts.conda_arch]
-            source = CondaReleaseSource(platforms)
+            source = CondaReleaseSource(
+                platforms,
+                shards=opts.conda_shards,
+                stale_while_revalidate=opts.stale_while_revalidate,
+                ttl=opts.conda_ttl,
+                offline=opts.offline,
+            )
         elif selected_github:
-            source = GitHubReleaseSource(token)
+            source = GitHubReleaseSource(
+                token, offline=opts.offline, ttl=opts.github_ttl
+            )
+        elif selected_git:
+            source = GitReleaseSource({opts.package: opts.git_repo})
 
     return source
 
@@ -187,18 +460,39 @@ def select_output(opts):
     return output
 
 
+def log_github_budget(source):
+    """Log how much of the GitHub rate limit a source used, if any."""
+    if isinstance(source, DefaultReleaseSource):
+        # only look at the GitHub source if it was created
+        source = vars(source).get("github_source")
+    if isinstance(source, GitHubReleaseSource) and source.budget.requests:
+        _logger.info(f"GitHub rate limit: {source.budget.report()}")
+
+
 def cli_main():
+    # "spec0 -- cache" looks up a package named cache
+    if sys.argv[1:2] == ["cache"]:
+        cache_main(sys.argv[2:])
+        return
+
     parser = make_parser()
     opts = parser.parse_args()
     # maybe in the future be a little more precise in setting logging to our
     # loggers, not the root logger
     logging.basicConfig(level=opts.log_level)
+    set_cache_dir(opts.cache_dir)
+    set_cache_max_size(opts.cache_max_size)
+    # refresh in processes that carry on after we exit, instead of waiting
+    set_detached_refreshes(True)
 
-    sources = select_source(opts)
     filter_ = select_filter(opts)
     output = select_output(opts)
-
-    results = main(opts.package, sources, filter_)
+    try:
+        sources = select_source(opts)
+        results = main(opts.package, sources, filter_)
+    except (OfflineError, GitError) as e:
+        parser.exit(1, f"spec0: error: {e}\n")
+    log_github_budget(sources)
     output(results)
 
 
@@ -0,0 +1,111 @@
+"""
+HTTP Sessions
+
+All of our HTTP requests go through a :class:`requests.Session`, so that
+connections (and their TLS handshakes) are reused from one request to the
+next. This matters when looking up many packages in one run. By default, a
+single session is shared by all sources and downloads; a different session
+can be passed to any of them.
+
+Sessions made here retry failed GET requests, with exponential backoff, when
+the server is rate limiting us (429) or has a temporary error (5xx). The
+``Retry-After`` header is honored when the server sends it. POST requests
+(GitHub's GraphQL queries) are only retried on connection errors: retrying
+them on rate limits is left to :class:`spec0.ratelimit.RateLimitBudget`,
+which keeps track of the waits and limits how long they can be.
+"""
+
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import logging
+
+_logger = logging.getLogger(__name__)
+
+POOL_CONNECTIONS = 10
+"""Default number of hosts to keep connection pools for."""
+
+POOL_MAXSIZE = 10
+"""Default maximum number of connections to keep open to each host."""
+
+RETRIES = 3
+"""Default number of times to retry a failed request."""
+
+BACKOFF_FACTOR = 0.5
+"""Default backoff factor: retries wait 0.5, 1, 2, ... seconds."""
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+
+def make_session(
+    pool_connections: int = POOL_CONNECTIONS,
+    pool_maxsize: int = POOL_MAXSIZE,
+    retries: int = RETRIES,
+    backoff_factor: float = BACKOFF_FACTOR,
+) -> requests.Session:
+    """Make a session with pooled connections and retries.
+
+    Parameters
+    ----------
+    pool_connections : int
+        Number of hosts to keep connection pools for.
+    pool_maxsize : int
+        Maximum number of connections to keep open to each host. This should
+        be at least the number of threads making requests at once.
+    retries : int
+        Number of times to retry a request that failed with a connection
+        error, or a GET request that got a 429 or 5xx response.
+    backoff_factor : float
+        Retries wait ``backoff_factor * 2 ** (retry - 1)`` seconds, unless
+        the server sent a ``Retry-After`` header.
+
+    Returns
+    -------
+    requests.Session
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        # not POST: GraphQL queries are retried by a RateLimitBudget
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        respect_retry_after_header=True,
+        # give us the last response, so callers see the usual HTTPError
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session() -> requests.Session:
+    """Get the shared session, making it (with the defaults) if needed."""
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            _SESSION = make_session()
+        return _SESSION
+
+
+def set_session(session: requests.Session | None):
+    """Replace the shared session.
+
+    Use this to change the pool sizes or retry behavior for everything that
+    uses the shared session. If ``session`` is None, a new session with the
+    default settings is made the next time one is needed.
+    """
+    global _SESSION
+    with _SESSION_LOCK:
+        _SESSION = session
@@ -0,0 +1,522 @@
+"""
+Incremental Repodata Updates
+
+Support for conda's JLAP format, in which a channel publishes a
+``repodata.jlap`` file next to ``repodata.json``. Each line of the JLAP file
+is a JSON patch that takes the repodata from one version (identified by its
+BLAKE2b hash) to the next; the lines are chained together with keyed hashes,
+and the last line is a checksum of everything before it. Since new lines are
+only ever appended, a client that remembers how far it has read only needs to
+fetch the end of the file to bring its copy of the repodata up to date.
+"""
+
+import hashlib
+import json
+import os
+import time
+
+import requests
+
+from spec0.httpsession import get_session
+from spec0.cacheddownload import (
+    _parse_max_age,
+    atomic_write,
+    cache_lock,
+    effective_ttl,
+    get_file,
+    read_cache_metadata,
+    record_cache_access,
+    refresh_in_background,
+    write_cache_metadata,
+)
+from spec0.repodata import PACKAGE_KEYS, _StreamingJSONReader
+
+import logging
+
+_logger = logging.getLogger(__name__)
+
+DIGEST_SIZE = 32
+ZERO_IV = bytes(DIGEST_SIZE)
+"""Initialization vector that conda writes as the first line of a new JLAP
+file."""
+
+
+class JLAPError(Exception):
+    """Raised when a JLAP file can't be used to update the repodata."""
+
+
+def keyed_hash(data: bytes, key: bytes) -> bytes:
+    """Hash of one JLAP line, keyed with the hash of the previous line."""
+    return hashlib.blake2b(data, key=key, digest_size=DIGEST_SIZE).digest()
+
+
+def file_hash(path: os.PathLike) -> str:
+    """Hex BLAKE2b hash of a file, as used to identify repodata versions."""
+    hasher = hashlib.blake2b(digest_size=DIGEST_SIZE)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def jlap_url(repodata_url: str) -> str:
+    """URL of the JLAP file that goes with a ``repodata.json`` URL."""
+    base, ext = os.path.splitext(repodata_url)
+    return f"{base}.jlap"
+
+
+def parse_jlap(
+    data: bytes, iv: bytes | None, start: bool
+) -> tuple[list[dict], dict, bytes, int]:
+    """Parse and verify a JLAP file, or the tail of one.
+
+    Parameters
+    ----------
+    data : bytes
+        The JLAP content. If ``start`` is False, this is everything after
+        the last patch line that was previously read.
+    iv : bytes | None
+        Hash of the line before ``data``. Ignored if ``start``.
+    start : bool
+        Whether ``data`` is from the start of the file, in which case the
+        first line is the file's initialization vector (in hex), which is
+        the key for hashing the first patch line.
+
+    Returns
+    -------
+    patches : list[dict]
+        The patches in ``data``, in order.
+    metadata : dict
+        The metadata line, which gives the hash of the ``latest`` repodata.
+    iv : bytes
+        Hash of the last patch line (or the initialization vector, if there
+        are no patches), to be used when reading from ``pos``.
+    length : int
+        Number of bytes of ``data`` taken up by patch lines (including the
+        initialization vector, if ``start``).
+
+    Raises
+    ------
+    JLAPError
+        If the data is malformed or the checksum doesn't match.
+    """
+    lines = data.split(b"\n")
+    if lines and lines[-1] == b"":
+        lines.pop()
+    if len(lines) < 2 + start:
+        raise JLAPError("JLAP data is too short")
+
+    length = 0
+    if start:
+        first = lines.pop(0)
+        try:
+            iv = bytes.fromhex(first.decode("ascii"))
+        except ValueError as e:
+            raise JLAPError(f"Invalid JLAP initialization vector: {e}") from e
+        length = len(first) + 1
+
+    hashes = [iv]
+    for line in lines:
+        hashes.append(keyed_hash(line, hashes[-1]))
+
+    # the last line is the hash of the metadata line
+    if lines[-1].decode("ascii", "replace") != hashes[-2].hex():
+        raise JLAPError("JLAP checksum mismatch")
+
+    try:
+        metadata = json.loads(lines[-2])
+        patches = [json.loads(line) for line in lines[:-2]]
+    except ValueError as e:
+        raise JLAPError(f"Invalid JLAP line: {e}") from e
+
+    body = lines[:-2]
+    length += sum(len(line) + 1 for line in body)
+    return patches, metadata, hashes[len(body)], length
+
+
+def _resolve_pointer(pointer: str) -> list[str]:
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise JLAPError(f"Invalid JSON pointer '{pointer}'")
+    return [
+        part.replace("~1", "/").replace("~0", "~") for part in pointer[1:].split("/")
+    ]
+
+
+def _walk(doc, parts: list[str]):
+    for part in parts:
+        if isinstance(doc, list):
+            doc = doc[int(part)]
+        else:
+            doc = doc[part]
+    return doc
+
+
+def _add(doc, parts: list[str], value):
+    if not parts:
+        return value
+    parent = _walk(doc, parts[:-1])
+    key = parts[-1]
+    if isinstance(parent, list):
+        idx = len(parent) if key == "-" else int(key)
+        parent.insert(idx, value)
+    else:
+        parent[key] = value
+    return doc
+
+
+def _remove(doc, parts: list[str]):
+    parent = _walk(doc, parts[:-1])
+    key = parts[-1]
+    if isinstance(parent, list):
+        return parent.pop(int(key))
+    return parent.pop(key)
+
+
+def apply_patch(doc, patch: list[dict]):
+    """Apply a JSON patch (RFC 6902) to a document.
+
+    The document is modified in place where possible; use the return value,
+    since a patch can also replace the whole document.
+
+    Raises
+    ------
+    JLAPError
+        If an operation can't be applied.
+    """
+    try:
+        for op in patch:
+            parts = _resolve_pointer(op["path"])
+            kind = op["op"]
+            if kind == "add":
+                doc = _add(doc, parts, op["value"])
+            elif kind == "remove":
+                _remove(doc, parts)
+            elif kind == "replace":
+                if parts:
+                    _remove(doc, parts)
+                doc = _add(doc, parts, op["value"])
+            elif kind == "move":
+                value = _remove(doc, _resolve_pointer(op["from"]))
+                doc = _add(doc, parts, value)
+            elif kind == "copy":
+                value = _walk(doc, _resolve_pointer(op["from"]))
+                doc = _add(doc, parts, json.loads(json.dumps(value)))
+            elif kind == "test":
+                if _walk(doc, parts) != op["value"]:
+                    raise JLAPError(f"JSON patch test failed at '{op['path']}'")
+            else:
+                raise JLAPError(f"Unknown JSON patch operation '{kind}'")
+    except (KeyError, IndexError, ValueError, TypeError) as e:
+        raise JLAPError(f"Unable to apply JSON patch: {e!r}") from e
+    return doc
+
+
+def _patch_chain(patches: list[dict], have: str, latest: str) -> list[dict]:
+    """Patches that take the repodata from ``have`` to ``latest``, in order."""
+    by_target = {patch["to"]: patch for patch in patches}
+    chain = []
+    current = latest
+    while current != have:
+        patch = by_target.get(current)
+        if patch is None or len(chain) > len(patches):
+            raise JLAPError(f"No JLAP patch chain from {have} to {latest}")
+        chain.append(patch)
+        current = patch["from"]
+    return chain[::-1]
+
+
+def _split_ops(chain: list[dict]) -> tuple[dict, dict]:
+    """Sort the operations of a patch chain by what they change.
+
+    Returns the operations on each package record, keyed by (package key,
+    filename), and the operations on each other top-level entry, keyed by
+    its name; each in order. Paths are made relative to the record (so
+    they can be applied to ``{filename: record}``) or kept as they are
+    (to be applied to ``{name: value}``).
+
+    Raises
+    ------
+    JLAPError
+        If an operation spans more than one record or top-level entry, or
+        replaces a whole ``packages`` entry. Conda's patches never do this,
+        so we don't support streaming those.
+    """
+    record_ops = {}
+    other_ops = {}
+    for patch in chain:
+        for op in patch["patch"]:
+            pointers = [op["path"]] + ([op["from"]] if "from" in op else [])
+            targets = set()
+            for pointer in pointers:
+                parts = _resolve_pointer(pointer)
+                if not parts:
+                    raise JLAPError("JSON patch replaces the whole repodata")
+                if parts[0] in PACKAGE_KEYS:
+                    if len(parts) < 2:
+                        raise JLAPError(f"JSON patch replaces '{parts[0]}'")
+                    targets.add((parts[0], parts[1]))
+                else:
+                    targets.add(parts[0])
+            if len(targets) != 1:
+                raise JLAPError(f"JSON patch operation spans entries: {op}")
+
+            (target,) = targets
+            if isinstance(target, tuple):
+                prefix = len(target[0]) + 1  # the "/packages" part
+                op = dict(op, path=op["path"][prefix:])
+                if "from" in op:
+                    op["from"] = op["from"][prefix:]
+                record_ops.setdefault(target, []).append(op)
+            else:
+                other_ops.setdefault(target, []).append(op)
+    return record_ops, other_ops
+
+
+def _patched(name: str, value, ops: list[dict] | None):
+    """Apply operations to ``{name: value}``; the result has 0 or 1 items."""
+    if not ops:
+        return {name: value}
+    return apply_patch({name: value}, ops)
+
+
+def apply_patches_streaming(source, dest, chain: list[dict]):
+    """Write patched repodata, holding only one record at a time in memory.
+
+    Loading a large channel's repodata as Python objects takes many times
+    its size in memory, so rather than patching a loaded document, this
+    streams the records from ``source`` to ``dest``, patching the ones that
+    the patches change. Only the top-level entries other than the package
+    records (which are small) are loaded whole.
+
+    Parameters
+    ----------
+    source : TextIO
+        The repodata to patch.
+    dest : TextIO
+        Where to write the patched repodata.
+    chain : list[dict]
+        The JLAP patches to apply, in order.
+
+    Raises
+    ------
+    JLAPError
+        If a patch can't be applied this way; see :func:`_split_ops`.
+    """
+    record_ops, other_ops = _split_ops(chain)
+    reader = _StreamingJSONReader(source)
+
+    first_entry = True
+
+    def write_entry(name, value):
+        nonlocal first_entry
+        dest.write("{" if first_entry else ",")
+        first_entry = False
+        dest.write(json.dumps(name) + ":" + json.dumps(value))
+
+    def write_records(key, records):
+        # records: iterable of (filename, record) from the cached repodata
+        nonlocal first_entry
+        dest.write("{" if first_entry else ",")
+        first_entry = False
+        dest.write(json.dumps(key) + ":{")
+        first_record = True
+        for filename, record in records:
+            patched = _patched(filename, record, record_ops.pop((key, filename), None))
+            for filename, record in patched.items():
+                if not first_record:
+                    dest.write(",")
+                first_record = False
+                dest.write(json.dumps(filename) + ":" + json.dumps(record))
+        # records that the patches add
+        for target in [target for target in record_ops if target[0] == key]:
+            added = apply_patch({}, record_ops.pop(target))
+            for filename, record in added.items():
+                if not first_record:
+                    dest.write(",")
+                first_record = False
+                dest.write(json.dumps(filename) + ":" + json.dumps(record))
+        dest.write("}")
+
+    try:
+        reader.expect("{")
+        keys_seen = set()
+        if reader.peek() == "}":
+            reader.expect("}")
+        else:
+            while True:
+                key = reader.value()
+                reader.expect(":")
+                keys_seen.add(key)
+                if key in PACKAGE_KEYS and reader.peek() == "{":
+                    write_records(key, _iter_items(reader))
+                else:
+                    value = reader.value()
+                    patched = _patched(key, value, other_ops.pop(key, None))
+                    for name, value in patched.items():
+                        write_entry(name, value)
+
+                if reader.peek() == ",":
+                    reader.expect(",")
+                else:
+                    reader.expect("}")
+                    break
+    except ValueError as e:
+        raise JLAPError(f"Unable to read cached repodata: {e}") from e
+
+    # entries that the patches add
+    for key in PACKAGE_KEYS:
+        if key not in keys_seen and any(target[0] == key for target in record_ops):
+            write_records(key, [])
+    for key, ops in other_ops.items():
+        for name, value in apply_patch({}, ops).items():
+            write_entry(name, value)
+    dest.write("{}" if first_entry else "}")
+
+
+def _iter_items(reader: _StreamingJSONReader):
+    """(key, value) pairs of the JSON object at the reader's position."""
+    reader.expect("{")
+    if reader.peek() == "}":
+        reader.expect("}")
+        return
+    while True:
+        key = reader.value()
+        reader.expect(":")
+        yield key, reader.value()
+        if reader.peek() == ",":
+            reader.expect(",")
+        else:
+            reader.expect("}")
+            return
+
+
+def _update_from_jlap(url: str, cache_path: str, session: requests.Session):
+    """Bring a cached ``repodata.json`` up to date using the JLAP file.
+
+    The caller must hold the lock on ``cache_path``.
+    """
+    metadata = read_cache_metadata(cache_path)
+    state = metadata.get("jlap") or {}
+    have = state.get("have") or file_hash(cache_path)
+    pos = state.get("pos", 0)
+    iv = bytes.fromhex(state["iv"]) if pos else None
+
+    response = session.get(jlap_url(url), headers={"Range": f"bytes={pos}-"})
+    if response.status_code == 416 and pos:
+        # the JLAP file has been replaced by a shorter one; start over
+        pos, iv = 0, None
+        response = session.get(jlap_url(url))
+    response.raise_for_status()
+    if response.status_code == 200 and pos:
+        # range was ignored, so we got the whole file
+        pos, iv = 0, None
+
+    patches, jlap_metadata, last_iv, length = parse_jlap(response.content, iv, pos == 0)
+    latest = jlap_metadata.get("latest")
+    if latest is None:
+        raise JLAPError("JLAP metadata has no 'latest' hash")
+
+    if latest != have:
+        chain = _patch_chain(patches, have, latest)
+        _logger.debug(f"Applying {len(chain)} JLAP patches to {cache_path}")
+        with open(cache_path, "r", encoding="utf-8") as source:
+            with atomic_write(cache_path, "w") as dest:
+                apply_patches_streaming(source, dest, chain)
+
+        # the server's validators describe the old file, not the patched one
+        metadata.update(etag=None, last_modified=None)
+    metadata["max_age"] = _parse_max_age(response.headers.get("Cache-Control"))
+
+    if length:
+        state["pos"] = pos + length
+        state["iv"] = last_iv.hex()
+    state["have"] = latest
+    metadata["jlap"] = state
+    metadata["url"] = url
+    os.utime(cache_path)
+    write_cache_metadata(cache_path, metadata)
+
+
+def get_repodata(
+    url: str,
+    cache_path: str,
+    ttl: float | None = None,
+    session: requests.Session | None = None,
+    stale_while_revalidate: float = 0,
+    offline: bool = False,
+) -> str:
+    """Retrieve ``repodata.json``, using JLAP to update an expired cache.
+
+    The first download is a full download (see
+    :func:`spec0.cacheddownload.get_file`). After that, once the cached file
+    expires, only the new part of the channel's ``repodata.jlap`` is fetched
+    and its patches are applied to the cached file. If the channel doesn't
+    publish a JLAP file, or the patches don't lead from the cached version to
+    the latest version, this falls back to a full download.
+
+    Note that the patched file is not byte-for-byte identical to the
+    server's file (the JSON formatting differs), so its integrity is checked
+    with the JLAP checksums and the hashes that chain the patches together,
+    rather than by hashing the result.
+
+    Parameters
+    ----------
+    url : str
+        URL of the ``repodata.json`` file.
+    cache_path : str
+        Path to store the cached repodata.
+    ttl : float, optional
+        Time-to-live (in seconds) of the cached file. If None (the default),
+        the server's max-age is used, as in
+        :func:`spec0.cacheddownload.get_file`.
+    session : requests.Session, optional
+        Session to make requests with. Defaults to the shared session.
+    stale_while_revalidate : float, optional
+        How long (in seconds) after it expires the cached file may be used
+        while it is updated in the background; see
+        :func:`spec0.cacheddownload.get_file`.
+    offline : bool, optional
+        If True, use the cached file without updating it; see
+        :func:`spec0.cacheddownload.get_file`.
+
+    Returns
+    -------
+    str
+        The path to the locally cached file.
+    """
+    if session is None:
+        session = get_session()
+
+    if offline or not os.path.exists(cache_path):
+        return get_file(url, cache_path, ttl, session, offline=offline)
+
+    max_age = effective_ttl(read_cache_metadata(cache_path), ttl)
+    age = time.time() - os.path.getmtime(cache_path)
+    if age < max_age:
+        record_cache_access(cache_path, hit=True)
+        return cache_path
+
+    if age < max_age + stale_while_revalidate:
+        _logger.debug(f"Using stale {cache_path} while it is updated")
+        refresh_in_background(
+            cache_path, get_repodata, url, cache_path, ttl, session=session
+        )
+        record_cache_access(cache_path, hit=True)
+        return cache_path
+
+    try:
+        with cache_lock(cache_path):
+            # another process may have updated the file while we waited
+            if time.time() - os.path.getmtime(cache_path) < max_age:
+                record_cache_access(cache_path, hit=True)
+                return cache_path
+            _update_from_jlap(url, cache_path, session)
+    except (JLAPError, requests.exceptions.HTTPError) as e:
+        _logger.info(f"Unable to update {url} with JLAP ({e}); downloading it")
+        # outside the lock: get_file takes it itself
+        return get_file(url, cache_path, ttl=0, session=session)
+
+    record_cache_access(cache_path, hit=False)
+    return cache_path
@@ -1,4 +1,5 @@
 from spec0.releasefilters import SPEC0StrictDate
+from spec0.releasesource import _accepted_kwargs
 
 import logging
 
@@ -36,7 +37,13 @@ def main(package, source, filter_=None):
     if filter_ is None:
         filter_ = default_filter()
 
-    releases = source.get_releases(package)
+    # if the filter only needs the earliest release of each (minor) version,
+    # or only recent releases, let the source do that reduction; sources
+    # that don't take these arguments give all releases, which is fine too
+    aggregate = getattr(filter_, "aggregate", None)
+    since = filter_.since(package) if hasattr(filter_, "since") else None
+    kwargs = _accepted_kwargs(source.get_releases, aggregate=aggregate, since=since)
+    releases = source.get_releases(package, **kwargs)
     filtered = filter_.filter(package, releases)
     result = {
         "package": package,
@@ -0,0 +1,197 @@
+"""
+Rate Limits
+
+GitHub's GraphQL API gives each token a budget of points per hour, and each
+query costs some points. A query can ask how much it cost and how much is
+left (the ``rateLimit`` field), so we can keep track of the budget and slow
+down before running out, instead of failing part way through a long run.
+
+GitHub also has secondary rate limits (e.g., on bursts of requests), which
+are signaled by a 403 or 429 response. Its documentation says to wait for
+the ``Retry-After`` header if there is one, or until the time in the
+``X-RateLimit-Reset`` header if ``X-RateLimit-Remaining`` is 0, or else at
+least a minute.
+"""
+
+import datetime
+import threading
+import time
+from typing import Callable
+
+import requests
+
+import logging
+
+_logger = logging.getLogger(__name__)
+
+RATE_LIMIT_FIELD = "rateLimit { limit cost remaining resetAt }"
+"""GraphQL field to add to queries, so that their results update a budget."""
+
+SECONDARY_LIMIT_WAIT = 60
+"""Seconds to wait after a secondary rate limit that doesn't say how long."""
+
+
+class RateLimitExceeded(Exception):
+    """Raised when we'd have to wait too long for the rate limit to reset."""
+
+
+class RateLimitBudget:
+    """The remaining rate limit budget of a GraphQL API, and what we used.
+
+    Before each request, :meth:`wait` sleeps if needed to stay within the
+    budget: until the reset if the budget is used up, or, once less than
+    ``low_water`` of it is left, long enough to spread what's left evenly
+    until the reset.
+
+    Parameters
+    ----------
+    low_water : float
+        Fraction of the budget below which requests are paced.
+    max_wait : float
+        Longest (in seconds) we're willing to wait at once; if we'd need to
+        wait longer, :class:`RateLimitExceeded` is raised instead. The
+        default is a little over an hour, GitHub's rate limit window.
+    max_retries : int
+        Number of times to retry a request that hit a rate limit.
+    clock : Callable[[], float]
+        Gives the current time, as a POSIX timestamp.
+    sleep : Callable[[float], None]
+        Waits for a number of seconds.
+    """
+
+    def __init__(
+        self,
+        low_water: float = 0.1,
+        max_wait: float = 3900,
+        max_retries: int = 3,
+        clock: Callable[[], float] = time.time,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.low_water = low_water
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self.clock = clock
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        # what the server last told us
+        self.limit = None
+        self.remaining = None
+        self.reset_at = None
+        self.last_cost = 1
+        # what we used
+        self.requests = 0
+        self.cost = 0
+        self.waited = 0.0
+
+    def update(self, rate_limit: dict):
+        """Record the ``rateLimit`` field of a query's result."""
+        with self._lock:
+            self.requests += 1
+            cost = rate_limit.get("cost")
+            if cost is not None:
+                self.cost += cost
+                self.last_cost = max(cost, 1)
+            if rate_limit.get("limit") is not None:
+                self.limit = rate_limit["limit"]
+            if rate_limit.get("remaining") is not None:
+                self.remaining = rate_limit["remaining"]
+            if rate_limit.get("resetAt") is not None:
+                reset_at = datetime.datetime.fromisoformat(
+                    rate_limit["resetAt"].replace("Z", "+00:00")
+                )
+                self.reset_at = reset_at.timestamp()
+
+    def delay(self) -> float:
+        """Seconds to wait before the next request."""
+        with self._lock:
+            if self.remaining is None or self.reset_at is None:
+                return 0.0
+            until_reset = self.reset_at - self.clock()
+            if until_reset <= 0:
+                # the budget has been refilled
+                return 0.0
+            if self.remaining < self.last_cost:
+                return until_reset + 1
+            if self.limit and self.remaining < self.low_water * self.limit:
+                n_requests_left = self.remaining / self.last_cost
+                return until_reset / n_requests_left
+            return 0.0
+
+    def wait(self, seconds: float | None = None):
+        """Wait before a request, for ``seconds`` or for :meth:`delay`."""
+        if seconds is None:
+            seconds = self.delay()
+        if seconds <= 0:
+            return
+        if seconds > self.max_wait:
+            raise RateLimitExceeded(
+                f"Rate limit would need a wait of {seconds:.0f} seconds; "
+                f"the most allowed is {self.max_wait:.0f}"
+            )
+        _logger.info(f"Waiting {seconds:.1f} seconds for the rate limit")
+        self.sleep(seconds)
+        with self._lock:
+            self.waited += seconds
+
+    def retry_delay(self, response: requests.Response) -> float | None:
+        """Seconds to wait before retrying a rate-limited request.
+
+        Returns None if the response isn't a rate limit, so the request
+        shouldn't be retried.
+        """
+        if not _is_rate_limited(response):
+            return None
+        headers = response.headers
+        if "Retry-After" in headers:
+            try:
+                return float(headers["Retry-After"])
+            except ValueError:
+                pass
+        if headers.get("X-RateLimit-Remaining") == "0":
+            try:
+                reset_at = float(headers["X-RateLimit-Reset"])
+            except (KeyError, ValueError):
+                pass
+            else:
+                return max(reset_at - self.clock(), 0) + 1
+        return SECONDARY_LIMIT_WAIT
+
+    def report(self) -> str:
+        """Summary of the budget used, and what's left."""
+        summary = f"{self.requests} GraphQL requests cost {self.cost} points"
+        if self.remaining is not None:
+            summary += f"; {self.remaining}"
+            if self.limit is not None:
+                summary += f" of {self.limit}"
+            summary += " points left"
+        if self.reset_at is not None:
+            reset_at = datetime.datetime.fromtimestamp(
+                self.reset_at, datetime.timezone.utc
+            )
+            summary += f", resetting at {reset_at:%Y-%m-%d %H:%M:%S} UTC"
+        if self.waited:
+            summary += f"; waited {self.waited:.0f} seconds for the rate limit"
+        return summary
+
+
+def _is_rate_limited(response: requests.Response) -> bool:
+    if response.status_code == 429:
+        return True
+    if response.status_code == 403:
+        headers = response.headers
+        return (
+            "Retry-After" in headers
+            or headers.get("X-RateLimit-Remaining") == "0"
+            or "rate limit" in response.text.lower()
+        )
+    if response.status_code == 200:
+        # GraphQL reports running out of the primary budget as an error;
+        # only parse the response if it might be one
+        if b"RATE_LIMITED" not in response.content:
+            return False
+        try:
+            errors = response.json().get("errors") or []
+        except ValueError:
+            return False
+        return any(error.get("type") == "RATE_LIMITED" for error in errors)
+    return False
@@ -0,0 +1,197 @@
+"""
+Release Cache
+
+A disk cache of the releases found for each package by sources that query an
+API (PyPI, GitHub), so that looking up the same package again, from this
+process or another one, doesn't need any requests until the cache expires.
+
+We store the normalized releases (version string and release date), not the
+raw responses: they are much smaller, and reading them back needs no parsing
+beyond the versions themselves.
+"""
+
+import datetime
+import json
+import os
+import time
+from typing import Callable
+
+from spec0.cacheddownload import (
+    OfflineError,
+    atomic_write,
+    cache_lock,
+    record_cache_access,
+)
+
+import logging
+
+_logger = logging.getLogger(__name__)
+
+ReleaseRows = list[tuple[str, datetime.datetime]]
+
+
+class ReleaseCache:
+    """Cached releases for the packages of one source.
+
+    Parameters
+    ----------
+    cache_dir : os.PathLike
+        Directory to store the cached releases in.
+    ttl : float
+        Time-to-live (in seconds) of the cached releases.
+    """
+
+    def __init__(self, cache_dir: os.PathLike, ttl: float = 3600):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+
+    def path(self, key: str) -> str:
+        """Path of the cache file for a key (e.g., a package name)."""
+        return os.path.join(self.cache_dir, *key.split("/")) + ".json"
+
+    def _read(self, path: str, since: datetime.datetime | None) -> ReleaseRows | None:
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        cached_since = data.get("since")
+        if cached_since is not None:
+            cached_since = datetime.datetime.fromisoformat(cached_since)
+            if since is None or since < cached_since:
+                # the cached releases were pruned with a later cutoff
+                return None
+        return [
+            (version, datetime.datetime.fromisoformat(date))
+            for version, date in data["releases"]
+        ]
+
+    def _is_fresh(self, path: str) -> bool:
+        try:
+            return time.time() - os.path.getmtime(path) < self.ttl
+        except OSError:
+            return False
+
+    def _write(self, path: str, rows: ReleaseRows, since: datetime.datetime | None):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = {
+            "since": None if since is None else since.isoformat(),
+            "releases": [(version, date.isoformat()) for version, date in rows],
+        }
+        with atomic_write(path, "w") as f:
+            json.dump(data, f)
+
+    def read(
+        self, key: str, since: datetime.datetime | None = None
+    ) -> ReleaseRows | None:
+        """Read the cached releases for a key, however old they are.
+
+        Returns None if there are none, or if they can't be used with this
+        ``since`` (see :meth:`get_or_fetch`).
+        """
+        return self._read(self.path(key), since)
+
+    def get(
+        self,
+        key: str,
+        offline: bool = False,
+        since: datetime.datetime | None = None,
+    ) -> ReleaseRows | None:
+        """Get the cached releases for a key, or None if they must be fetched.
+
+        Parameters are as for :meth:`get_or_fetch`; with ``offline``, the
+        cached releases are used however old they are.
+        """
+        path = self.path(key)
+        if not (offline or self._is_fresh(path)):
+            return None
+        rows = self._read(path, since)
+        if rows is not None:
+            record_cache_access(path, hit=True)
+        return rows
+
+    def put(
+        self,
+        key: str,
+        rows: ReleaseRows,
+        since: datetime.datetime | None = None,
+    ):
+        """Store freshly fetched releases for a key.
+
+        ``since`` is the cutoff they were pruned with, as for
+        :meth:`get_or_fetch`.
+        """
+        path = self.path(key)
+        self._write(path, rows, since)
+        record_cache_access(path, hit=False)
+
+    def get_or_fetch(
+        self,
+        key: str,
+        fetch: Callable[[], ReleaseRows],
+        offline: bool = False,
+        since: datetime.datetime | None = None,
+        update: Callable[[ReleaseRows], ReleaseRows] | None = None,
+    ) -> ReleaseRows:
+        """Get the cached releases for a key, fetching them if needed.
+
+        Fetching happens while holding a lock on the cache file, so that
+        several processes looking up the same package only fetch it once.
+        Sources that can fetch only what's new can pass ``update``, to bring
+        expired releases up to date instead of fetching them all again.
+
+        Parameters
+        ----------
+        key : str
+            Identifies the package within this source.
+        fetch : Callable[[], list[tuple[str, datetime.datetime]]]
+            Gets the (version string, release date) rows from the source.
+            Any exception it raises is passed on, and nothing is cached.
+        offline : bool
+            If True, never call ``fetch``: use the cached releases however
+            old they are, or raise :class:`.OfflineError`.
+        since : datetime.datetime, optional
+            The cutoff that ``fetch`` prunes old releases with (see
+            :func:`spec0.releasesource.prune_old_minors`). Cached releases
+            are only used if they were fetched with no cutoff or with one
+            that is no later than this.
+        update : Callable[[list], list], optional
+            Called instead of ``fetch`` when there are expired cached
+            releases (usable with ``since``), with those releases; gives
+            the up-to-date releases, in the same form.
+
+        Returns
+        -------
+        list[tuple[str, datetime.datetime]]
+            The (version string, release date) rows.
+        """
+        path = self.path(key)
+        rows = self.get(key, offline=offline, since=since)
+        if rows is not None:
+            return rows
+        if offline:
+            raise OfflineError(
+                f"Releases for '{key}' are not in the cache (expected at "
+                f"{path}) and can't be fetched in offline mode"
+            )
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with cache_lock(path):
+            # another process may have fetched them while we waited
+            if self._is_fresh(path):
+                rows = self._read(path, since)
+                if rows is not None:
+                    record_cache_access(path, hit=True)
+                    return rows
+
+            stale = self._read(path, since) if update is not None else None
+            if stale is not None:
+                _logger.debug(f"Updating releases for '{key}'")
+                rows = update(stale)
+            else:
+                _logger.debug(f"Fetching releases for '{key}'")
+                rows = fetch()
+            self._write(path, rows, since)
+
+        record_cache_access(path, hit=False)
+        return rows
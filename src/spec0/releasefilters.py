@@ -21,6 +21,21 @@ _logger = logging.getLogger(__name__)
 
 
 class ReleaseFilter:
+    # Sources can pre-aggregate releases (see ReleaseSource.get_releases).
+    # Filters that only need the earliest release of each version or minor
+    # version set this to "version" or "minor" so that they are given fewer
+    # releases to process.
+    aggregate = None
+
+    def since(self, package) -> datetime.datetime | None:
+        """Cutoff date for releases that can affect the result.
+
+        Minor versions first released before this date can only matter if
+        they are the latest minor version, so sources may skip them (see
+        :meth:`.ReleaseSource.get_releases`). None if all releases matter.
+        """
+        return None
+
     def filter(self, package, releases): ...
 
 
@@ -61,6 +76,8 @@ def make_specifier(supported_minor_releases, include_upper_bound=True):
 class SPEC0(ReleaseFilter):
     """Filter using SPEC0 rules (time-only)"""
 
+    aggregate = "minor"
+
     def __init__(self, n_months=24, python_override=True):
         self.n_months = n_months
         self.python_override = python_override
@@ -101,12 +118,22 @@ class SPEC0(ReleaseFilter):
 
 
 class SPEC0StrictDate(SPEC0):
+    def since(self, package):
+        # a month of slack keeps us clear of month-length edge cases
+        now = datetime.datetime.now(datetime.timezone.utc)
+        return shift_date_by_months(now, -self._get_n_months(package) - 1)
+
     def drop_date(self, package, release):
         n_months = self._get_n_months(package)
         return shift_date_by_months(release.release_date, n_months)
 
 
 class SPEC0Quarter(SPEC0):
+    def since(self, package):
+        # the drop date is rounded up by at most a quarter
+        now = datetime.datetime.now(datetime.timezone.utc)
+        return shift_date_by_months(now, -self._get_n_months(package) - 4)
+
     def drop_date(self, package, release):
         n_months = self._get_n_months(package)
         naive_drop = shift_date_by_months(release.release_date, n_months)
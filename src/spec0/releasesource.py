@@ -6,18 +6,40 @@ as PyPI, conda-forge, or GitHub, where we can get information about versions
 or a package and associated release dates.
 """
 
+import concurrent.futures
 import dataclasses
 import datetime
+import functools
+import heapq
+import inspect
 import json
 import os
+import re
 import requests
+import subprocess
+import urllib.parse
+import urllib.request
 import warnings
+from packaging.utils import (
+    InvalidSdistFilename,
+    InvalidWheelFilename,
+    canonicalize_name,
+    parse_sdist_filename,
+    parse_wheel_filename,
+)
 from packaging.version import Version, InvalidVersion
 import importlib.resources
 
-from typing import Generator
+from typing import Callable, Generator, Iterable, Iterator, TypeVar
 
-from spec0.cacheddownload import get_file, CACHE_DIR
+from spec0.cacheddownload import OfflineError, get_cache_dir, get_file, is_cached
+from spec0.httpsession import get_session
+from spec0.ratelimit import RATE_LIMIT_FIELD, RateLimitBudget
+from spec0.jlap import get_repodata as get_repodata_jlap
+from spec0.releasecache import ReleaseCache
+from spec0.repodata import compression_suffixes, load_release_store, ReleaseStore
+from spec0.shards import ShardedRepodata, ShardsNotAvailable
+from spec0.utils.packaging import parse_version
 
 import logging
 
@@ -36,41 +58,395 @@ class NoReleaseFound(Exception):
     pass
 
 
+class GitError(Exception):
+    """Raised when the git executable can't be run."""
+
+
+AGGREGATES = ("version", "minor")
+
+
+def _aggregate_key(version: Version, aggregate: str):
+    if aggregate == "version":
+        return version
+    return (version.epoch, version.major, version.minor)
+
+
+def aggregate_releases(releases: Iterable[Release], aggregate: str) -> list[Release]:
+    """Reduce releases to the earliest release of each version.
+
+    Parameters
+    ----------
+    releases : Iterable[Release]
+        The releases to aggregate.
+    aggregate : str
+        Either "version", to keep the earliest release of each version, or
+        "minor", to keep the earliest release of each (epoch, major, minor)
+        version. Prereleases are skipped when aggregating by minor version,
+        since they don't mark the start of support for a minor version.
+
+    Returns
+    -------
+    list[Release]
+        The earliest releases, newest first.
+    """
+    if aggregate not in AGGREGATES:
+        raise ValueError(
+            f"Unknown aggregate '{aggregate}'; expected one of {AGGREGATES}"
+        )
+
+    earliest = {}
+    for release in releases:
+        if aggregate == "minor" and release.version.is_prerelease:
+            continue
+        key = _aggregate_key(release.version, aggregate)
+        current = earliest.get(key)
+        if current is None or release.release_date < current.release_date:
+            earliest[key] = release
+
+    return sorted(earliest.values(), key=lambda r: r.release_date, reverse=True)
+
+
+T = TypeVar("T")
+
+
+def prune_old_minors(
+    items: Iterable[T],
+    since,
+    key: Callable[[T], tuple],
+) -> Iterator[T]:
+    """Skip old releases that can't affect which minor versions are supported.
+
+    A minor version is only supported if its first release is after some
+    cutoff date, or if it is the latest minor version. So once we're past
+    the cutoff, we only need older releases of the minor versions we've
+    already seen, and only until we reach their first (``X.Y.0``) release;
+    the rest of the history can be skipped. Since ``items`` is consumed
+    lazily, this also avoids fetching or parsing the skipped releases.
+
+    A minor version newer than every one seen so far is never skipped, even
+    if it has no release after the cutoff (e.g., when the only recent
+    release is a backport to an older minor version), since it may be the
+    latest minor version.
+
+    This assumes that each minor version's ``X.Y.0`` release is its first
+    final release, and that a minor version's ``X.Y.0`` comes after those of
+    older minor versions. If nothing was released after the cutoff, nothing
+    is skipped.
+
+    Parameters
+    ----------
+    items : Iterable[T]
+        Releases (in any form), newest first, with one item per version:
+        the version's first release. Sources with several releases of a
+        version (e.g., conda builds) must reduce them first.
+    since : datetime.datetime | int | None
+        The cutoff date, comparable with the dates from ``key``. If None,
+        all items are returned.
+    key : Callable[[T], tuple]
+        Gives the (date, version) of an item; the version may be a string
+        or a :class:`~packaging.version.Version`.
+
+    Yields
+    ------
+    T
+        The items that are needed, in their original order.
+    """
+    pruner = _MinorPruner(since)
+    for item in items:
+        if pruner.keep(*key(item)):
+            yield item
+        if pruner.done:
+            return
+
+
+class _MinorPruner:
+    """The state of :func:`prune_old_minors`, fed one release at a time.
+
+    This is for callers that get releases in batches and need to know when
+    to stop asking for more; see :func:`prune_old_minors` for the rules.
+    """
+
+    def __init__(self, since):
+        self.since = since
+        self.open_minors = set()
+        self.closed_minors = set()
+        # newest minor version with a final release seen so far
+        self.newest_minor = None
+        self.seen_recent = False
+        self.done = False
+
+    def keep(self, date, version) -> bool:
+        """Whether to keep the next (older) release; may set ``done``."""
+        if self.since is None:
+            return True
+
+        recent = date >= self.since
+        if not (recent or self.seen_recent):
+            # nothing recent (yet), so we can't skip anything
+            return True
+
+        if not isinstance(version, Version):
+            try:
+                version = parse_version(version)
+            except InvalidVersion:
+                # let the source decide what to do with it
+                return recent
+
+        minor = (version.epoch, version.major, version.minor)
+        final = not version.is_prerelease
+        first = final and version.micro == 0 and not version.is_postrelease
+        newest = final and (self.newest_minor is None or minor > self.newest_minor)
+        if final and newest:
+            self.newest_minor = minor
+        if recent:
+            self.seen_recent = True
+        if recent or newest:
+            # a newer minor than any we've seen may be the latest one
+            if final and minor not in self.closed_minors:
+                self.open_minors.add(minor)
+            keep = True
+        else:
+            keep = minor in self.open_minors
+
+        if first and minor in self.open_minors:
+            self.open_minors.discard(minor)
+            self.closed_minors.add(minor)
+        if not recent and not self.open_minors:
+            self.done = True
+        return keep
+
+
+def _accepted_kwargs(func, **kwargs) -> dict:
+    """The ``kwargs`` that are given (not None) and that ``func`` accepts.
+
+    Sources written before an optional argument (such as ``since``) existed
+    don't take it, so it is only passed to those that do; it only ever lets
+    a source skip work.
+    """
+    try:
+        params = inspect.signature(func).parameters.values()
+    except (TypeError, ValueError):
+        params = []
+    names = {param.name for param in params}
+    any_name = any(param.kind == param.VAR_KEYWORD for param in params)
+    return {
+        name: value
+        for name, value in kwargs.items()
+        if value is not None and (any_name or name in names)
+    }
+
+
 class ReleaseSource:
     """ABC for a source of package releases."""
 
-    def _get_releases(self, package: str) -> Generator[Release, None, None]:
+    def _get_releases(
+        self, package: str, since: datetime.datetime | None = None
+    ) -> Generator[Release, None, None]:
         raise NotImplementedError()
 
-    def get_releases(self, package: str) -> Generator[Release, None, None]:
-        yield from self._get_releases(package)
+    def _get_aggregated_releases(
+        self, package: str, aggregate: str, since: datetime.datetime | None = None
+    ) -> Generator[Release, None, None]:
+        # subclasses can override this when they can aggregate more cheaply
+        # than by creating every release first
+        releases = self._get_releases(
+            package, **_accepted_kwargs(self._get_releases, since=since)
+        )
+        yield from aggregate_releases(releases, aggregate)
 
+    def get_releases(
+        self,
+        package: str,
+        aggregate: str | None = None,
+        since: datetime.datetime | None = None,
+    ) -> Generator[Release, None, None]:
+        """Get the releases of a package, newest first.
 
-class PyPIReleaseSource(ReleaseSource):
-    """A source of package releases from PyPI.
+        Parameters
+        ----------
+        package : str
+            The package name.
+        aggregate : str, optional
+            If given, return only the earliest release of each version
+            ("version") or of each minor version ("minor"); see
+            :func:`aggregate_releases`. By default, all releases are
+            returned; for some sources this includes one release per build.
+        since : datetime.datetime, optional
+            If given, the caller only cares about minor versions first
+            released after this date, plus the latest minor version. Sources
+            may then skip older releases, as described in
+            :func:`prune_old_minors`.
+        """
+        if aggregate is None:
+            yield from self._get_releases(
+                package, **_accepted_kwargs(self._get_releases, since=since)
+            )
+        else:
+            yield from self._get_aggregated_releases(
+                package,
+                aggregate,
+                **_accepted_kwargs(self._get_aggregated_releases, since=since),
+            )
 
-    Typically, you only need one instance of this class.
-    """
 
-    def _get_releases(self, package: str) -> Generator[Release, None, None]:
-        url = f"https://pypi.org/pypi/{package}/json"
-        _logger.debug(f"Fetching {url}")
-        response = requests.get(url)
+PYPI_SIMPLE_CONTENT_TYPE = "application/vnd.pypi.simple.v1+json"
+
+_SDIST_EXTENSIONS = (".tar.gz", ".tar.bz2", ".tar.xz", ".tgz", ".tar", ".zip")
+
+
+def version_from_filename(filename: str, project: str | None = None) -> str | None:
+    """Get the (normalized) version string from the name of a distribution file.
+
+    Wheels, sdists, and eggs are understood. For other files (such as old
+    Windows installers), and for files whose name doesn't give a valid
+    version (such as old platform-specific builds, e.g.
+    ``numpy-1.0.linux-x86_64.tar.gz``), this returns None.
+
+    Parameters
+    ----------
+    filename : str
+        The file name.
+    project : str, optional
+        The project the file belongs to. Sdist names can't always be split
+        into name and version without it (e.g., ``foo-0.5-2.tar.gz``).
+    """
+    if filename.endswith(".whl"):
         try:
-            response.raise_for_status()
-        except requests.exceptions.HTTPError as e:
-            if response.status_code == 404:
-                raise NoReleaseFound(f"No PyPI package '{package}'") from e
-            else:
-                raise
-        data = response.json()
+            return str(parse_wheel_filename(filename)[1])
+        except InvalidWheelFilename:
+            return None
+
+    if filename.endswith(".egg"):
+        stem = filename.removesuffix(".egg")
+        rest = _strip_project(stem, project)
+        # name-version-pyX.Y[-platform], with any "-" in the name or version
+        # escaped
+        return _plain_version(rest.split("-")[0]) if rest else None
+
+    for ext in _SDIST_EXTENSIONS:
+        if filename.endswith(ext):
+            if ext in (".tar.gz", ".zip") and project is not None:
+                try:
+                    name, version = parse_sdist_filename(filename)
+                except InvalidSdistFilename:
+                    pass
+                else:
+                    if name == canonicalize_name(project):
+                        return str(version)
+            stem = filename.removesuffix(ext)
+            if project is None:
+                # the version starts at the first "-" followed by a digit
+                match = re.search(r"-(?=\d)", stem)
+                return _plain_version(stem[match.end() :]) if match else None
+            return _plain_version(_strip_project(stem, project))
+    return None
+
+
+def _strip_project(stem: str, project: str | None) -> str | None:
+    """What follows the project name (and a "-") in a file name stem."""
+    if project is None:
+        name, sep, rest = stem.partition("-")
+        return rest if sep else None
+    canonical = canonicalize_name(project)
+    for i, char in enumerate(stem):
+        if char == "-" and canonicalize_name(stem[:i]) == canonical:
+            return stem[i + 1 :]
+    return None
+
+
+def _plain_version(version_str: str | None) -> str | None:
+    if not version_str:
+        return None
+    try:
+        return str(Version(version_str))
+    except InvalidVersion:
+        return None
+
+
+class _PyPIReleaseSourceBase(ReleaseSource):
+    """Releases from PyPI's Simple API or legacy JSON API, however read.
+
+    Subclasses get the API responses (see :class:`PyPIReleaseSource` and
+    :class:`LocalPyPIReleaseSource`); this turns them into releases.
+    """
+
+    api = "simple"
+
+    def _upload_times_simple(self, package: str) -> dict[str, list[str]] | None:
+        """Upload times of each version's files, from the Simple API.
+
+        Returns None if the response can't be used, so that the legacy API
+        should be tried.
+        """
+        raise NotImplementedError()
+
+    def _upload_times_json(self, package: str) -> dict[str, list[str]]:
+        """Upload times of each version's files, from the legacy JSON API."""
+        raise NotImplementedError()
+
+    def _release_rows(self, package: str) -> list[tuple[str, datetime.datetime]]:
+        return self._fetch_releases(package)
+
+    @staticmethod
+    def _upload_times_from_simple(
+        data: dict, where: str
+    ) -> dict[str, list[str]] | None:
+        """Upload times of each version's files, from a Simple API page.
+
+        Returns None if the page can't be used (see
+        :meth:`_upload_times_simple`); ``where`` is only used for logging.
+        """
+        api_version = data.get("meta", {}).get("api-version", "1.0")
+        if parse_version(api_version) < Version("1.1"):
+            # upload times were added in version 1.1 (PEP 700)
+            _logger.debug(f"{where} uses Simple API {api_version}; need 1.1")
+            return None
+
+        files = data.get("files", [])
+        if files and not any(file_info.get("upload-time") for file_info in files):
+            # upload times are optional; an index that gives none is no use
+            _logger.debug(f"{where} gives no upload times")
+            return None
+
+        project = data.get("name")
+        upload_times = {}
+        for file_info in files:
+            version_str = version_from_filename(file_info.get("filename", ""), project)
+            if version_str is not None:
+                upload_times.setdefault(version_str, []).append(
+                    file_info.get("upload-time")
+                )
+        return upload_times
+
+    @staticmethod
+    def _upload_times_from_json(data: dict) -> dict[str, list[str]]:
+        return {
+            version_str: [file_info.get("upload_time_iso_8601") for file_info in files]
+            for version_str, files in data.get("releases", {}).items()
+        }
+
+    def _get_releases(
+        self, package: str, since: datetime.datetime | None = None
+    ) -> Generator[Release, None, None]:
+        rows = self._release_rows(package)
+        for version_str, release_date in prune_old_minors(
+            rows, since, key=lambda row: (row[1], row[0])
+        ):
+            yield Release(parse_version(version_str), release_date)
+
+    def _fetch_releases(self, package: str) -> list[tuple[str, datetime.datetime]]:
+        """Get the (version string, date) of each release, newest first."""
+        upload_times = None
+        if self.api == "simple":
+            upload_times = self._upload_times_simple(package)
+        if upload_times is None:
+            upload_times = self._upload_times_json(package)
 
-        releases_data = data.get("releases", {})
         release_list = []
 
-        for version_str, files in releases_data.items():
+        for version_str, times in upload_times.items():
             try:
-                parsed_version = Version(version_str)
+                parsed_version = parse_version(version_str)
             except InvalidVersion:
                 warnings.warn(
                     f"Skipping invalid version '{version_str}' for package '{package}'."
@@ -78,8 +454,7 @@ class PyPIReleaseSource(ReleaseSource):
                 continue
 
             earliest_date = None
-            for file_info in files:
-                upload_time_str = file_info.get("upload_time_iso_8601")
+            for upload_time_str in times:
                 if upload_time_str:
                     dt = datetime.datetime.fromisoformat(
                         upload_time_str.replace("Z", "+00:00")
@@ -96,8 +471,215 @@ class PyPIReleaseSource(ReleaseSource):
         release_list.sort(key=lambda r: r.release_date, reverse=True)
         if not release_list:
             raise NoReleaseFound(f"No releases found for package '{package}'")
-        for release in release_list:
-            yield release
+        return [(str(r.version), r.release_date) for r in release_list]
+
+
+class PyPIReleaseSource(_PyPIReleaseSourceBase):
+    """A source of package releases from PyPI.
+
+    Typically, you only need one instance of this class.
+
+    By default, this uses the JSON form of PyPI's Simple API (PEP 691), which
+    gives the upload time of each file (PEP 700) in a much smaller response
+    than the legacy ``/pypi/<package>/json`` API. Versions are taken from the
+    file names. If the index doesn't serve usable Simple API JSON, this falls
+    back to the legacy API.
+
+    Parameters
+    ----------
+    session : requests.Session, optional
+        Session to make requests with. Defaults to the shared session (see
+        :func:`spec0.httpsession.get_session`).
+    offline : bool
+        If True, never make a request; only use cached releases, and raise
+        :class:`.OfflineError` for packages that aren't cached.
+    api : str
+        Which API to use: "simple" (the default) or "json" (the legacy API).
+    ttl : float
+        Time-to-live (in seconds) of the cached releases of each package.
+    cache_dir : os.PathLike, optional
+        Directory to cache releases in. Defaults to ``pypi`` in the cache
+        directory (see :func:`.get_cache_dir`).
+    """
+
+    def __init__(
+        self,
+        session: requests.Session | None = None,
+        offline: bool = False,
+        api: str = "simple",
+        ttl: float = 3600,
+        cache_dir: os.PathLike | None = None,
+    ):
+        if api not in ("simple", "json"):
+            raise ValueError(f"Unknown PyPI API '{api}'; expected 'simple' or 'json'")
+        self.session = session if session is not None else get_session()
+        self.offline = offline
+        self.api = api
+        if cache_dir is None:
+            cache_dir = os.path.join(get_cache_dir(), "pypi")
+        self.cache = ReleaseCache(cache_dir, ttl)
+
+    def _get(self, url: str, package: str, **kwargs) -> requests.Response:
+        _logger.debug(f"Fetching {url}")
+        response = self.session.get(url, **kwargs)
+        try:
+            response.raise_for_status()
+        except requests.exceptions.HTTPError as e:
+            if response.status_code == 404:
+                raise NoReleaseFound(f"No PyPI package '{package}'") from e
+            else:
+                raise
+        return response
+
+    def _upload_times_simple(self, package: str) -> dict[str, list[str]] | None:
+        """Upload times of each version's files, from the Simple API.
+
+        Returns None if the response can't be used, so that the legacy API
+        should be tried.
+        """
+        url = f"https://pypi.org/simple/{canonicalize_name(package)}/"
+        response = self._get(url, package, headers={"Accept": PYPI_SIMPLE_CONTENT_TYPE})
+        content_type = response.headers.get("Content-Type", "")
+        if not content_type.startswith(PYPI_SIMPLE_CONTENT_TYPE):
+            _logger.debug(f"{url} returned {content_type}, not Simple API JSON")
+            return None
+
+        return self._upload_times_from_simple(response.json(), url)
+
+    def _upload_times_json(self, package: str) -> dict[str, list[str]]:
+        """Upload times of each version's files, from the legacy JSON API."""
+        url = f"https://pypi.org/pypi/{package}/json"
+        return self._upload_times_from_json(self._get(url, package).json())
+
+    def _release_rows(self, package: str) -> list[tuple[str, datetime.datetime]]:
+        return self.cache.get_or_fetch(
+            canonicalize_name(package),
+            lambda: self._fetch_releases(package),
+            offline=self.offline,
+        )
+
+
+class LocalPyPIReleaseSource(_PyPIReleaseSourceBase):
+    """A source of package releases from a local mirror of PyPI.
+
+    This reads the files that a mirror such as bandersnatch writes for each
+    project, without making any requests: the PEP 691 Simple API JSON
+    (``simple/<project>/index.v1_json``) or the legacy JSON API
+    (``json/<project>`` or ``pypi/<project>/json``). Files are only opened
+    when their project is looked up, and nothing is cached, since reading
+    the mirror is about as fast as reading a cache would be.
+
+    Parameters
+    ----------
+    root : os.PathLike | str
+        The mirror's web root (the directory containing ``simple`` and
+        ``json``), or the mirror directory containing ``web``. May also be
+        a ``file://`` URL.
+    api : str
+        Which files to prefer: "simple" (the default) or "json". Either
+        way, the other kind of file is used if the preferred one is
+        missing or can't be used.
+    """
+
+    def __init__(self, root: os.PathLike | str, api: str = "simple"):
+        if api not in ("simple", "json"):
+            raise ValueError(f"Unknown PyPI API '{api}'; expected 'simple' or 'json'")
+        root = os.fspath(root)
+        parsed = urllib.parse.urlparse(root)
+        if parsed.scheme == "file":
+            root = urllib.request.url2pathname(parsed.path)
+        if os.path.isdir(os.path.join(root, "web")):
+            root = os.path.join(root, "web")
+        if not os.path.isdir(root):
+            raise ValueError(f"PyPI mirror '{root}' is not a directory")
+        self.root = root
+        self.api = api
+
+    def _read_json(self, paths: Iterable[str]) -> tuple[dict, str] | None:
+        """Load the first of ``paths`` that exists, and return it with its path.
+
+        Returns None if none of them exist.
+        """
+        for path in paths:
+            try:
+                with open(path, "rb") as f:
+                    data = json.load(f)
+            except FileNotFoundError:
+                continue
+            _logger.debug(f"Read {path}")
+            return data, path
+        return None
+
+    def _simple_paths(self, package: str) -> list[str]:
+        name = canonicalize_name(package)
+        return [
+            os.path.join(self.root, "simple", name, "index.v1_json"),
+            # bandersnatch's hash-index layout
+            os.path.join(self.root, "simple", name[0], name, "index.v1_json"),
+        ]
+
+    def _json_paths(self, package: str) -> list[str]:
+        name = canonicalize_name(package)
+        return [
+            os.path.join(self.root, "json", name),
+            os.path.join(self.root, "pypi", name, "json"),
+            os.path.join(self.root, "json", package),
+        ]
+
+    def _upload_times_simple(self, package: str) -> dict[str, list[str]] | None:
+        found = self._read_json(self._simple_paths(package))
+        if found is None:
+            return None
+        data, path = found
+        return self._upload_times_from_simple(data, path)
+
+    def _upload_times_json(self, package: str) -> dict[str, list[str]]:
+        found = self._read_json(self._json_paths(package))
+        if found is None:
+            # the Simple API page is only tried first with api="simple"
+            if self.api == "json":
+                upload_times = self._upload_times_simple(package)
+                if upload_times is not None:
+                    return upload_times
+            raise NoReleaseFound(
+                f"No package '{package}' in the PyPI mirror at {self.root}"
+            )
+        return self._upload_times_from_json(found[0])
+
+
+GITHUB_GRAPHQL_URL = "https://api.github.com/graphql"
+
+# the most repositories to ask for in one query by default; each gets a
+# page of 100 tags, which keeps queries well within GitHub's node limit
+GITHUB_BATCH_SIZE = 50
+
+# the tags of a repository, newest first; used within a ``repository`` field
+_GITHUB_REFS_SELECTION = """
+    refs(after:$after, first:100, refPrefix:"refs/tags/", orderBy:{field:TAG_COMMIT_DATE, direction:DESC}) {
+
+      pageInfo {
+        endCursor
+        hasNextPage
+      }
+
+      nodes {
+        name
+
+        target {
+          # looks like this is what you get if you create the tag in the UI
+          ... on Commit {
+            committedDate
+          }
+          # and this is if you don't? or something?
+          ... on Tag {
+            tagger {
+              date
+            }
+          }
+        }
+      }
+    }
+"""
 
 
 class GitHubReleaseSource(ReleaseSource):
@@ -109,10 +691,40 @@ class GitHubReleaseSource(ReleaseSource):
     ----------
     github_token : str
         Personal access token (PAT) with permissions to query the desired repository.
+    session : requests.Session, optional
+        Session to make requests with. Defaults to the shared session (see
+        :func:`spec0.httpsession.get_session`).
+    offline : bool
+        If True, never make a request; only use cached releases, and raise
+        :class:`.OfflineError` for repositories that aren't cached.
+    ttl : float
+        Time-to-live (in seconds) of the cached releases of each repository.
+    cache_dir : os.PathLike, optional
+        Directory to cache releases in. Defaults to ``github`` in the cache
+        directory (see :func:`.get_cache_dir`).
+    budget : RateLimitBudget, optional
+        Tracks GitHub's rate limit, pacing our requests to stay within it
+        and retrying requests that hit it; see :mod:`spec0.ratelimit`. Its
+        :meth:`~.RateLimitBudget.report` says how much of the budget was
+        used.
     """
 
-    def __init__(self, github_token: str):
+    def __init__(
+        self,
+        github_token: str,
+        session: requests.Session | None = None,
+        offline: bool = False,
+        ttl: float = 3600,
+        cache_dir: os.PathLike | None = None,
+        budget: RateLimitBudget | None = None,
+    ):
         self.github_token = github_token
+        self.session = session if session is not None else get_session()
+        self.offline = offline
+        self.budget = budget if budget is not None else RateLimitBudget()
+        if cache_dir is None:
+            cache_dir = os.path.join(get_cache_dir(), "github")
+        self.cache = ReleaseCache(cache_dir, ttl)
         trav = importlib.resources.files("spec0")
         jsonstr = trav.joinpath("data/github-releases.json").read_text()
         self.canonical_sources = json.loads(jsonstr)
@@ -126,15 +738,118 @@ class GitHubReleaseSource(ReleaseSource):
         else:
             return False
 
-    def _get_releases(self, package: str):
+    def _get_releases(self, package: str, since: datetime.datetime | None = None):
+        owner_repo = self._owner_repo(package)
+
+        # tags come newest first, so with a cutoff we can usually stop
+        # paging long before the end of the history
+        rows = self.cache.get_or_fetch(
+            owner_repo.lower(),
+            lambda: [
+                (str(release.version), release.release_date)
+                for release in prune_old_minors(
+                    self._get_releases_owner_repo(owner_repo),
+                    since,
+                    key=lambda release: (release.release_date, release.version),
+                )
+            ],
+            offline=self.offline,
+            since=since,
+            update=lambda rows: self._update_rows(owner_repo, rows),
+        )
+        for version_str, release_date in rows:
+            yield Release(parse_version(version_str), release_date)
+
+    def _update_rows(
+        self, owner_repo: str, rows: list[tuple[str, datetime.datetime]]
+    ) -> list[tuple[str, datetime.datetime]]:
+        """Add the tags made since the (expired) cached ``rows`` to them.
+
+        Tags come newest first, so we only page through them until we reach
+        one we already know; for most repositories, that's on the first page.
+        """
+        known = _KnownReleases(rows)
+        new_rows = []
+        for release in self._get_releases_owner_repo(owner_repo):
+            if known.reached(release):
+                break
+            new_rows.append((str(release.version), release.release_date))
+        _logger.debug(f"Found {len(new_rows)} new tags in '{owner_repo}'")
+        return known.merge(new_rows)
+
+    def _owner_repo(self, package: str) -> str:
         if package.count("/") == 1:
-            owner_repo = package
+            return package
         elif package in self.canonical_sources:
-            owner_repo = self.canonical_sources[package]
+            return self.canonical_sources[package]
         else:
             raise NoReleaseFound(f"GitHub repository for package '{package}' not found")
 
-        yield from self._get_releases_owner_repo(owner_repo)
+    def _headers(self) -> dict[str, str]:
+        token = self.github_token
+        if token is None:
+            token = os.environ.get("GITHUB_TOKEN")
+
+        if token is None:
+            raise ValueError(
+                "GitHub token not provided. Please set the GITHUB_TOKEN "
+                "environment variable."
+            )
+
+        return {
+            "Authorization": f"Bearer {token}",
+            "Accept": "application/vnd.github.v3+json",
+        }
+
+    def _graphql(self, query: str, variables: dict) -> dict:
+        """Run a GraphQL query, and return its ``data``.
+
+        Requests are paced to stay within the rate limit, and retried
+        (after waiting as GitHub asks) if they hit it anyway.
+        """
+        headers = self._headers()
+        for attempt in range(self.budget.max_retries + 1):
+            self.budget.wait()
+            response = self.session.post(
+                GITHUB_GRAPHQL_URL,
+                json={"query": query, "variables": variables},
+                headers=headers,
+            )
+            delay = self.budget.retry_delay(response)
+            if delay is None or attempt == self.budget.max_retries:
+                break
+            _logger.info(f"GitHub rate limit hit (HTTP {response.status_code})")
+            self.budget.wait(delay)
+
+        response.raise_for_status()
+        result = response.json()
+        data = result.get("data")
+        if data is None:
+            messages = [error.get("message") for error in result.get("errors", [])]
+            raise RuntimeError(f"GitHub GraphQL query failed: {messages}")
+        self.budget.update(data.get("rateLimit") or {})
+        return data
+
+    @staticmethod
+    def _releases_from_refs(refs: dict) -> Generator[Release, None, None]:
+        """Releases from the tag nodes of one page of ``refs``."""
+        for node in refs["nodes"]:
+            tag_name = node["name"]
+            try:
+                version = parse_version(tag_name)
+            except InvalidVersion:
+                warnings.warn(f"Skipping invalid version: {tag_name}", UserWarning)
+                continue  # Skip this release
+
+            if "tagger" in node["target"]:
+                datestr = node["target"]["tagger"]["date"]
+            else:
+                datestr = node["target"]["committedDate"]
+
+            release_date = datetime.datetime.fromisoformat(
+                datestr.replace("Z", "+00:00")
+            )
+            yield Release(version, release_date)
 
     def _get_releases_owner_repo(self, owner_repo: str):
         """
@@ -160,53 +875,19 @@ class GitHubReleaseSource(ReleaseSource):
         """
         owner, repo = owner_repo.split("/", 1)
 
-        query = """
-        query($owner: String!, $repo: String!, $after: String) {
-          repository(owner: $owner, name: $repo) {
-            refs(after:$after, first:100, refPrefix:"refs/tags/", orderBy:{field:TAG_COMMIT_DATE, direction:DESC}) {
-
-              pageInfo {
-                endCursor
-                hasNextPage
-              }
-
-              nodes {
-                name
-
-                target {
-                  # looks like this is what you get if you create the tag in the UI
-                  ... on Commit {
-                    committedDate
-                  }
-                  # and this is if you don't? or something?
-                  ... on Tag {
-                    tagger {
-                      date
-                    }
-                  }
-                }
-              }
-            }
-          }
-        }
-        """
-
-        token = self.github_token
-        if token is None:
-            token = os.environ.get("GITHUB_TOKEN")
+        query = (
+            "query($owner: String!, $repo: String!, $after: String) {\n"
+            f"  {RATE_LIMIT_FIELD}\n"
+            "  repository(owner: $owner, name: $repo) {"
+            + _GITHUB_REFS_SELECTION
+            + "  }\n}"
+        )
 
-        if token is None:
-            raise ValueError(
-                "GitHub token not provided. Please set the GITHUB_TOKEN "
-                "environment variable."
+        if self.offline:
+            raise OfflineError(
+                f"Can't look up '{owner_repo}' on GitHub in offline mode"
             )
 
-        url = "https://api.github.com/graphql"
-        headers = {
-            "Authorization": f"Bearer {token}",
-            "Accept": "application/vnd.github.v3+json",
-        }
-
         has_next_page = True
         after_cursor = None
 
@@ -218,31 +899,11 @@ class GitHubReleaseSource(ReleaseSource):
                 "repo": repo,
                 "after": after_cursor,
             }
-            response = requests.post(
-                url, json={"query": query, "variables": variables}, headers=headers
-            )
-            response.raise_for_status()
-
-            data = response.json()
-            releases_data = data["data"]["repository"]["refs"]
-
-            for node in releases_data["nodes"]:
-                tag_name = node["name"]
-                try:
-                    version = Version(tag_name)
-                except InvalidVersion:
-                    warnings.warn(f"Skipping invalid version: {tag_name}", UserWarning)
-                    continue  # Skip this release
-
-                if "tagger" in node["target"]:
-                    datestr = node["target"]["tagger"]["date"]
-                else:
-                    datestr = node["target"]["committedDate"]
+            data = self._graphql(query, variables)
+            releases_data = data["repository"]["refs"]
 
-                release_date = datetime.datetime.fromisoformat(
-                    datestr.replace("Z", "+00:00")
-                )
-                yield Release(version, release_date)
+            for release in self._releases_from_refs(releases_data):
+                yield release
                 found_package = True
 
             has_next_page = releases_data["pageInfo"]["hasNextPage"]
@@ -253,6 +914,278 @@ class GitHubReleaseSource(ReleaseSource):
                 f"No releases found for GitHub repository '{owner_repo}'"
             )
 
+    def get_releases_batch(
+        self,
+        packages: Iterable[str],
+        since: datetime.datetime | None = None,
+        batch_size: int = GITHUB_BATCH_SIZE,
+    ) -> dict[str, list[Release]]:
+        """Get the releases of several packages with as few requests as possible.
+
+        Instead of querying each repository separately, this puts up to
+        ``batch_size`` repositories into each GraphQL query (as aliased
+        ``repository`` fields), and then only asks for further pages of
+        the repositories that need them. Releases that are already cached
+        aren't fetched again, and for expired ones, only the newer tags
+        are fetched.
+
+        Parameters
+        ----------
+        packages : Iterable[str]
+            Package names, or "owner/repo" strings.
+        since : datetime.datetime, optional
+            As for :meth:`.ReleaseSource.get_releases`; repositories stop
+            being paged through once older tags can't matter.
+        batch_size : int
+            The most repositories to query in one request.
+
+        Returns
+        -------
+        dict[str, list[Release]]
+            The releases of each package, newest first. Packages that have
+            no GitHub repository, or no releases in it, are left out.
+        """
+        releases = {}
+        to_fetch = {}  # owner_repo -> packages
+        stale = {}  # owner_repo -> expired cached rows
+        for package in packages:
+            try:
+                owner_repo = self._owner_repo(package)
+            except NoReleaseFound:
+                _logger.debug(f"No GitHub repository for '{package}'")
+                continue
+            rows = self.cache.get(owner_repo.lower(), self.offline, since)
+            if rows is not None:
+                releases[package] = [
+                    Release(parse_version(version_str), release_date)
+                    for version_str, release_date in rows
+                ]
+                continue
+            if owner_repo not in to_fetch:
+                rows = self.cache.read(owner_repo.lower(), since)
+                if rows is not None:
+                    stale[owner_repo] = rows
+            to_fetch.setdefault(owner_repo, []).append(package)
+
+        if to_fetch and self.offline:
+            raise OfflineError(
+                f"Can't look up {sorted(to_fetch)} on GitHub in offline mode"
+            )
+
+        known = {owner_repo: _KnownReleases(rows) for owner_repo, rows in stale.items()}
+        fetched = self._fetch_batch(list(to_fetch), since, batch_size, known)
+        for owner_repo, repo_releases in fetched.items():
+            rows = [(str(r.version), r.release_date) for r in repo_releases]
+            if owner_repo in known:
+                rows = known[owner_repo].merge(rows)
+            if not rows:
+                continue
+            self.cache.put(owner_repo.lower(), rows, since)
+            repo_releases = [
+                Release(parse_version(version_str), release_date)
+                for version_str, release_date in rows
+            ]
+            for package in to_fetch[owner_repo]:
+                releases[package] = repo_releases
+        return releases
+
+    def _fetch_batch(
+        self,
+        owner_repos: list[str],
+        since: datetime.datetime | None,
+        batch_size: int,
+        known: dict[str, "_KnownReleases"] | None = None,
+    ) -> dict[str, list[Release]]:
+        """Page through the tags of many repositories at once.
+
+        For repositories in ``known``, only the tags newer than the known
+        ones are returned. Repositories that don't exist are left out.
+        """
+        known = known if known is not None else {}
+        found = {owner_repo: [] for owner_repo in owner_repos}
+        pruners = {owner_repo: _MinorPruner(since) for owner_repo in owner_repos}
+        cursors = {owner_repo: None for owner_repo in owner_repos}
+        pending = list(owner_repos)
+        while pending:
+            still_pending = []
+            for start in range(0, len(pending), batch_size):
+                batch = pending[start : start + batch_size]
+                query, variables = _github_batch_query(batch, cursors)
+                data = self._graphql(query, variables)
+                for i, owner_repo in enumerate(batch):
+                    repository = data.get(f"r{i}")
+                    if repository is None:
+                        _logger.debug(f"No GitHub repository '{owner_repo}'")
+                        del found[owner_repo]
+                        continue
+                    refs = repository["refs"]
+                    pruner = pruners[owner_repo]
+                    done = False
+                    for release in self._releases_from_refs(refs):
+                        if owner_repo in known and known[owner_repo].reached(release):
+                            done = True
+                            break
+                        if pruner.keep(release.release_date, release.version):
+                            found[owner_repo].append(release)
+                        if pruner.done:
+                            done = True
+                            break
+                    if refs["pageInfo"]["hasNextPage"] and not done:
+                        cursors[owner_repo] = refs["pageInfo"]["endCursor"]
+                        still_pending.append(owner_repo)
+            pending = still_pending
+
+        return found
+
+
+class _KnownReleases:
+    """Releases we already have for a repository, to sync newer tags into.
+
+    The newest of them is the high-water mark: once paging through tags
+    (newest first) reaches a known tag that isn't newer than that, the rest
+    are known too. Tags added for commits older than the high-water mark
+    (e.g., a late tag of an old commit) are only found by a full fetch.
+    """
+
+    def __init__(self, rows: list[tuple[str, datetime.datetime]]):
+        self.rows = rows
+        self.versions = {version_str for version_str, _ in rows}
+        self.newest = max((date for _, date in rows), default=None)
+
+    def reached(self, release: Release) -> bool:
+        """Whether this and all older tags are already known."""
+        return (
+            str(release.version) in self.versions
+            and release.release_date <= self.newest
+        )
+
+    def merge(
+        self, new_rows: list[tuple[str, datetime.datetime]]
+    ) -> list[tuple[str, datetime.datetime]]:
+        """The known rows with ``new_rows`` added, newest first."""
+        merged = [row for row in new_rows if row[0] not in self.versions]
+        merged += self.rows
+        merged.sort(key=lambda row: row[1], reverse=True)
+        return merged
+
+
+def _github_batch_query(
+    owner_repos: list[str], cursors: dict[str, str | None]
+) -> tuple[str, dict]:
+    """A GraphQL query for a page of tags from each of several repositories.
+
+    The result for ``owner_repos[i]`` is under the alias ``r<i>``.
+    """
+    params = []
+    fields = []
+    variables = {}
+    for i, owner_repo in enumerate(owner_repos):
+        owner, repo = owner_repo.split("/", 1)
+        params.append(f"$o{i}: String!, $n{i}: String!, $a{i}: String")
+        fields.append(
+            f"  r{i}: repository(owner: $o{i}, name: $n{i}) {{"
+            + _GITHUB_REFS_SELECTION.replace("$after", f"$a{i}")
+            + "  }\n"
+        )
+        variables.update(
+            {f"o{i}": owner, f"n{i}": repo, f"a{i}": cursors.get(owner_repo)}
+        )
+    query = (
+        f"query({', '.join(params)}) {{\n  {RATE_LIMIT_FIELD}\n" + "".join(fields) + "}"
+    )
+    return query, variables
+
+
+# tag name and date: the tagger date of annotated tags, or the commit date
+# of lightweight ones (as for GitHubReleaseSource)
+_GIT_TAG_FORMAT = "%(refname:strip=2)%00%(creatordate:iso-strict)"
+
+
+class GitReleaseSource(ReleaseSource):
+    """A source of package releases from the tags of local git repositories.
+
+    This gives the same releases as :class:`GitHubReleaseSource`, but reads
+    them from a clone (or bare mirror) of the repository, so it needs no
+    network access and no token. All tags are listed by a single ``git
+    for-each-ref`` call, however many there are.
+
+    Parameters
+    ----------
+    repositories : dict[str, os.PathLike], optional
+        The path of the repository for each package. Packages that aren't
+        in it are taken to be paths of repositories themselves.
+    git : str
+        The git executable to use.
+    """
+
+    def __init__(
+        self,
+        repositories: dict[str, os.PathLike] | None = None,
+        git: str = "git",
+    ):
+        self.repositories = dict(repositories) if repositories else {}
+        self.git = git
+
+    def _repository(self, package: str) -> str:
+        if package in self.repositories:
+            return os.fspath(self.repositories[package])
+        elif os.path.isdir(package):
+            return package
+        else:
+            raise NoReleaseFound(f"No git repository for package '{package}'")
+
+    def _list_tags(self, repository: str) -> list[tuple[str, datetime.datetime]]:
+        """(name, date) of each tag in a repository, newest first."""
+        cmd = [
+            self.git,
+            "-C",
+            repository,
+            "for-each-ref",
+            "--sort=-creatordate",
+            f"--format={_GIT_TAG_FORMAT}",
+            "refs/tags",
+        ]
+        _logger.debug(f"Running {' '.join(cmd)}")
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True)
+        except OSError as e:
+            # e.g., git isn't installed: a problem with the setup, not with
+            # the package, so don't report it as the package having no releases
+            raise GitError(
+                f"Unable to run '{self.git}' to list tags of git repository "
+                f"'{repository}': {e}"
+            ) from e
+        if result.returncode != 0:
+            raise NoReleaseFound(
+                f"Unable to list tags of git repository '{repository}': "
+                f"{result.stderr.strip()}"
+            )
+        tags = []
+        for line in result.stdout.splitlines():
+            if line:
+                tag_name, datestr = line.split("\0", 1)
+                release_date = datetime.datetime.fromisoformat(datestr)
+                tags.append((tag_name, release_date.astimezone(datetime.timezone.utc)))
+        return tags
+
+    def _get_releases(self, package: str, since: datetime.datetime | None = None):
+        repository = self._repository(package)
+        found_package = False
+        for tag_name, release_date in prune_old_minors(
+            self._list_tags(repository), since, key=lambda tag: (tag[1], tag[0])
+        ):
+            try:
+                version = parse_version(tag_name)
+            except InvalidVersion:
+                warnings.warn(f"Skipping invalid version: {tag_name}", UserWarning)
+                continue  # Skip this release
+
+            yield Release(version, release_date)
+            found_package = True
+
+        if not found_package:
+            raise NoReleaseFound(f"No releases found for git repository '{repository}'")
+
 
 class CondaReleaseSource(ReleaseSource):
     """
@@ -262,56 +1195,183 @@ class CondaReleaseSource(ReleaseSource):
     channel_platforms : list[str]
         A list of strings of the form "channel/platform", e.g.,
         "conda-forge/linux-64".
+    jlap : bool
+        If True, keep the cached repodata up to date with the channel's
+        incremental JLAP patches instead of downloading it again when it
+        expires. This uses uncompressed ``repodata.json``, since the patches
+        apply to that.
+    max_workers : int
+        Maximum number of channel/platforms to download and load at the same
+        time.
+    shards : bool
+        If True, use sharded repodata where the channel publishes it, so that
+        only the data for the packages that are looked up is downloaded.
+        Channel/platforms without shards use ``repodata.json``. Requires the
+        optional ``msgpack`` and ``zstandard`` packages.
+    session : requests.Session, optional
+        Session to make requests with. Defaults to the shared session (see
+        :func:`spec0.httpsession.get_session`); its connection pool should
+        allow at least ``max_workers`` connections per host.
+    stale_while_revalidate : float
+        How long (in seconds) after it expires cached repodata may still be
+        used. Within this window, the cached copy is used immediately and is
+        refreshed in the background; see :func:`.get_file`.
+    ttl : float, optional
+        Time-to-live (in seconds) of cached repodata. If None (the default),
+        the channel's ``Cache-Control: max-age`` is used, or 3600 if it
+        doesn't send one; if given, it takes precedence over max-age.
+    offline : bool
+        If True, only use cached repodata, however old; fail with
+        :class:`.OfflineError` if a channel/platform isn't cached.
+    cache_dir : os.PathLike, optional
+        Directory to cache repodata in. Defaults to the cache directory (see
+        :func:`.get_cache_dir`).
     """
 
-    def __init__(self, channel_platforms: list[str]):
-        # TODO: determine if can use the bz2 instead
-        self._repodata = {"packages": {}, "packages.conda": {}}
-
-        for channel_platform in channel_platforms:
+    def __init__(
+        self,
+        channel_platforms: list[str],
+        jlap: bool = False,
+        max_workers: int = 4,
+        shards: bool = False,
+        session: requests.Session | None = None,
+        stale_while_revalidate: float = 0,
+        ttl: float | None = None,
+        offline: bool = False,
+        cache_dir: os.PathLike | None = None,
+    ):
+        self.session = session if session is not None else get_session()
+        self.stale_while_revalidate = stale_while_revalidate
+        self.ttl = ttl
+        self.offline = offline
+        self.cache_dir = cache_dir if cache_dir is not None else get_cache_dir()
+        self.jlap = jlap
+        self.shards = shards
+        # map preserves the input order, so stores are always merged in the
+        # order the channels were given
+        with concurrent.futures.ThreadPoolExecutor(max_workers) as executor:
+            self._stores = list(executor.map(self._load_store, channel_platforms))
+
+    def _load_store(self, channel_platform: str) -> ReleaseStore | ShardedRepodata:
+        if self.shards:
             channel, platform = channel_platform.split("/", 1)
-            url = f"https://conda.anaconda.org/{channel}/{platform}/repodata.json"
-            cachefile = CACHE_DIR / channel_platform / "repodata.json"
-            cachefile = get_file(url, cachefile)
-            with open(cachefile, "r") as f:
-                data = json.load(f)
-
-            # Merge packages
-            for pkg_name, pkg_info in data.get("packages", {}).items():
-                self._repodata["packages"][pkg_name] = pkg_info
-            for pkg_name, pkg_info in data.get("packages.conda", {}).items():
-                self._repodata["packages.conda"][pkg_name] = pkg_info
-
-    def _get_releases(self, package):
-        # Combine "packages" and "packages.conda" if present
-        package_entries = self._repodata.get("packages", {})
-        packages_conda_entries = self._repodata.get("packages.conda", {})
-        all_packages = {**package_entries, **packages_conda_entries}
+            subdir_url = f"https://conda.anaconda.org/{channel}/{platform}"
+            try:
+                return ShardedRepodata(
+                    subdir_url,
+                    os.path.join(self.cache_dir, channel_platform),
+                    ttl=self.ttl,
+                    session=self.session,
+                    stale_while_revalidate=self.stale_while_revalidate,
+                    offline=self.offline,
+                )
+            except ShardsNotAvailable as e:
+                _logger.info(f"{e}; using repodata.json for {channel_platform}")
 
-        releases = []
-        for pkg_key, pkg_info in all_packages.items():
-            if pkg_info.get("name") == package:
-                version_str = pkg_info["version"]
-
-                # The conda timestamp is in milliseconds since epoch
-                timestamp = pkg_info.get("timestamp")
-                if timestamp is not None:
-                    release_date = datetime.datetime.fromtimestamp(
-                        timestamp / 1000, datetime.timezone.utc
-                    )
-                else:
-                    # warnings.warn(f"No release date for {pkg_key}")
-                    release_date = None
+        cachefile = self._download_repodata(channel_platform)
+        return load_release_store(cachefile)
 
-                if release_date is not None:
-                    releases.append(
-                        Release(version=Version(version_str), release_date=release_date)
-                    )
+    def _download_repodata(self, channel_platform: str) -> str:
+        """Download repodata for a channel/platform, preferring compression.
+
+        Compressed variants that the channel doesn't publish (404) are
+        skipped in favor of the next option; uncompressed ``repodata.json``
+        is the last resort. A variant that is cached and fresh is used
+        without asking for the preferred ones, so a warm cache makes no
+        requests.
+        """
+        channel, platform = channel_platform.split("/", 1)
+        base_url = f"https://conda.anaconda.org/{channel}/{platform}/repodata.json"
+        if self.jlap:
+            cachefile = os.path.join(self.cache_dir, channel_platform, "repodata.json")
+            return get_repodata_jlap(
+                base_url,
+                cachefile,
+                ttl=self.ttl,
+                session=self.session,
+                stale_while_revalidate=self.stale_while_revalidate,
+                offline=self.offline,
+            )
 
-        # Sort in descending order by release_date (None dates go last)
-        releases.sort(
-            key=lambda r: (r.release_date is None, r.release_date), reverse=True
+        suffixes = compression_suffixes()
+        variants = [
+            (
+                f"{base_url}{suffix}",
+                os.path.join(
+                    self.cache_dir, channel_platform, f"repodata.json{suffix}"
+                ),
+            )
+            for suffix in suffixes
+        ]
+        for url, cachefile in variants:
+            if is_cached(url, cachefile, self.ttl, self.stale_while_revalidate):
+                # get_file only refreshes it if it's stale
+                return get_file(
+                    url,
+                    cachefile,
+                    ttl=self.ttl,
+                    session=self.session,
+                    stale_while_revalidate=self.stale_while_revalidate,
+                )
+
+        for suffix, (url, cachefile) in zip(suffixes, variants):
+            try:
+                return get_file(
+                    url,
+                    cachefile,
+                    ttl=self.ttl,
+                    session=self.session,
+                    stale_while_revalidate=self.stale_while_revalidate,
+                    offline=self.offline,
+                )
+            except OfflineError:
+                # any cached format will do
+                if suffix == suffixes[-1]:
+                    raise
+            except requests.exceptions.HTTPError as e:
+                not_found = e.response is not None and e.response.status_code == 404
+                if suffix == suffixes[-1] or not not_found:
+                    raise
+                _logger.debug(f"{url} not found; trying next format")
+
+    def _merged_rows(self, package, since):
+        """(timestamp, version string) rows from all stores, newest first."""
+        # each store gives rows sorted newest first; merge those into a
+        # single newest-first sequence
+        rows = [store.get_rows(package) for store in self._stores]
+        merged = heapq.merge(*rows, key=lambda row: row[0], reverse=True)
+        if since is None:
+            return merged
+
+        # there is a row per build, so prune the versions by their first
+        # build, then keep every build of the versions that are needed
+        merged = list(merged)
+        earliest = {}
+        for timestamp, version_str in merged:
+            if timestamp < earliest.get(version_str, timestamp + 1):
+                earliest[version_str] = timestamp
+        versions = sorted(
+            ((timestamp, version_str) for version_str, timestamp in earliest.items()),
+            reverse=True,
         )
+        # conda timestamps are in milliseconds
+        since = since.timestamp() * 1000
+        needed = {
+            version_str
+            for _, version_str in prune_old_minors(versions, since, key=lambda row: row)
+        }
+        return [row for row in merged if row[1] in needed]
+
+    def _get_releases(self, package, since=None):
+        releases = []
+        for timestamp, version_str in self._merged_rows(package, since):
+            # The conda timestamp is in milliseconds since epoch
+            release_date = datetime.datetime.fromtimestamp(
+                timestamp / 1000, datetime.timezone.utc
+            )
+            releases.append(
+                Release(version=parse_version(version_str), release_date=release_date)
+            )
 
         if not releases:
             raise NoReleaseFound(f"No releases found for package '{package}'")
@@ -319,6 +1379,33 @@ class CondaReleaseSource(ReleaseSource):
         for release_obj in releases:
             yield release_obj
 
+    def _get_aggregated_releases(self, package, aggregate, since=None):
+        if aggregate not in AGGREGATES:
+            raise ValueError(
+                f"Unknown aggregate '{aggregate}'; expected one of {AGGREGATES}"
+            )
+
+        # find the earliest build of each version string in a single pass
+        # over the raw rows, so we only create one Release per version
+        earliest = {}
+        for timestamp, version_str in self._merged_rows(package, since):
+            if timestamp < earliest.get(version_str, timestamp + 1):
+                earliest[version_str] = timestamp
+
+        if not earliest:
+            raise NoReleaseFound(f"No releases found for package '{package}'")
+
+        releases = (
+            Release(
+                version=parse_version(version_str),
+                release_date=datetime.datetime.fromtimestamp(
+                    timestamp / 1000, datetime.timezone.utc
+                ),
+            )
+            for version_str, timestamp in earliest.items()
+        )
+        yield from aggregate_releases(releases, aggregate)
+
 
 class DefaultReleaseSource(ReleaseSource):
     """
@@ -328,29 +1415,103 @@ class DefaultReleaseSource(ReleaseSource):
     ----------
     github_token : str
         Personal access token (PAT) with permissions to query the desired repository.
+    session : requests.Session, optional
+        Session for all the sub-sources to make requests with. Defaults to
+        the shared session (see :func:`spec0.httpsession.get_session`).
+    stale_while_revalidate : float
+        Passed to the conda-forge source; see :class:`.CondaReleaseSource`.
+    offline : bool
+        If True, never make a request. Sources that have nothing cached are
+        skipped; if none can answer, :class:`.OfflineError` is raised.
+    conda_ttl : float, optional
+        Time-to-live (in seconds) of the cached conda-forge repodata; see
+        :class:`CondaReleaseSource`.
+    pypi_ttl : float
+        Time-to-live (in seconds) of the cached PyPI releases.
+    github_ttl : float
+        Time-to-live (in seconds) of the cached GitHub releases.
     """
 
-    def __init__(self, github_token: str = None):
-        self.github_source = GitHubReleaseSource(github_token)
-        self.pypi_source = PyPIReleaseSource()
-        self.conda_source = CondaReleaseSource(
+    def __init__(
+        self,
+        github_token: str = None,
+        session: requests.Session | None = None,
+        stale_while_revalidate: float = 0,
+        offline: bool = False,
+        conda_ttl: float | None = None,
+        pypi_ttl: float = 3600,
+        github_ttl: float = 3600,
+    ):
+        self.github_token = github_token
+        self.session = session if session is not None else get_session()
+        self.stale_while_revalidate = stale_while_revalidate
+        self.offline = offline
+        self.conda_ttl = conda_ttl
+        self.pypi_ttl = pypi_ttl
+        self.github_ttl = github_ttl
+
+    # Sub-sources are only created when they're first needed; in particular,
+    # creating the conda source downloads repodata, which we want to skip if
+    # GitHub or PyPI can answer the query.
+    @functools.cached_property
+    def github_source(self) -> GitHubReleaseSource:
+        return GitHubReleaseSource(
+            self.github_token,
+            session=self.session,
+            offline=self.offline,
+            ttl=self.github_ttl,
+        )
+
+    @functools.cached_property
+    def pypi_source(self) -> PyPIReleaseSource:
+        return PyPIReleaseSource(
+            session=self.session, offline=self.offline, ttl=self.pypi_ttl
+        )
+
+    @functools.cached_property
+    def conda_source(self) -> CondaReleaseSource:
+        return CondaReleaseSource(
             [
                 "conda-forge/linux-64",
                 "conda-forge/noarch",
-            ]
+            ],
+            session=self.session,
+            stale_while_revalidate=self.stale_while_revalidate,
+            ttl=self.conda_ttl,
+            offline=self.offline,
+        )
+
+    def _get_releases(
+        self, package: str, since: datetime.datetime | None = None
+    ) -> Generator[Release, None, None]:
+        yield from self._get_from_sources(
+            package, **_accepted_kwargs(self._get_from_sources, since=since)
+        )
+
+    def _get_aggregated_releases(
+        self, package: str, aggregate: str, since: datetime.datetime | None = None
+    ) -> Generator[Release, None, None]:
+        # let the sub-source do the aggregation, since it may do it cheaply
+        yield from self._get_from_sources(
+            package,
+            **_accepted_kwargs(
+                self._get_from_sources, aggregate=aggregate, since=since
+            ),
         )
 
-    def _get_releases(self, package: str) -> Generator[Release, None, None]:
+    def _get_from_sources(self, package: str, **kwargs):
         # check whether the package should be a GitHub release, try GitHub if so
         if self.github_source.is_github_package(package):
-            yield from self.github_source.get_releases(package)
+            yield from self.github_source.get_releases(package, **kwargs)
             return
 
         try:
-            yield from self.pypi_source.get_releases(package)
+            yield from self.pypi_source.get_releases(package, **kwargs)
         except NoReleaseFound:  # TODO: handle exception
             pass
+        except OfflineError as e:
+            _logger.info(f"{e}; trying conda-forge")
         else:
             return
 
-        yield from self.conda_source.get_releases(package)
+        yield from self.conda_source.get_releases(package, **kwargs)
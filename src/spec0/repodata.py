@@ -0,0 +1,535 @@
+"""
+Conda Repodata
+
+Tools for reading conda ``repodata.json`` files. A channel's repodata can be
+hundreds of MB, and we only need a few fields from each record, so the reader
+here streams through the file and never holds more than a single record (plus
+a fixed-size read buffer) in memory. The fields we keep are held in a compact
+columnar :class:`ReleaseStore`, which is saved in an index file next to the
+downloaded repodata so that later runs don't need to parse it again.
+"""
+
+import array
+import bz2
+import io
+import json
+import mmap
+import os
+import sys
+from typing import Generator, Iterable, NamedTuple, TextIO
+
+from spec0.cacheddownload import (
+    atomic_write,
+    read_cache_metadata,
+    record_cache_access,
+)
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+import logging
+
+_logger = logging.getLogger(__name__)
+
+_CHUNK_SIZE = 1 << 16
+_WHITESPACE = " \t\n\r"
+PACKAGE_KEYS = ("packages", "packages.conda")
+INDEX_SUFFIX = ".spec0idx"
+_INDEX_FORMAT = 1
+
+
+class RepodataRecord(NamedTuple):
+    """The parts of a repodata record that we care about."""
+
+    filename: str
+    name: str
+    version: str
+    timestamp: int | None
+
+
+class _StreamingJSONReader:
+    """Incremental reader for JSON tokens and values from a text stream.
+
+    This only supports what we need to walk the top levels of a repodata
+    file: peeking at/consuming structural characters, and decoding one
+    complete JSON value at a time.
+    """
+
+    def __init__(self, stream: TextIO, chunk_size: int = _CHUNK_SIZE):
+        self._stream = stream
+        self._chunk_size = chunk_size
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self) -> bool:
+        """Read another chunk into the buffer; return False at end of file."""
+        if self._eof:
+            return False
+
+        chunk = self._stream.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+
+        # drop everything that has already been consumed
+        self._buffer = self._buffer[self._pos :] + chunk
+        self._pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Return the next non-whitespace character without consuming it."""
+        while True:
+            buffer = self._buffer
+            pos = self._pos
+            while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+                pos += 1
+            self._pos = pos
+            if pos < len(buffer):
+                return buffer[pos]
+            if not self._fill():
+                raise ValueError("Unexpected end of JSON data")
+
+    def expect(self, char: str):
+        """Consume the next non-whitespace character, which must be ``char``."""
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected '{char}' in JSON data, found '{found}'")
+        self._pos += 1
+
+    def value(self):
+        """Decode and consume the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                # probably a value that continues past the end of the buffer
+                if not self._fill():
+                    raise
+                continue
+
+            # a number at the end of the buffer may have been cut short
+            if end == len(self._buffer) and self._fill():
+                continue
+
+            self._pos = end
+            return value
+
+
+def _iter_package_records(
+    reader: _StreamingJSONReader,
+) -> Generator[RepodataRecord, None, None]:
+    reader.expect("{")
+    if reader.peek() == "}":
+        reader.expect("}")
+        return
+
+    while True:
+        filename = reader.value()
+        reader.expect(":")
+        info = reader.value()
+        yield RepodataRecord(
+            filename=filename,
+            name=info.get("name"),
+            version=info.get("version"),
+            timestamp=info.get("timestamp"),
+        )
+
+        if reader.peek() == ",":
+            reader.expect(",")
+        else:
+            reader.expect("}")
+            return
+
+
+def iter_repodata_records(
+    stream: TextIO, chunk_size: int = _CHUNK_SIZE
+) -> Generator[RepodataRecord, None, None]:
+    """Stream the package records out of a ``repodata.json`` file.
+
+    Records from both ``packages`` and ``packages.conda`` are included. All
+    other top-level entries are skipped.
+
+    Parameters
+    ----------
+    stream : TextIO
+        The open repodata file.
+    chunk_size : int, optional
+        Number of characters to read from the stream at a time.
+
+    Yields
+    ------
+    RepodataRecord
+        The filename, name, version, and timestamp (milliseconds since the
+        epoch, or None if not given) of each record.
+
+    Raises
+    ------
+    ValueError
+        If the data is not valid JSON.
+    """
+    reader = _StreamingJSONReader(stream, chunk_size)
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+
+    while True:
+        key = reader.value()
+        reader.expect(":")
+        if key in PACKAGE_KEYS and reader.peek() == "{":
+            yield from _iter_package_records(reader)
+        else:
+            _logger.debug(f"Skipping repodata entry '{key}'")
+            reader.value()
+
+        if reader.peek() == ",":
+            reader.expect(",")
+        else:
+            reader.expect("}")
+            return
+
+
+class ReleaseStore:
+    """Compact, array-backed store of the releases in a repodata file.
+
+    Package names and version strings are interned: each distinct string is
+    stored once, and rows refer to it by index. Rows are sorted by package
+    and then by timestamp (newest first), so the rows for a single package
+    form a contiguous block, which is given by the offset table. This means
+    that the offset table also plays the role of the package name column.
+
+    Instances should usually be created with :meth:`from_records`.
+
+    Parameters
+    ----------
+    names : list[str]
+        Package names; the index of a name in this list is its name id.
+    versions : list[str]
+        Version strings; the index of a string in this list is its version
+        id.
+    version_ids : array.array
+        Version id of each row.
+    timestamps : array.array
+        Timestamp (milliseconds since the epoch) of each row.
+    offsets : array.array
+        Row offsets for each package: the rows for name id ``i`` are
+        ``offsets[i]:offsets[i + 1]``. Length is ``len(names) + 1``.
+    """
+
+    def __init__(
+        self,
+        names: list[str],
+        versions: list[str],
+        version_ids: array.array,
+        timestamps: array.array,
+        offsets: array.array,
+    ):
+        self.names = names
+        self.versions = versions
+        self.version_ids = version_ids
+        self.timestamps = timestamps
+        self.offsets = offsets
+        self._name_ids = {name: idx for idx, name in enumerate(names)}
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __contains__(self, name):
+        return name in self._name_ids
+
+    @classmethod
+    def from_records(cls, records: Iterable[RepodataRecord]) -> "ReleaseStore":
+        """Build a store from repodata records.
+
+        Records without a name, version, or timestamp are skipped, since
+        they can't be used as releases.
+        """
+        name_ids = {}
+        version_ids = {}
+        name_col = array.array("i")
+        version_col = array.array("i")
+        timestamp_col = array.array("q")
+        for record in records:
+            if record.name is None or record.version is None:
+                continue
+            if record.timestamp is None:
+                continue
+            name_col.append(name_ids.setdefault(record.name, len(name_ids)))
+            version_col.append(version_ids.setdefault(record.version, len(version_ids)))
+            timestamp_col.append(record.timestamp)
+
+        order = sorted(
+            range(len(timestamp_col)),
+            key=lambda row: (name_col[row], -timestamp_col[row]),
+        )
+        offsets = array.array("q", [0] * (len(name_ids) + 1))
+        for row in order:
+            offsets[name_col[row] + 1] += 1
+        for idx in range(len(name_ids)):
+            offsets[idx + 1] += offsets[idx]
+
+        return cls(
+            names=list(name_ids),
+            versions=list(version_ids),
+            version_ids=array.array("i", (version_col[row] for row in order)),
+            timestamps=array.array("q", (timestamp_col[row] for row in order)),
+            offsets=offsets,
+        )
+
+    def get(self, name: str) -> tuple[array.array, array.array]:
+        """Get the rows for a package.
+
+        Parameters
+        ----------
+        name : str
+            The package name.
+
+        Returns
+        -------
+        version_ids, timestamps : array.array
+            Slices of the version id and timestamp columns for this package,
+            newest first. These are empty if the package is not in the store.
+        """
+        name_id = self._name_ids.get(name)
+        if name_id is None:
+            return self.version_ids[:0], self.timestamps[:0]
+        start = self.offsets[name_id]
+        stop = self.offsets[name_id + 1]
+        return self.version_ids[start:stop], self.timestamps[start:stop]
+
+    def get_rows(self, name: str) -> list[tuple[int, str]]:
+        """Get the (timestamp, version string) rows for a package.
+
+        Rows are sorted newest first; the list is empty if the package is not
+        in the store.
+        """
+        version_ids, timestamps = self.get(name)
+        versions = self.versions
+        return [
+            (timestamp, versions[version_id])
+            for version_id, timestamp in zip(version_ids, timestamps)
+        ]
+
+    def save(self, path: os.PathLike, key: dict):
+        """Write the store to a binary index file.
+
+        The file is a single JSON header line (which includes ``key``),
+        followed by the offset, timestamp, and version id columns (each
+        aligned to 8 bytes), followed by the newline-separated package names
+        and version strings. The file is written atomically (see
+        :func:`spec0.cacheddownload.atomic_write`), so readers never see a
+        partial index.
+
+        Parameters
+        ----------
+        path : os.PathLike
+            Where to write the index.
+        key : dict
+            JSON-serializable description of the data the index was built
+            from; :meth:`load` only accepts the index if given the same key.
+        """
+        names = "\n".join(self.names).encode("utf-8")
+        versions = "\n".join(self.versions).encode("utf-8")
+        header = {
+            "format": _INDEX_FORMAT,
+            "byteorder": sys.byteorder,
+            "key": key,
+            "n_names": len(self.names),
+            "n_versions": len(self.versions),
+            "n_rows": len(self),
+            "names_size": len(names),
+            "versions_size": len(versions),
+        }
+        header_bytes = json.dumps(header).encode("utf-8") + b"\n"
+        with atomic_write(path) as f:
+            f.write(header_bytes)
+            f.write(b"\0" * _padding(len(header_bytes)))
+            for column in [self.offsets, self.timestamps, self.version_ids]:
+                data = bytes(column)
+                f.write(data)
+                f.write(b"\0" * _padding(len(data)))
+            f.write(names)
+            f.write(versions)
+
+    @classmethod
+    def load(cls, path: os.PathLike, key: dict) -> "ReleaseStore | None":
+        """Open an index file written by :meth:`save`.
+
+        The numeric columns are memory-mapped rather than read, so this is
+        fast even for large indexes.
+
+        Parameters
+        ----------
+        path : os.PathLike
+            The index file.
+        key : dict
+            The key that the index must have been saved with.
+
+        Returns
+        -------
+        ReleaseStore | None
+            The store, or None if the file is missing, unreadable, or was
+            saved with a different key or format.
+        """
+        try:
+            with open(path, "rb") as f:
+                header_bytes = f.readline()
+                header = json.loads(header_bytes)
+                if (
+                    header.get("format") != _INDEX_FORMAT
+                    or header.get("byteorder") != sys.byteorder
+                    or header.get("key") != key
+                ):
+                    return None
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            _logger.debug(f"Unable to read index {path}: {e}")
+            return None
+
+        view = memoryview(mapped)
+        pos = len(header_bytes) + _padding(len(header_bytes))
+        columns = []
+        for typecode, length in [
+            ("q", header["n_names"] + 1),
+            ("q", header["n_rows"]),
+            ("i", header["n_rows"]),
+        ]:
+            size = length * array.array(typecode).itemsize
+            columns.append(view[pos : pos + size].cast(typecode))
+            pos += size + _padding(size)
+
+        offsets, timestamps, version_ids = columns
+        names_end = pos + header["names_size"]
+        versions_end = names_end + header["versions_size"]
+        names = _split_strings(view[pos:names_end], header["n_names"])
+        versions = _split_strings(view[names_end:versions_end], header["n_versions"])
+        return cls(
+            names=names,
+            versions=versions,
+            version_ids=version_ids,
+            timestamps=timestamps,
+            offsets=offsets,
+        )
+
+
+def _padding(size: int) -> int:
+    """Number of bytes needed to pad ``size`` to a multiple of 8."""
+    return -size % 8
+
+
+def _split_strings(data: memoryview, count: int) -> list[str]:
+    if count == 0:
+        return []
+    return bytes(data).decode("utf-8").split("\n")
+
+
+def compression_suffixes() -> list[str]:
+    """Supported repodata file suffixes, in order of preference.
+
+    The empty string stands for uncompressed ``repodata.json``. Zstandard is
+    only included if the optional ``zstandard`` package is installed.
+    """
+    suffixes = [".bz2", ""]
+    if zstandard is not None:
+        suffixes.insert(0, ".zst")
+    return suffixes
+
+
+def open_repodata(path: os.PathLike) -> TextIO:
+    """Open a (possibly compressed) repodata file for reading as text.
+
+    The compression is determined from the file suffix: ``.zst`` for
+    Zstandard, ``.bz2`` for bzip2, and anything else is treated as
+    uncompressed. Compressed files are decompressed as they are read, so the
+    uncompressed data is never held in memory all at once.
+
+    Parameters
+    ----------
+    path : os.PathLike
+        The repodata file.
+
+    Returns
+    -------
+    TextIO
+        Text stream of the uncompressed JSON.
+    """
+    path = str(path)
+    if path.endswith(".zst"):
+        if zstandard is None:
+            raise ImportError("Reading .zst repodata requires 'zstandard'")
+        raw = open(path, "rb")
+        reader = zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+        return io.TextIOWrapper(reader, encoding="utf-8")
+    elif path.endswith(".bz2"):
+        return bz2.open(path, "rt", encoding="utf-8")
+    else:
+        return open(path, "r", encoding="utf-8")
+
+
+def index_key(repodata_path: os.PathLike) -> dict:
+    """Key identifying the contents of a raw repodata file for its index.
+
+    If the download cache has validators (ETag or Last-Modified) for the
+    file, those are used rather than its modification time, since the cache
+    updates the modification time whenever the server confirms that the file
+    hasn't changed. If the file is kept up to date with JLAP (see
+    :mod:`spec0.jlap`), the hash of the version it holds is used instead,
+    since patching drops the validators.
+    """
+    stat = os.stat(repodata_path)
+    metadata = read_cache_metadata(repodata_path)
+    have = (metadata.get("jlap") or {}).get("have")
+    if have:
+        return {"size": stat.st_size, "jlap_have": have}
+    if metadata.get("etag") or metadata.get("last_modified"):
+        return {
+            "size": stat.st_size,
+            "etag": metadata.get("etag"),
+            "last_modified": metadata.get("last_modified"),
+        }
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def load_release_store(repodata_path: os.PathLike) -> ReleaseStore:
+    """Load the release store for a repodata file.
+
+    The store is kept in an index file next to the repodata file. If that
+    index is missing or was built from a different version of the repodata
+    file, the repodata is parsed and the index is (re)written, so the
+    expensive parse only happens once for each download.
+
+    Parameters
+    ----------
+    repodata_path : os.PathLike
+        The raw ``repodata.json`` file, possibly compressed (see
+        :func:`open_repodata`).
+
+    Returns
+    -------
+    ReleaseStore
+        The releases in the repodata file.
+    """
+    index_path = f"{repodata_path}{INDEX_SUFFIX}"
+    key = index_key(repodata_path)
+    store = ReleaseStore.load(index_path, key)
+    if store is not None:
+        _logger.debug(f"Loaded index {index_path}")
+        record_cache_access(index_path)
+        return store
+
+    _logger.debug(f"Building index for {repodata_path}")
+    with open_repodata(repodata_path) as f:
+        store = ReleaseStore.from_records(iter_repodata_records(f))
+
+    try:
+        store.save(index_path, key)
+        record_cache_access(index_path)
+    except OSError as e:
+        # the index is only an optimization; carry on without it
+        _logger.warning(f"Unable to write index {index_path}: {e}")
+
+    return store
@@ -0,0 +1,170 @@
+"""
+Sharded Repodata
+
+Support for the sharded repodata layout (conda CEP 16). Instead of one large
+``repodata.json``, a channel subdir publishes a small index,
+``repodata_shards.msgpack.zst``, that maps each package name to the SHA256
+hash of a shard containing just that package's records. This lets us look up
+a single package without downloading the whole channel.
+
+Shards are named by their hash, so once downloaded they never need to be
+checked again; only the index expires.
+
+Reading sharded repodata requires the optional ``msgpack`` and ``zstandard``
+packages.
+"""
+
+import os
+import urllib.parse
+
+import requests
+
+from spec0.cacheddownload import OfflineError, get_file
+from spec0.repodata import PACKAGE_KEYS, RepodataRecord, ReleaseStore
+
+try:
+    import msgpack
+    import zstandard
+except ImportError:  # optional dependencies
+    msgpack = None
+    zstandard = None
+
+import logging
+
+_logger = logging.getLogger(__name__)
+
+SHARD_INDEX_NAME = "repodata_shards.msgpack.zst"
+
+
+class ShardsNotAvailable(Exception):
+    """Raised when sharded repodata can't be used for a channel subdir."""
+
+
+def shards_supported() -> bool:
+    """Whether the optional dependencies for sharded repodata are installed."""
+    return msgpack is not None and zstandard is not None
+
+
+def _read_msgpack_zst(path: os.PathLike):
+    with open(path, "rb") as f:
+        data = zstandard.ZstdDecompressor().stream_reader(f).read()
+    return msgpack.unpackb(data)
+
+
+class ShardedRepodata:
+    """Release lookups for one channel subdir with sharded repodata.
+
+    Creating this downloads (or reuses the cached copy of) the shard index;
+    shards are only downloaded when a package is looked up.
+
+    Parameters
+    ----------
+    subdir_url : str
+        URL of the channel subdir, e.g.,
+        ``https://conda.anaconda.org/conda-forge/noarch``.
+    cache_dir : os.PathLike
+        Directory to cache the index and shards in.
+    ttl : float, optional
+        Time-to-live (in seconds) of the cached shard index. If None (the
+        default), the server's max-age is used; see
+        :func:`spec0.cacheddownload.get_file`.
+    session : requests.Session, optional
+        Session to make requests with. Defaults to the shared session.
+    stale_while_revalidate : float, optional
+        How long (in seconds) after it expires the cached shard index may be
+        used while it is refreshed in the background; see
+        :func:`spec0.cacheddownload.get_file`.
+    offline : bool, optional
+        If True, only use cached files; see
+        :func:`spec0.cacheddownload.get_file`.
+
+    Raises
+    ------
+    ShardsNotAvailable
+        If the optional dependencies aren't installed or the channel doesn't
+        publish sharded repodata for this subdir (or, offline, if the shard
+        index isn't cached).
+    """
+
+    def __init__(
+        self,
+        subdir_url: str,
+        cache_dir: os.PathLike,
+        ttl: float | None = None,
+        session: requests.Session | None = None,
+        stale_while_revalidate: float = 0,
+        offline: bool = False,
+    ):
+        if not shards_supported():
+            raise ShardsNotAvailable(
+                "Sharded repodata requires the 'msgpack' and 'zstandard' packages"
+            )
+
+        self.cache_dir = cache_dir
+        self.session = session
+        self.offline = offline
+        index_url = f"{subdir_url.rstrip('/')}/{SHARD_INDEX_NAME}"
+        index_file = os.path.join(cache_dir, SHARD_INDEX_NAME)
+        try:
+            index_file = get_file(
+                index_url, index_file, ttl, session, stale_while_revalidate, offline
+            )
+        except OfflineError as e:
+            raise ShardsNotAvailable(str(e)) from e
+        except requests.exceptions.HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
+                raise ShardsNotAvailable(f"No sharded repodata at {index_url}") from e
+            raise
+
+        index = _read_msgpack_zst(index_file)
+        info = index.get("info", {})
+        self.shards_base_url = urllib.parse.urljoin(
+            index_url, info.get("shards_base_url", "")
+        )
+        self._shards = index.get("shards", {})
+        self._stores = {}
+
+    def __contains__(self, name):
+        return name in self._shards
+
+    def get_records(self, name: str) -> list[RepodataRecord]:
+        """Download (if needed) and read the shard for a package.
+
+        Returns an empty list if the package isn't in the channel.
+        """
+        digest = self._shards.get(name)
+        if digest is None:
+            return []
+
+        shard_name = f"{digest.hex()}.msgpack.zst"
+        shard_url = urllib.parse.urljoin(self.shards_base_url, shard_name)
+        shard_file = os.path.join(self.cache_dir, "shards", shard_name)
+        # shards are content-addressed, so a cached shard never goes stale
+        shard_file = get_file(
+            shard_url,
+            shard_file,
+            ttl=float("inf"),
+            session=self.session,
+            offline=self.offline,
+        )
+        shard = _read_msgpack_zst(shard_file)
+
+        return [
+            RepodataRecord(
+                filename=filename,
+                name=info.get("name"),
+                version=info.get("version"),
+                timestamp=info.get("timestamp"),
+            )
+            for key in PACKAGE_KEYS
+            for filename, info in shard.get(key, {}).items()
+        ]
+
+    def get_rows(self, name: str) -> list[tuple[int, str]]:
+        """Get the (timestamp, version string) rows for a package.
+
+        This has the same interface as :meth:`.ReleaseStore.get_rows`.
+        """
+        if name not in self._stores:
+            self._stores[name] = ReleaseStore.from_records(self.get_records(name))
+        return self._stores[name].get_rows(name)
@@ -1,5 +1,8 @@
+import collections
+import threading
+
 from packaging.specifiers import SpecifierSet
-from packaging.version import Version
+from packaging.version import InvalidVersion, Version
 
 
 def make_specifier(pkg_info, include_upper_bound=True):
@@ -19,3 +22,78 @@ def major_minor_str(version):
         major_minor_str = f"{version.epoch}!{major_minor_str}"
 
     return major_minor_str
+
+
+class VersionCache:
+    """Bounded, thread-safe cache of parsed versions.
+
+    Parsing a version string is relatively expensive, and sources see the
+    same strings over and over (e.g., every build of a conda package). This
+    hands back the same :class:`packaging.version.Version` object for the
+    same string. Strings that aren't valid versions are cached too.
+
+    Parameters
+    ----------
+    maxsize : int
+        Maximum number of strings to remember; the least recently used are
+        dropped first.
+    """
+
+    _INVALID = object()
+
+    def __init__(self, maxsize: int = 65536):
+        self.maxsize = maxsize
+        self._cache = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._cache)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def parse(self, version_str: str) -> Version:
+        """Parse a version string, reusing an earlier result if possible.
+
+        Raises
+        ------
+        packaging.version.InvalidVersion
+            If the string is not a valid version.
+        """
+        with self._lock:
+            version = self._cache.get(version_str)
+            if version is not None:
+                self._cache.move_to_end(version_str)
+
+        if version is None:
+            try:
+                parsed = Version(version_str)
+            except InvalidVersion:
+                parsed = self._INVALID
+
+            with self._lock:
+                # another thread may have beaten us to it; keep its result so
+                # that every caller gets the same object
+                version = self._cache.setdefault(version_str, parsed)
+                self._cache.move_to_end(version_str)
+                while len(self._cache) > self.maxsize:
+                    self._cache.popitem(last=False)
+
+        if version is self._INVALID:
+            raise InvalidVersion(f"Invalid version: '{version_str}'")
+        return version
+
+
+_VERSION_CACHE = VersionCache()
+
+
+def parse_version(version_str: str) -> Version:
+    """Parse a version string using the process-wide :class:`VersionCache`.
+
+    Raises
+    ------
+    packaging.version.InvalidVersion
+        If the string is not a valid version.
+    """
+    return _VERSION_CACHE.parse(version_str)
@@ -0,0 +1,20 @@
+import pytest
+
+from spec0.httpsession import make_session, set_session
+
+
+@pytest.fixture(autouse=True)
+def http_session():
+    """Use a shared session that doesn't retry, so error tests are quick."""
+    session = make_session(retries=0)
+    set_session(session)
+    yield session
+    set_session(None)
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path_factory, monkeypatch):
+    """Give each test an empty cache directory."""
+    path = tmp_path_factory.mktemp("cache")
+    monkeypatch.setattr("spec0.cacheddownload.CACHE_DIR", path)
+    return path
@@ -5,6 +5,7 @@ import responses
 import requests
 
 from spec0.cacheddownload import *
+from spec0.cacheddownload import _env_cache_max_size
 
 @responses.activate
 def test_get_file_file_does_not_exist(tmp_path):
@@ -125,3 +126,351 @@ def test_http_error(status_code, tmp_path):
         get_file(url="https://example.com/data.csv", cache_path=str(cache_file), ttl=3600)
 
     assert len(responses.calls) == 1, "Exactly one request call should have been made."
+
+
+@responses.activate
+def test_revalidate_not_modified(tmp_path):
+    """
+    Test that an expired file is revalidated with the stored validators, and
+    that a 304 response keeps the cached file and refreshes its age.
+    """
+    cache_file = tmp_path / "test_file.txt"
+    url = "https://example.com/data.csv"
+    responses.add(
+        responses.GET,
+        url,
+        body="test data",
+        headers={"ETag": '"abc"', "Last-Modified": "Wed, 21 Oct 2015 07:28:00 GMT"},
+    )
+    get_file(url, str(cache_file), ttl=3600)
+    assert read_cache_metadata(str(cache_file))["etag"] == '"abc"'
+
+    old_mtime = time.time() - 7200
+    os.utime(cache_file, (old_mtime, old_mtime))
+
+    responses.replace(responses.GET, url, status=304)
+    get_file(url, str(cache_file), ttl=3600)
+
+    assert len(responses.calls) == 2
+    request_headers = responses.calls[1].request.headers
+    assert request_headers["If-None-Match"] == '"abc"'
+    assert request_headers["If-Modified-Since"] == "Wed, 21 Oct 2015 07:28:00 GMT"
+    assert cache_file.read_text() == "test data"
+    assert time.time() - os.path.getmtime(cache_file) < 60
+
+    # the refreshed file is now fresh again
+    get_file(url, str(cache_file), ttl=3600)
+    assert len(responses.calls) == 2
+
+
+@responses.activate
+def test_revalidate_modified(tmp_path):
+    """Test that a changed file is downloaded again and its metadata updated."""
+    cache_file = tmp_path / "test_file.txt"
+    url = "https://example.com/data.csv"
+    responses.add(responses.GET, url, body="old data", headers={"ETag": '"v1"'})
+    get_file(url, str(cache_file), ttl=0)
+
+    responses.replace(responses.GET, url, body="new data", headers={"ETag": '"v2"'})
+    get_file(url, str(cache_file), ttl=0)
+
+    assert responses.calls[1].request.headers["If-None-Match"] == '"v1"'
+    assert cache_file.read_text() == "new data"
+    assert read_cache_metadata(str(cache_file))["etag"] == '"v2"'
+
+
+@pytest.mark.parametrize(
+    "cache_control, ttl, expected_calls",
+    [
+        ("public, max-age=7200", None, 1),  # longer than the default TTL
+        ("max-age=0", None, 2),
+        ("no-cache", None, 2),  # falls back to the default TTL
+        # a TTL that is given takes precedence over max-age
+        ("public, max-age=7200", 3600, 2),
+        ("max-age=0", 7200, 1),
+    ],
+)
+@responses.activate
+def test_max_age(tmp_path, cache_control, ttl, expected_calls):
+    """Test that Cache-Control max-age is used when no TTL is given."""
+    cache_file = tmp_path / "test_file.txt"
+    url = "https://example.com/data.csv"
+    responses.add(responses.GET, url, body="data", headers={"Cache-Control": cache_control})
+    get_file(url, str(cache_file), ttl=ttl)
+    old_mtime = time.time() - 3700
+    os.utime(cache_file, (old_mtime, old_mtime))
+    get_file(url, str(cache_file), ttl=ttl)
+    assert len(responses.calls) == expected_calls
+
+
+@responses.activate
+def test_concurrent_downloads(tmp_path):
+    """Test that concurrent requests for an expired file download it once."""
+    import threading
+
+    cache_file = tmp_path / "test_file.txt"
+    url = "https://example.com/data.csv"
+
+    def slow_response(request):
+        time.sleep(0.1)
+        return (200, {}, "data")
+
+    responses.add_callback(responses.GET, url, callback=slow_response)
+    threads = [
+        threading.Thread(target=get_file, args=(url, str(cache_file)))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(responses.calls) == 1
+    assert cache_file.read_text() == "data"
+
+
+@responses.activate
+def test_interrupted_download(tmp_path, monkeypatch):
+    """Test that a failed download leaves the cached file unchanged."""
+    cache_file = tmp_path / "test_file.txt"
+    cache_file.write_text("old data")
+    old_mtime = time.time() - 7200
+    os.utime(cache_file, (old_mtime, old_mtime))
+    url = "https://example.com/data.csv"
+    responses.add(responses.GET, url, body="new data")
+
+    def broken_iter_content(self, chunk_size=1):
+        yield b"new"
+        raise requests.exceptions.ChunkedEncodingError("connection lost")
+
+    monkeypatch.setattr(requests.Response, "iter_content", broken_iter_content)
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        get_file(url, str(cache_file))
+
+    assert cache_file.read_text() == "old data"
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "test_file.txt",
+        "test_file.txt.lock",
+    ]
+
+
+def test_atomic_write(tmp_path):
+    path = tmp_path / "file.txt"
+    path.write_text("old")
+    with pytest.raises(RuntimeError):
+        with atomic_write(str(path), "w") as f:
+            f.write("new")
+            raise RuntimeError()
+    assert path.read_text() == "old"
+
+    with atomic_write(str(path), "w") as f:
+        f.write("new")
+        assert path.read_text() == "old"
+    assert path.read_text() == "new"
+    assert [p.name for p in tmp_path.iterdir()] == ["file.txt"]
+
+
+def write_file(path, size, accessed):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"x" * size)
+    os.utime(path, (accessed, accessed))
+
+
+class TestCacheIndex:
+    def test_scan_existing_cache(self, tmp_path):
+        write_file(tmp_path / "a" / "repodata.json", 100, 1000)
+        write_file(tmp_path / "a" / "repodata.json.meta", 10, 1000)
+        write_file(tmp_path / "a" / "repodata.json.lock", 0, 1000)
+        write_file(tmp_path / "b.txt", 50, 2000)
+        index = CacheIndex(tmp_path)
+        assert sorted(index.read()["entries"]) == ["a/repodata.json", "b.txt"]
+        info = index.info()
+        assert info["entries"] == 2
+        assert info["size"] == 150
+        assert info["hit_ratio"] is None
+        assert info["oldest"].timestamp() == 1000
+
+    def test_record_and_evict(self, tmp_path):
+        index = CacheIndex(tmp_path, max_size=250)
+        for name, accessed in [("a", 1000), ("b", 2000), ("c", 3000)]:
+            write_file(tmp_path / name, 100, accessed)
+        index.read()  # nothing recorded yet
+        index.record(tmp_path / "a", hit=True)  # now the most recently used
+        write_file(tmp_path / "d", 100, 4000)
+        index.record(tmp_path / "d", hit=False)
+
+        # b and c were the least recently used
+        assert sorted(p.name for p in tmp_path.iterdir() if p.name != "index.json.lock") == [
+            "a",
+            "d",
+            INDEX_NAME,
+        ]
+        info = index.info()
+        assert (info["entries"], info["size"]) == (2, 200)
+        assert (info["hits"], info["misses"], info["hit_ratio"]) == (1, 1, 0.5)
+
+    def test_prune_and_clear(self, tmp_path):
+        index = CacheIndex(tmp_path)
+        write_file(tmp_path / "a", 100, 1000)
+        write_file(tmp_path / "a.meta", 10, 1000)
+        write_file(tmp_path / "b", 100, 2000)
+        write_file(tmp_path / "c", 100, 3000)
+        index.record(tmp_path / "c", hit=True)
+        (tmp_path / "c").unlink()
+
+        assert index.prune(150) == ["a"]
+        assert sorted(index.read()["entries"]) == ["b"]
+        assert not (tmp_path / "a.meta").exists()
+
+        index.clear()
+        assert index.info()["entries"] == 0
+        assert index.info()["hits"] == 0
+        assert not (tmp_path / "b").exists()
+
+    def test_remove_temporary_files(self, tmp_path):
+        index = CacheIndex(tmp_path)
+        write_file(tmp_path / "a", 100, time.time())
+        # left over from interrupted downloads, and one still in progress
+        write_file(tmp_path / ".a.x1.tmp", 50, time.time() - 7200)
+        write_file(tmp_path / "sub" / ".b.x2.tmp", 50, time.time() - 7200)
+        write_file(tmp_path / ".a.x3.tmp", 50, time.time())
+
+        assert sorted(index.prune()) == [".a.x1.tmp", "sub/.b.x2.tmp"]
+        assert (tmp_path / ".a.x3.tmp").exists()
+        index.clear()
+        assert not (tmp_path / ".a.x3.tmp").exists()
+
+    def test_repeated_hits(self, tmp_path):
+        index = CacheIndex(tmp_path)
+        write_file(tmp_path / "a", 100, 1000)
+        index.record(tmp_path / "a", hit=True)
+        on_disk = (tmp_path / INDEX_NAME).read_text()
+        # a file that was just used doesn't need its access time updated
+        index.record(tmp_path / "a", hit=True)
+        index.record(tmp_path / "a", hit=True)
+        assert (tmp_path / INDEX_NAME).read_text() == on_disk
+        assert index.info()["hits"] == 3
+
+        flush_pending_hits()
+        assert index.read()["hits"] == 3
+        assert index.info()["hits"] == 3
+
+
+@responses.activate
+def test_get_file_records_access(tmp_path, monkeypatch):
+    monkeypatch.setattr("spec0.cacheddownload.CACHE_DIR", tmp_path)
+    url = "https://example.com/data.csv"
+    responses.add(responses.GET, url, body="test data")
+    get_file(url, str(tmp_path / "data.csv"))
+    get_file(url, str(tmp_path / "data.csv"))
+    # files outside of the cache directory are not indexed
+    get_file(url, str(tmp_path.parent / "elsewhere.csv"))
+
+    info = CacheIndex(tmp_path).info()
+    assert info["entries"] == 1
+    assert (info["hits"], info["misses"]) == (1, 1)
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("", 1024**3),
+    ("2048", 2048),
+    ("1.5K", 1536),
+    ("200MB", 200 * 1024**2),
+    ("lots", 1024**3),
+])
+def test_cache_max_size_from_environment(monkeypatch, value, expected):
+    monkeypatch.setenv(CACHE_MAX_SIZE_ENV, value)
+    assert _env_cache_max_size() == expected
+
+
+@responses.activate
+def test_cache_max_size(tmp_path, monkeypatch):
+    monkeypatch.setattr("spec0.cacheddownload.CACHE_DIR", tmp_path)
+    monkeypatch.setattr("spec0.cacheddownload.CACHE_MAX_SIZE", 1024**3)
+    set_cache_max_size(15)
+    assert get_cache_max_size() == 15
+    for name in ["a", "b"]:
+        url = f"https://example.com/{name}.csv"
+        responses.add(responses.GET, url, body="ten bytes!")
+        get_file(url, str(tmp_path / f"{name}.csv"))
+    # the least recently used file was removed to stay within the limit
+    assert not (tmp_path / "a.csv").exists()
+    assert (tmp_path / "b.csv").exists()
+
+
+@pytest.mark.parametrize("age, blocks", [(3700, False), (9000, True)])
+@responses.activate
+def test_stale_while_revalidate(tmp_path, age, blocks):
+    """Test that slightly stale files are returned at once and refreshed."""
+    import threading
+
+    cache_file = tmp_path / "test_file.txt"
+    cache_file.write_text("old data")
+    old_mtime = time.time() - age
+    os.utime(cache_file, (old_mtime, old_mtime))
+    url = "https://example.com/data.csv"
+    release = threading.Event()
+
+    def slow_response(request):
+        release.wait(timeout=5)
+        return (200, {}, "new data")
+
+    responses.add_callback(responses.GET, url, callback=slow_response)
+    if blocks:
+        release.set()
+
+    get_file(url, str(cache_file), ttl=3600, stale_while_revalidate=3600)
+    expected = "new data" if blocks else "old data"
+    assert cache_file.read_text() == expected
+
+    release.set()
+    wait_for_refreshes()
+    assert cache_file.read_text() == "new data"
+    assert len(responses.calls) == 1
+
+
+def test_detached_refresh(tmp_path, monkeypatch):
+    """Test that a refresh in a detached process updates the cached file."""
+    import functools
+    import http.server
+    import threading
+
+    www = tmp_path / "www"
+    www.mkdir()
+    (www / "data.csv").write_text("new data")
+    handler = functools.partial(
+        http.server.SimpleHTTPRequestHandler, directory=str(www)
+    )
+    handler.log_message = lambda *args: None
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv("NO_PROXY", "127.0.0.1")
+    monkeypatch.setattr("spec0.cacheddownload._DETACHED_REFRESHES", True)
+
+    url = f"http://127.0.0.1:{server.server_address[1]}/data.csv"
+    cache_file = tmp_path / "data.csv"
+    cache_file.write_text("old data")
+    write_cache_metadata(str(cache_file), {"url": url})
+    old_mtime = time.time() - 3700
+    os.utime(cache_file, (old_mtime, old_mtime))
+    try:
+        get_file(url, str(cache_file), ttl=3600, stale_while_revalidate=3600)
+        assert cache_file.read_text() == "old data"
+        wait_for_refreshes(timeout=30)
+    finally:
+        server.shutdown()
+    assert cache_file.read_text() == "new data"
+
+
+@responses.activate
+def test_offline(tmp_path):
+    cache_file = tmp_path / "test_file.txt"
+    url = "https://example.com/data.csv"
+    with pytest.raises(OfflineError, match="offline"):
+        get_file(url, str(cache_file), offline=True)
+
+    cache_file.write_text("old data")
+    old_mtime = time.time() - 7 * 86400
+    os.utime(cache_file, (old_mtime, old_mtime))
+    assert get_file(url, str(cache_file), offline=True) == str(cache_file)
+    assert len(responses.calls) == 0
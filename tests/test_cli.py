@@ -0,0 +1,125 @@
+import json
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+import responses
+
+from spec0.cacheddownload import write_cache_metadata
+
+from spec0.cli import *
+
+REPODATA_URL = "https://conda.anaconda.org/mock-channel/noarch/repodata.json"
+
+REPODATA = {
+    "packages": {
+        "mypackage-2.2.0-0.tar.bz2": {
+            "name": "mypackage",
+            "version": "2.2.0",
+            "timestamp": 1677844800000,
+        },
+    },
+}
+
+
+def run_cli(monkeypatch, *args):
+    monkeypatch.setattr(sys, "argv", ["spec0", *args])
+    cli_main()
+
+
+@responses.activate
+def test_does_not_wait_for_refresh(cache_dir, monkeypatch, capsys):
+    monkeypatch.setattr("spec0.releasesource.compression_suffixes", lambda: [""])
+    monkeypatch.setattr("spec0.cacheddownload._DETACHED_REFRESHES", False)
+    cache_file = cache_dir / "mock-channel" / "noarch" / "repodata.json"
+    cache_file.parent.mkdir(parents=True)
+    cache_file.write_text(json.dumps(REPODATA))
+    write_cache_metadata(str(cache_file), {"url": REPODATA_URL})
+    old_mtime = time.time() - 3700
+    os.utime(cache_file, (old_mtime, old_mtime))
+    started = []
+    popen = subprocess.Popen
+
+    def fake_popen(cmd, **kwargs):
+        started.append((cmd, kwargs))
+        # a process that has already finished
+        return popen([sys.executable, "-c", "pass"])
+
+    monkeypatch.setattr("spec0.cacheddownload.subprocess.Popen", fake_popen)
+
+    run_cli(
+        monkeypatch,
+        "mypackage",
+        "--conda-channel=mock-channel",
+        "--conda-arch=noarch",
+        "--stale-while-revalidate=3600",
+        f"--cache-dir={cache_dir}",
+        "--output-specifier",
+    )
+
+    # the answer came from the stale file, and the refresh was left to a
+    # process that carries on after we exit
+    assert ">=2.2" in capsys.readouterr().out
+    assert len(responses.calls) == 0
+    [(cmd, kwargs)] = started
+    assert REPODATA_URL in cmd[-1]
+    assert kwargs.get("start_new_session") or kwargs.get("creationflags")
+
+
+def test_cache_command(cache_dir, monkeypatch, capsys):
+    run_cli(monkeypatch, "cache", f"--cache-dir={cache_dir}", "info")
+    assert f"Cache directory: {cache_dir}" in capsys.readouterr().out
+
+
+def test_package_named_cache(monkeypatch):
+    looked_up = []
+
+    def fake_main(package, source, filter_):
+        looked_up.append(package)
+        return {}
+
+    monkeypatch.setattr("spec0.cli.main", fake_main)
+    monkeypatch.setattr("spec0.cli.select_output", lambda opts: lambda results: None)
+    run_cli(monkeypatch, "--pypi", "--", "cache")
+    assert looked_up == ["cache"]
+
+
+@pytest.mark.parametrize("value", ["", "12.5", "an hour"])
+def test_ttl_from_environment(monkeypatch, capsys, value):
+    monkeypatch.setenv("SPEC0_PYPI_TTL", value)
+    parser = make_parser()
+    # --help never depends on the value
+    with pytest.raises(SystemExit) as e:
+        parser.parse_args(["--help"])
+    assert e.value.code == 0
+
+    if value == "an hour":
+        with pytest.raises(SystemExit) as e:
+            parser.parse_args(["numpy"])
+        assert e.value.code == 2
+        assert "SPEC0_PYPI_TTL" in capsys.readouterr().err
+    else:
+        opts = parser.parse_args(["numpy"])
+        assert opts.pypi_ttl == (float(value) if value else 3600)
+        assert opts.github_ttl == 3600
+
+
+def test_cache_max_size(monkeypatch):
+    monkeypatch.setattr("spec0.cacheddownload.CACHE_MAX_SIZE", 1024**3)
+    monkeypatch.setattr("spec0.cli.main", lambda package, source, filter_: {})
+    monkeypatch.setattr("spec0.cli.select_output", lambda opts: lambda results: None)
+    monkeypatch.setenv("SPEC0_CACHE_MAX_SIZE", "200M")
+    assert make_parser().parse_args(["numpy"]).cache_max_size == 200 * 1024**2
+
+    run_cli(monkeypatch, "numpy", "--pypi", "--cache-max-size=10M")
+    assert get_cache_max_size() == 10 * 1024**2
+
+
+def test_git_not_found(tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv("PATH", str(tmp_path))
+    with pytest.raises(SystemExit) as e:
+        run_cli(monkeypatch, "example", f"--git-repo={tmp_path}")
+    assert e.value.code == 1
+    assert "Unable to run 'git'" in capsys.readouterr().err
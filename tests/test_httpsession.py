@@ -0,0 +1,51 @@
+import pytest
+import requests
+import responses
+
+from spec0.cacheddownload import get_file
+from spec0.httpsession import *
+
+URL = "https://example.com/data.csv"
+
+
+@responses.activate
+def test_retry_on_server_error(tmp_path):
+    responses.add(responses.GET, URL, status=503)
+    responses.add(responses.GET, URL, status=429, headers={"Retry-After": "0"})
+    responses.add(responses.GET, URL, body="data")
+    session = make_session(backoff_factor=0)
+    path = get_file(URL, str(tmp_path / "data.csv"), session=session)
+    with open(path) as f:
+        assert f.read() == "data"
+    assert len(responses.calls) == 3
+
+
+@responses.activate
+def test_retries_exhausted(tmp_path):
+    responses.add(responses.GET, URL, status=500)
+    session = make_session(retries=2, backoff_factor=0)
+    with pytest.raises(requests.HTTPError):
+        get_file(URL, str(tmp_path / "data.csv"), session=session)
+    assert len(responses.calls) == 3
+
+
+@responses.activate
+def test_no_retry_on_client_error(tmp_path):
+    responses.add(responses.GET, URL, status=404)
+    with pytest.raises(requests.HTTPError):
+        get_file(URL, str(tmp_path / "data.csv"), session=make_session())
+    assert len(responses.calls) == 1
+
+
+def test_pool_sizes():
+    session = make_session(pool_connections=3, pool_maxsize=7)
+    adapter = session.get_adapter("https://pypi.org")
+    assert adapter._pool_connections == 3
+    assert adapter._pool_maxsize == 7
+
+
+def test_shared_session():
+    session = get_session()
+    assert get_session() is session
+    set_session(None)
+    assert get_session() is not session
@@ -0,0 +1,339 @@
+import hashlib
+import json
+import os
+import time
+
+import pytest
+import responses
+
+from spec0.jlap import *
+from spec0.repodata import index_key
+
+URL = "https://conda.example.com/channel/noarch/repodata.json"
+JLAP_URL = "https://conda.example.com/channel/noarch/repodata.jlap"
+
+REPODATA_V1 = {
+    "packages": {"a-1.0-0.tar.bz2": {"name": "a", "version": "1.0", "timestamp": 1}},
+}
+REPODATA_V2 = {
+    "packages": {
+        "a-1.0-0.tar.bz2": {"name": "a", "version": "1.0", "timestamp": 1},
+        "a-1.1-0.tar.bz2": {"name": "a", "version": "1.1", "timestamp": 2},
+    },
+}
+REPODATA_V3 = {
+    "packages": {
+        "a-1.1-0.tar.bz2": {"name": "a", "version": "1.1", "timestamp": 2},
+        "a-1.2-0.tar.bz2": {"name": "a", "version": "1.2", "timestamp": 3},
+    },
+}
+PATCH_1_2 = [
+    {
+        "op": "add",
+        "path": "/packages/a-1.1-0.tar.bz2",
+        "value": REPODATA_V2["packages"]["a-1.1-0.tar.bz2"],
+    }
+]
+PATCH_2_3 = [
+    {"op": "remove", "path": "/packages/a-1.0-0.tar.bz2"},
+    {
+        "op": "add",
+        "path": "/packages/a-1.2-0.tar.bz2",
+        "value": REPODATA_V3["packages"]["a-1.2-0.tar.bz2"],
+    },
+]
+
+
+def server_bytes(repodata):
+    return json.dumps(repodata, indent=1).encode("utf-8")
+
+
+def bytes_hash(data):
+    return hashlib.blake2b(data, digest_size=DIGEST_SIZE).hexdigest()
+
+
+def make_jlap(steps):
+    """Build a JLAP file from a list of (old, new, patch) steps.
+
+    As in conda's ``JLAP`` class: the first line is the initialization
+    vector in hex, which keys the hash of the next line, and so on; the last
+    line is the hash of the metadata line.
+    """
+    iv = ZERO_IV
+    lines = []
+    for old, new, patch in steps:
+        line = {
+            "from": bytes_hash(server_bytes(old)),
+            "to": bytes_hash(server_bytes(new)),
+            "patch": patch,
+        }
+        lines.append(json.dumps(line).encode("utf-8"))
+    latest = bytes_hash(server_bytes(steps[-1][1]))
+    lines.append(json.dumps({"url": "repodata.json", "latest": latest}).encode("utf-8"))
+    checksum = iv
+    for line in lines:
+        checksum = keyed_hash(line, checksum)
+    lines = [iv.hex().encode("ascii"), *lines, checksum.hex().encode("ascii")]
+    return b"\n".join(lines) + b"\n"
+
+
+class JLAPServer:
+    """Stand-in for a channel that serves repodata.json and repodata.jlap."""
+
+    def __init__(self, repodata, jlap=None, headers=None):
+        self.repodata = repodata
+        self.jlap = jlap
+        self.headers = headers or {}
+        self.ranges = []
+        responses.add_callback(responses.GET, URL, callback=self.get_repodata)
+        responses.add_callback(responses.GET, JLAP_URL, callback=self.get_jlap)
+
+    def get_repodata(self, request):
+        return (200, self.headers, server_bytes(self.repodata))
+
+    def get_jlap(self, request):
+        if self.jlap is None:
+            return (404, {}, b"")
+        range_ = request.headers.get("Range")
+        self.ranges.append(range_)
+        if range_ is None:
+            return (200, self.headers, self.jlap)
+        start = int(range_.removeprefix("bytes=").rstrip("-"))
+        if start >= len(self.jlap):
+            return (416, {}, b"")
+        return (206, self.headers, self.jlap[start:])
+
+
+def expire(path):
+    old = time.time() - 7200
+    os.utime(path, (old, old))
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def test_parse_jlap_conda_format():
+    # written out by hand, following conda's JLAP class: the first line is
+    # the IV itself, not a line to hash
+    iv = bytes(range(DIGEST_SIZE))
+    patch_line = json.dumps({"from": "a", "to": "b", "patch": []}).encode()
+    footer = json.dumps({"url": "repodata.json", "latest": "b"}).encode()
+    patch_hash = hashlib.blake2b(patch_line, key=iv, digest_size=32).digest()
+    checksum = hashlib.blake2b(footer, key=patch_hash, digest_size=32).digest()
+    data = b"\n".join([iv.hex().encode(), patch_line, footer, checksum.hex().encode()])
+
+    patches, metadata, last_iv, length = parse_jlap(data + b"\n", None, True)
+    assert patches == [{"from": "a", "to": "b", "patch": []}]
+    assert metadata["latest"] == "b"
+    assert last_iv == patch_hash
+    assert data[:length] == iv.hex().encode() + b"\n" + patch_line + b"\n"
+
+    # reading the rest of the file continues the chain
+    patches, metadata, _, _ = parse_jlap(data[length:], last_iv, False)
+    assert (patches, metadata["latest"]) == ([], "b")
+
+    # the IV keys the chain, so a different one doesn't verify
+    lines = data.split(b"\n")
+    with pytest.raises(JLAPError, match="checksum"):
+        parse_jlap(b"\n".join([ZERO_IV.hex().encode(), *lines[1:]]), None, True)
+
+
+@responses.activate
+def test_jlap_updates(tmp_path):
+    cache = tmp_path / "repodata.json"
+    server = JLAPServer(REPODATA_V1)
+    get_repodata(URL, cache)
+    assert load(cache) == REPODATA_V1
+
+    # first update reads the whole JLAP file
+    server.repodata = REPODATA_V2
+    server.jlap = make_jlap([(REPODATA_V1, REPODATA_V2, PATCH_1_2)])
+    expire(cache)
+    get_repodata(URL, cache)
+    assert load(cache) == REPODATA_V2
+    assert server.ranges == ["bytes=0-"]
+
+    # later updates only read the new lines
+    old_jlap = server.jlap
+    server.repodata = REPODATA_V3
+    server.jlap = make_jlap(
+        [(REPODATA_V1, REPODATA_V2, PATCH_1_2), (REPODATA_V2, REPODATA_V3, PATCH_2_3)]
+    )
+    expire(cache)
+    get_repodata(URL, cache)
+    assert load(cache) == REPODATA_V3
+    pos = int(server.ranges[-1].removeprefix("bytes=").rstrip("-"))
+    assert 0 < pos < len(old_jlap)
+    assert old_jlap[:pos] == server.jlap[:pos]
+    # only one full download of repodata.json
+    assert [call.request.url for call in responses.calls].count(URL) == 1
+
+    # nothing new: the file is just marked as fresh
+    expire(cache)
+    get_repodata(URL, cache)
+    assert load(cache) == REPODATA_V3
+    assert time.time() - os.path.getmtime(cache) < 60
+
+
+@responses.activate
+def test_jlap_index_key(tmp_path):
+    # after a patch, the index key only changes when the repodata does
+    cache = tmp_path / "repodata.json"
+    server = JLAPServer(REPODATA_V1)
+    get_repodata(URL, cache)
+    server.jlap = make_jlap([(REPODATA_V1, REPODATA_V2, PATCH_1_2)])
+    expire(cache)
+    get_repodata(URL, cache)
+    key = index_key(cache)
+
+    expire(cache)
+    get_repodata(URL, cache)
+    assert index_key(cache) == key
+
+
+@pytest.mark.parametrize(
+    "repodata, patch",
+    [
+        (REPODATA_V1, PATCH_1_2),
+        (REPODATA_V2, PATCH_2_3),
+        # a record changed in place, other entries, and a new package key
+        (
+            dict(
+                REPODATA_V1,
+                info={"subdir": "noarch"},
+                removed=[],
+                **{"packages.conda": {}},
+            ),
+            [
+                {
+                    "op": "replace",
+                    "path": "/packages/a-1.0-0.tar.bz2/timestamp",
+                    "value": 5,
+                },
+                {"op": "add", "path": "/removed/-", "value": "a-0.9-0.tar.bz2"},
+                {"op": "add", "path": "/repodata_version", "value": 1},
+                {
+                    "op": "add",
+                    "path": "/packages.conda/a-1.3-0.conda",
+                    "value": {"name": "a", "version": "1.3"},
+                },
+            ],
+        ),
+        ({}, [{"op": "add", "path": "/info", "value": {}}]),
+    ],
+)
+def test_apply_patches_streaming(tmp_path, repodata, patch):
+    source = tmp_path / "repodata.json"
+    source.write_text(json.dumps(repodata, indent=1))
+    dest = tmp_path / "patched.json"
+    with open(source) as src, open(dest, "w") as dst:
+        apply_patches_streaming(src, dst, [{"patch": patch}])
+    expected = apply_patch(json.loads(json.dumps(repodata)), patch)
+    assert load(dest) == expected
+
+
+@pytest.mark.parametrize(
+    "patch",
+    [
+        [{"op": "replace", "path": "/packages", "value": {}}],
+        [{"op": "replace", "path": "", "value": {}}],
+        [
+            {
+                "op": "move",
+                "from": "/packages/a-1.0-0.tar.bz2",
+                "path": "/packages.conda/a-1.0-0.conda",
+            }
+        ],
+    ],
+)
+def test_apply_patches_streaming_unsupported(tmp_path, patch):
+    source = tmp_path / "repodata.json"
+    source.write_text(json.dumps(REPODATA_V1))
+    with open(source) as src, open(tmp_path / "patched.json", "w") as dst:
+        with pytest.raises(JLAPError):
+            apply_patches_streaming(src, dst, [{"patch": patch}])
+
+
+@responses.activate
+def test_jlap_fresh_cache(tmp_path):
+    cache = tmp_path / "repodata.json"
+    JLAPServer(REPODATA_V1)
+    get_repodata(URL, cache)
+    get_repodata(URL, cache)
+    assert len(responses.calls) == 1
+
+
+@pytest.mark.parametrize("ttl, expected_calls", [(None, 1), (3600, 2)])
+@responses.activate
+def test_jlap_max_age(tmp_path, ttl, expected_calls):
+    # like get_file, the server's max-age is used unless a TTL is given
+    cache = tmp_path / "repodata.json"
+    JLAPServer(
+        REPODATA_V1,
+        make_jlap([(REPODATA_V1, REPODATA_V1, [])]),
+        headers={"Cache-Control": "max-age=86400"},
+    )
+    get_repodata(URL, cache, ttl=ttl)
+    expire(cache)
+    get_repodata(URL, cache, ttl=ttl)
+    assert len(responses.calls) == expected_calls
+
+
+@pytest.mark.parametrize(
+    "jlap",
+    [
+        None,  # no JLAP published
+        make_jlap([(REPODATA_V2, REPODATA_V3, PATCH_2_3)]),  # broken chain
+        make_jlap([(REPODATA_V1, REPODATA_V2, PATCH_1_2)])[:-3] + b"00\n",  # checksum
+    ],
+)
+@responses.activate
+def test_jlap_fallback(tmp_path, jlap):
+    cache = tmp_path / "repodata.json"
+    server = JLAPServer(REPODATA_V1)
+    get_repodata(URL, cache)
+
+    server.repodata = REPODATA_V2
+    server.jlap = jlap
+    expire(cache)
+    get_repodata(URL, cache)
+    assert load(cache) == REPODATA_V2
+    assert [call.request.url for call in responses.calls].count(URL) == 2
+
+
+@pytest.mark.parametrize(
+    "doc, patch, expected",
+    [
+        ({"a": 1}, [{"op": "add", "path": "/b", "value": 2}], {"a": 1, "b": 2}),
+        ({"a": [1, 3]}, [{"op": "add", "path": "/a/1", "value": 2}], {"a": [1, 2, 3]}),
+        ({"a": [1]}, [{"op": "add", "path": "/a/-", "value": 2}], {"a": [1, 2]}),
+        ({"a": 1, "b": 2}, [{"op": "remove", "path": "/a"}], {"b": 2}),
+        ({"a": 1}, [{"op": "replace", "path": "/a", "value": 3}], {"a": 3}),
+        ({"a": 1}, [{"op": "move", "from": "/a", "path": "/b"}], {"b": 1}),
+        (
+            {"a": [1]},
+            [{"op": "copy", "from": "/a", "path": "/b"}],
+            {"a": [1], "b": [1]},
+        ),
+        ({"a/b": 1}, [{"op": "test", "path": "/a~1b", "value": 1}], {"a/b": 1}),
+        ({"a": 1}, [{"op": "replace", "path": "", "value": [1]}], [1]),
+    ],
+)
+def test_apply_patch(doc, patch, expected):
+    assert apply_patch(doc, patch) == expected
+
+
+@pytest.mark.parametrize(
+    "patch",
+    [
+        [{"op": "remove", "path": "/missing"}],
+        [{"op": "test", "path": "/a", "value": 2}],
+        [{"op": "frobnicate", "path": "/a"}],
+        [{"op": "add", "path": "a", "value": 1}],
+    ],
+)
+def test_apply_patch_errors(patch):
+    with pytest.raises(JLAPError):
+        apply_patch({"a": 1}, patch)
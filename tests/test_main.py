@@ -1,7 +1,7 @@
 import datetime
 from packaging.version import Version
 
-from spec0.releasesource import Release, DefaultReleaseSource
+from spec0.releasesource import Release, ReleaseSource, DefaultReleaseSource
 from spec0.releasefilters import SPEC0StrictDate
 
 from spec0.main import *
@@ -67,3 +67,62 @@ def test_main_integration():
     assert isinstance(recent_release["version"], Version)
     assert isinstance(recent_release["release-date"], datetime.datetime)
     assert isinstance(recent_release["drop-date"], datetime.datetime)
+
+
+def test_main_default_filter():
+    # DummySource doesn't take the default filter's aggregate or cutoff date
+    release = Release(
+        Version("1.0"), datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+    )
+    result = main("testpkg", source=DummySource([release]))
+    assert [r["version"] for r in result["releases"]] == [Version("1.0")]
+
+
+class AggregatingSource(DummySource):
+    def get_releases(self, package, aggregate=None):
+        self.aggregate = aggregate
+        return self._releases
+
+
+def test_main_aggregate():
+    # filters that declare an aggregate have it passed to the source
+    release = Release(Version("1.0"), datetime.datetime(2020, 1, 1))
+    source = AggregatingSource({"r1": release})
+    filter_obj = DummyFilter()
+    filter_obj.aggregate = "minor"
+    main("testpkg", source=source, filter_=filter_obj)
+    assert source.aggregate == "minor"
+
+
+class CutoffSource(DummySource):
+    def get_releases(self, package, since=None):
+        self.since = since
+        return self._releases
+
+
+def test_main_since():
+    # filters that give a cutoff date have it passed to the source
+    release = Release(Version("1.0"), datetime.datetime(2020, 1, 1))
+    source = CutoffSource({"r1": release})
+    filter_obj = DummyFilter()
+    filter_obj.since = lambda package: datetime.datetime(2019, 1, 1)
+    main("testpkg", source=source, filter_=filter_obj)
+    assert source.since == datetime.datetime(2019, 1, 1)
+
+
+class LegacySource(ReleaseSource):
+    # written before sources were given a cutoff date
+    def __init__(self, releases):
+        self.releases = releases
+
+    def _get_releases(self, package):
+        yield from self.releases
+
+
+def test_main_legacy_source():
+    # the default filter gives a cutoff date, which isn't passed on
+    release = Release(
+        Version("1.0"), datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+    )
+    result = main("testpkg", source=LegacySource([release]))
+    assert [r["version"] for r in result["releases"]] == [Version("1.0")]
@@ -0,0 +1,252 @@
+import datetime
+import json
+
+import pytest
+import requests
+import responses
+
+from spec0.httpsession import make_session
+from spec0.releasesource import GitHubReleaseSource
+
+from spec0.ratelimit import *
+
+URL = "https://api.github.com/graphql"
+
+
+class FakeClock:
+    def __init__(self, now=1_700_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class FakeGitHub:
+    """Stand-in for GitHub's GraphQL API that enforces its rate limits.
+
+    Each query costs a point from a budget that is refilled every hour.
+    Queries made without any budget left get GitHub's RATE_LIMITED error,
+    and each ``secondary`` entry makes the next request fail with that
+    status and a ``Retry-After`` header.
+    """
+
+    def __init__(self, clock, limit=10, remaining=None, secondary=()):
+        self.clock = clock
+        self.limit = limit
+        self.remaining = limit if remaining is None else remaining
+        self.reset_at = clock() + 3600
+        self.secondary = list(secondary)
+        self.violations = 0
+        self.answered = 0
+
+    def rate_limit_headers(self):
+        return {
+            "X-RateLimit-Limit": str(self.limit),
+            "X-RateLimit-Remaining": str(self.remaining),
+            "X-RateLimit-Reset": str(int(self.reset_at)),
+        }
+
+    def __call__(self, request):
+        if self.clock() >= self.reset_at:
+            self.remaining = self.limit
+            self.reset_at = self.clock() + 3600
+        if self.secondary:
+            status = self.secondary.pop(0)
+            self.violations += 1
+            body = {"message": "You have exceeded a secondary rate limit."}
+            return (status, {"Retry-After": "5"}, json.dumps(body))
+        if self.remaining < 1:
+            self.violations += 1
+            body = {
+                "data": None,
+                "errors": [{"type": "RATE_LIMITED", "message": "API rate limit"}],
+            }
+            return (200, self.rate_limit_headers(), json.dumps(body))
+
+        self.remaining -= 1
+        self.answered += 1
+        reset_at = datetime.datetime.fromtimestamp(self.reset_at, datetime.timezone.utc)
+        data = {
+            "rateLimit": {
+                "limit": self.limit,
+                "cost": 1,
+                "remaining": self.remaining,
+                "resetAt": reset_at.isoformat().replace("+00:00", "Z"),
+            }
+        }
+        repository = {
+            "refs": {
+                "pageInfo": {"endCursor": None, "hasNextPage": False},
+                "nodes": [
+                    {
+                        "name": "1.0.0",
+                        "target": {"committedDate": "2024-01-01T00:00:00Z"},
+                    }
+                ],
+            }
+        }
+        # one repository, or aliases r0, r1, ... for a batch
+        for name in json.loads(request.body)["variables"]:
+            if name == "owner":
+                data["repository"] = repository
+            elif name.startswith("o"):
+                data[f"r{name[1:]}"] = repository
+        return (200, self.rate_limit_headers(), json.dumps({"data": data}))
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def make_source(clock, **kwargs):
+    budget = RateLimitBudget(clock=clock, sleep=clock.sleep, **kwargs)
+    return GitHubReleaseSource("FAKE_TOKEN", budget=budget)
+
+
+def repos(n):
+    return [f"octocat/repo{i}" for i in range(n)]
+
+
+@responses.activate
+def test_paces_to_stay_within_budget(clock):
+    server = FakeGitHub(clock, limit=10)
+    responses.add_callback(responses.POST, URL, callback=server)
+    source = make_source(clock)
+
+    releases = source.get_releases_batch(repos(15), batch_size=1)
+
+    assert len(releases) == 15
+    assert server.violations == 0
+    assert server.answered == 15
+    assert source.budget.requests == 15
+    assert source.budget.cost == 15
+    # we waited for the budget to be refilled, but not much longer
+    assert 3600 <= source.budget.waited < 3700
+
+
+@responses.activate
+def test_retries_when_out_of_budget(clock):
+    # with an unknown budget, the first request can hit the primary limit
+    server = FakeGitHub(clock, limit=10, remaining=0)
+    responses.add_callback(responses.POST, URL, callback=server)
+    source = make_source(clock)
+
+    releases = source.get_releases_batch(repos(2))
+
+    assert len(releases) == 2
+    assert server.violations == 1
+    assert len(responses.calls) == 2
+    assert 3600 <= source.budget.waited < 3700
+
+
+@pytest.mark.parametrize("status", [403, 429])
+@responses.activate
+def test_retries_secondary_limit(clock, status):
+    server = FakeGitHub(clock, secondary=[status])
+    responses.add_callback(responses.POST, URL, callback=server)
+    source = make_source(clock)
+
+    releases = list(source.get_releases("octocat/repo0"))
+
+    assert len(releases) == 1
+    assert len(responses.calls) == 2
+    assert source.budget.waited == 5
+
+
+@responses.activate
+def test_retries_exhausted(clock):
+    server = FakeGitHub(clock, secondary=[403] * 3)
+    responses.add_callback(responses.POST, URL, callback=server)
+    source = make_source(clock, max_retries=2)
+
+    with pytest.raises(requests.HTTPError):
+        list(source.get_releases("octocat/repo0"))
+    assert len(responses.calls) == 3
+
+
+@responses.activate
+def test_wait_too_long(clock):
+    server = FakeGitHub(clock, limit=10, remaining=0)
+    responses.add_callback(responses.POST, URL, callback=server)
+    source = make_source(clock, max_wait=60)
+
+    with pytest.raises(RateLimitExceeded):
+        list(source.get_releases("octocat/repo0"))
+    assert len(responses.calls) == 1
+
+
+@responses.activate
+def test_forbidden_is_not_retried(clock):
+    responses.add(responses.POST, URL, status=403, json={"message": "Forbidden"})
+    source = make_source(clock)
+
+    with pytest.raises(requests.HTTPError):
+        list(source.get_releases("octocat/repo0"))
+    assert len(responses.calls) == 1
+
+
+def test_delay(clock):
+    budget = RateLimitBudget(clock=clock)
+    assert budget.delay() == 0
+
+    reset_at = datetime.datetime.fromtimestamp(
+        clock() + 1000, datetime.timezone.utc
+    ).isoformat()
+    budget.update({"limit": 100, "cost": 2, "remaining": 50, "resetAt": reset_at})
+    assert budget.delay() == 0
+    # below the low water mark, spread the remaining requests until the reset
+    budget.update({"cost": 2, "remaining": 8})
+    assert budget.delay() == pytest.approx(1000 / 4)
+    # out of budget, wait for the reset
+    budget.update({"cost": 2, "remaining": 1})
+    assert budget.delay() == pytest.approx(1001)
+    # after the reset, there's no need to wait
+    clock.sleep(1000)
+    assert budget.delay() == 0
+
+
+def test_report(clock):
+    budget = RateLimitBudget(clock=clock, sleep=clock.sleep)
+    budget.update(
+        {
+            "limit": 5000,
+            "cost": 1,
+            "remaining": 4999,
+            "resetAt": "2023-11-14T23:13:20Z",
+        }
+    )
+    budget.update({"cost": 2, "remaining": 4997})
+    budget.wait(3)
+    assert budget.report() == (
+        "2 GraphQL requests cost 3 points; 4997 of 5000 points left, "
+        "resetting at 2023-11-14 23:13:20 UTC; waited 3 seconds for the "
+        "rate limit"
+    )
+
+
+@pytest.mark.parametrize("status", [429, 502])
+@responses.activate
+def test_session_does_not_retry_queries(clock, status):
+    # retries of GraphQL queries are left to the budget, which keeps track of
+    # the waits; the session's own retries would sleep for Retry-After
+    # without any limit
+    server = FakeGitHub(clock, secondary=[status])
+    responses.add_callback(responses.POST, URL, callback=server)
+    budget = RateLimitBudget(clock=clock, sleep=clock.sleep)
+    source = GitHubReleaseSource(
+        "FAKE_TOKEN", budget=budget, session=make_session(backoff_factor=0)
+    )
+
+    if status == 429:
+        releases = list(source.get_releases("octocat/repo0"))
+        assert len(releases) == 1
+        assert source.budget.waited == 5
+        assert len(responses.calls) == 2
+    else:
+        with pytest.raises(requests.HTTPError):
+            list(source.get_releases("octocat/repo0"))
+        assert len(responses.calls) == 1
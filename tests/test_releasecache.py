@@ -0,0 +1,85 @@
+import datetime
+import os
+import time
+
+import pytest
+
+from spec0.cacheddownload import OfflineError
+from spec0.releasecache import *
+
+ROWS = [
+    ("1.1", datetime.datetime(2024, 2, 1, tzinfo=datetime.timezone.utc)),
+    ("1.0", datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)),
+]
+
+
+class Fetcher:
+    def __init__(self, rows=ROWS):
+        self.rows = rows
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.rows
+
+
+def expire(path):
+    old = time.time() - 7200
+    os.utime(path, (old, old))
+
+
+def test_get_or_fetch(tmp_path):
+    cache = ReleaseCache(tmp_path, ttl=3600)
+    fetch = Fetcher()
+    assert cache.get_or_fetch("owner/repo", fetch) == ROWS
+    assert cache.get_or_fetch("owner/repo", fetch) == ROWS
+    assert fetch.calls == 1
+    assert os.path.exists(tmp_path / "owner" / "repo.json")
+
+    expire(cache.path("owner/repo"))
+    cache.get_or_fetch("owner/repo", fetch)
+    assert fetch.calls == 2
+
+
+def test_update(tmp_path):
+    # expired releases are passed to update, rather than fetched again
+    cache = ReleaseCache(tmp_path, ttl=3600)
+    fetch = Fetcher()
+    new_row = ("1.2", datetime.datetime(2024, 3, 1, tzinfo=datetime.timezone.utc))
+    updates = []
+
+    def update(rows):
+        updates.append(rows)
+        return [new_row] + rows
+
+    assert cache.get_or_fetch("pkg", fetch, update=update) == ROWS
+    assert updates == []
+
+    expire(cache.path("pkg"))
+    assert cache.get_or_fetch("pkg", fetch, update=update) == [new_row] + ROWS
+    assert updates == [ROWS]
+    assert fetch.calls == 1
+    assert cache.read("pkg") == [new_row] + ROWS
+
+
+def test_fetch_errors_not_cached(tmp_path):
+    cache = ReleaseCache(tmp_path)
+
+    def fail():
+        raise LookupError("no releases")
+
+    with pytest.raises(LookupError):
+        cache.get_or_fetch("pkg", fail)
+    assert not os.path.exists(cache.path("pkg"))
+
+
+def test_offline(tmp_path):
+    cache = ReleaseCache(tmp_path)
+    fetch = Fetcher()
+    with pytest.raises(OfflineError, match="pkg"):
+        cache.get_or_fetch("pkg", fetch, offline=True)
+
+    cache.get_or_fetch("pkg", fetch)
+    expire(cache.path("pkg"))
+    assert cache.get_or_fetch("pkg", fetch, offline=True) == ROWS
+    assert fetch.calls == 1
@@ -129,6 +129,20 @@ class TestSPEC0StrictDate:
         drop = spec_strict.drop_date(package, r)
         assert drop == expected
 
+    def test_since(self):
+        fixed_now = datetime.datetime(2024, 1, 15, tzinfo=datetime.timezone.utc)
+        with patch(
+            "spec0.releasefilters.datetime.datetime", wraps=datetime.datetime
+        ) as mock_datetime:
+            mock_datetime.now.return_value = fixed_now
+            spec_strict = SPEC0StrictDate(n_months=24, python_override=True)
+            assert spec_strict.since("foo") == datetime.datetime(
+                2021, 12, 15, tzinfo=datetime.timezone.utc
+            )
+            assert spec_strict.since("python") == datetime.datetime(
+                2020, 12, 15, tzinfo=datetime.timezone.utc
+            )
+
 
 class TestSPEC0Quarter:
     def test_filter(self, releases):
@@ -174,3 +188,14 @@ class TestSPEC0Quarter:
         spec0 = SPEC0Quarter(n_months=24, python_override=python_override)
         drop = spec0.drop_date(package, r)
         assert drop == expected
+
+    def test_since(self):
+        fixed_now = datetime.datetime(2024, 1, 15, tzinfo=datetime.timezone.utc)
+        with patch(
+            "spec0.releasefilters.datetime.datetime", wraps=datetime.datetime
+        ) as mock_datetime:
+            mock_datetime.now.return_value = fixed_now
+            spec_quarter = SPEC0Quarter(n_months=24, python_override=False)
+            assert spec_quarter.since("foo") == datetime.datetime(
+                2021, 9, 15, tzinfo=datetime.timezone.utc
+            )
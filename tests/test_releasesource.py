@@ -1,14 +1,21 @@
+import bz2
+import json
 import pytest
 import responses
 import warnings
 import datetime
 import os
+import shutil
+import subprocess
+import threading
+import time
 from contextlib import ExitStack
 from unittest.mock import patch
 from packaging.version import Version
 
 from requires_internet import requires_internet
 
+from spec0.releasefilters import SPEC0StrictDate
 from spec0.releasesource import *
 
 MOCK_RESPONSE_VALID_ONLY = {
@@ -36,6 +43,60 @@ def assert_is_descending(dates):
     assert all(dates[i] >= dates[i + 1] for i in range(len(dates) - 1))
 
 
+PRUNE_ROWS = [
+    (10, "1.3.1"),
+    (9, "1.2.5"),
+    (8, "1.3.0"),
+    (7, "1.3.0rc1"),
+    (6, "1.2.4"),
+    (5, "1.2.0"),
+    (4, "1.1.9"),
+    (3, "1.1.0"),
+]
+
+
+@pytest.mark.parametrize(
+    "since, expected",
+    [
+        (None, PRUNE_ROWS),
+        # 1.3 and 1.2 are recent, so keep them back to their .0 releases
+        (9, PRUNE_ROWS[:3] + PRUNE_ROWS[4:6]),
+        # only 1.3 is recent
+        (10, PRUNE_ROWS[:1] + PRUNE_ROWS[2:3]),
+        # nothing is recent, so nothing can be skipped
+        (11, PRUNE_ROWS),
+    ],
+)
+def test_prune_old_minors(since, expected):
+    pruned = list(prune_old_minors(PRUNE_ROWS, since, key=lambda row: row))
+    assert pruned == expected
+
+
+def test_prune_old_minors_backport():
+    # the only recent release is a backport; the newer minor, 1.5, may still
+    # be the latest minor version, so it is kept
+    rows = [
+        (10, "1.4.9"),
+        (8, "1.5.1"),
+        (7, "1.5.0"),
+        (6, "1.4.8"),
+        (5, "1.4.0"),
+        (4, "1.3.0"),
+    ]
+    pruned = list(prune_old_minors(rows, 9, key=lambda row: row))
+    assert pruned == rows[:5]
+
+
+def test_prune_old_minors_lazy():
+    # rows after the last needed release are never consumed
+    def rows():
+        yield from PRUNE_ROWS[:3]
+        raise AssertionError("consumed too many rows")
+
+    pruned = list(prune_old_minors(rows(), 10, key=lambda row: row))
+    assert pruned == [PRUNE_ROWS[0], PRUNE_ROWS[2]]
+
+
 class TestPyPIReleaseSource:
     @responses.activate
     def test_valid_only_versions(self):
@@ -47,7 +108,7 @@ class TestPyPIReleaseSource:
             status=200,
         )
 
-        source = PyPIReleaseSource()
+        source = PyPIReleaseSource(api="json")
         releases = list(source.get_releases("example-lib-valid"))
 
         assert len(releases) == 3
@@ -74,7 +135,7 @@ class TestPyPIReleaseSource:
 
         with pytest.warns(UserWarning, match="Skipping invalid version"):
             warnings.simplefilter("always")
-            source = PyPIReleaseSource()
+            source = PyPIReleaseSource(api="json")
             releases = list(source.get_releases("example-lib-mixed"))
 
         assert len(releases) == 2
@@ -88,6 +149,22 @@ class TestPyPIReleaseSource:
             datetime.datetime(2023, 12, 15, 12, 0, tzinfo=datetime.timezone.utc),
         ]
 
+    @responses.activate
+    def test_aggregate_minor(self):
+        url = "https://pypi.org/pypi/example-lib-valid/json"
+        data = {
+            "releases": {
+                "2.1.1": [{"upload_time_iso_8601": "2023-04-01T12:00:00Z"}],
+                **MOCK_RESPONSE_VALID_ONLY["releases"],
+            }
+        }
+        responses.add(method=responses.GET, url=url, json=data, status=200)
+
+        source = PyPIReleaseSource(api="json")
+        releases = list(source.get_releases("example-lib-valid", aggregate="minor"))
+        versions = [r.version for r in releases]
+        assert versions == [Version("2.2.0"), Version("2.1.0"), Version("1.9.0")]
+
     @pytest.mark.parametrize(
         "status_code,exception_class",
         [
@@ -105,7 +182,7 @@ class TestPyPIReleaseSource:
             status=status_code,
         )
 
-        source = PyPIReleaseSource()
+        source = PyPIReleaseSource(api="json")
 
         with pytest.raises(exception_class):
             list(source.get_releases("nonexistent-package"))
@@ -125,7 +202,7 @@ class TestPyPIReleaseSource:
             status=200,
         )
 
-        source = PyPIReleaseSource()
+        source = PyPIReleaseSource(api="json")
 
         with pytest.raises(
             NoReleaseFound,
@@ -133,6 +210,138 @@ class TestPyPIReleaseSource:
         ):
             list(source.get_releases("package-with-no-releases"))
 
+    SIMPLE_URL = "https://pypi.org/simple/example-lib-valid/"
+    SIMPLE_RESPONSE = {
+        "meta": {"api-version": "1.1"},
+        "name": "example-lib-valid",
+        "files": [
+            {
+                "filename": "example_lib_valid-2.2.0-py3-none-any.whl",
+                "upload-time": "2023-03-03T12:30:00.000000Z",
+            },
+            {
+                "filename": "example-lib-valid-2.2.0.tar.gz",
+                "upload-time": "2023-03-03T12:00:00.000000Z",
+            },
+            {
+                "filename": "example-lib-valid-2.1.0.zip",
+                "upload-time": "2023-02-10T09:00:00Z",
+            },
+            {
+                "filename": "example_lib_valid-1.9.0-py2.7.egg",
+                "upload-time": "2023-01-15T20:00:00Z",
+            },
+            {"filename": "example-lib-valid-1.8.0.win32.exe", "upload-time": None},
+        ],
+    }
+
+    @responses.activate
+    def test_simple_api(self):
+        responses.add(
+            responses.GET,
+            self.SIMPLE_URL,
+            json=self.SIMPLE_RESPONSE,
+            content_type=PYPI_SIMPLE_CONTENT_TYPE,
+        )
+        source = PyPIReleaseSource()
+        releases = list(source.get_releases("Example.Lib_Valid"))
+
+        assert [r.version for r in releases] == [
+            Version("2.2.0"),
+            Version("2.1.0"),
+            Version("1.9.0"),
+        ]
+        assert releases[0].release_date == datetime.datetime(
+            2023, 3, 3, 12, 0, tzinfo=datetime.timezone.utc
+        )
+        request = responses.calls[0].request
+        assert request.headers["Accept"] == PYPI_SIMPLE_CONTENT_TYPE
+
+    @pytest.mark.parametrize(
+        "simple_response",
+        [
+            {"body": "<html></html>", "content_type": "text/html"},
+            {
+                "json": {"meta": {"api-version": "1.0"}, "files": []},
+                "content_type": PYPI_SIMPLE_CONTENT_TYPE,
+            },
+            {
+                "json": {
+                    "meta": {"api-version": "1.1"},
+                    "files": [{"filename": "example-lib-valid-2.2.0.tar.gz"}],
+                },
+                "content_type": PYPI_SIMPLE_CONTENT_TYPE,
+            },
+        ],
+    )
+    @responses.activate
+    def test_simple_api_fallback(self, simple_response):
+        responses.add(responses.GET, self.SIMPLE_URL, **simple_response)
+        responses.add(
+            responses.GET,
+            "https://pypi.org/pypi/example-lib-valid/json",
+            json=MOCK_RESPONSE_VALID_ONLY,
+        )
+        source = PyPIReleaseSource()
+        releases = list(source.get_releases("example-lib-valid"))
+        assert len(releases) == 3
+        assert len(responses.calls) == 2
+
+    @responses.activate
+    def test_cached_releases(self):
+        url = "https://pypi.org/pypi/example-lib-valid/json"
+        responses.add(responses.GET, url, json=MOCK_RESPONSE_VALID_ONLY)
+        first = list(PyPIReleaseSource(api="json").get_releases("example-lib-valid"))
+        # a new source, as in a new process, uses the same cache
+        source = PyPIReleaseSource(api="json")
+        assert list(source.get_releases("Example_Lib_Valid")) == first
+        assert len(responses.calls) == 1
+
+        source = PyPIReleaseSource(api="json", ttl=0)
+        assert list(source.get_releases("example-lib-valid")) == first
+        assert len(responses.calls) == 2
+
+    @responses.activate
+    def test_simple_api_not_found(self):
+        responses.add(responses.GET, self.SIMPLE_URL, status=404)
+        with pytest.raises(NoReleaseFound):
+            list(PyPIReleaseSource().get_releases("example-lib-valid"))
+        assert len(responses.calls) == 1
+
+    @pytest.mark.parametrize(
+        "filename, expected",
+        [
+            ("numpy-2.0.0-cp312-cp312-manylinux_2_17_x86_64.whl", "2.0.0"),
+            ("numpy-2.0.0rc1.tar.gz", "2.0.0rc1"),
+            ("scikit-learn-0.9.tar.bz2", "0.9"),
+            ("numpy-1.0-py2.5-linux.egg", "1.0"),
+            ("numpy-1.0.win32-py2.5.exe", None),
+            ("not-a-wheel.whl", None),
+            # old platform-specific builds are skipped
+            ("numpy-1.0.linux-x86_64.tar.gz", None),
+            ("foo-1.0.win32.zip", None),
+            ("foo-1.0.macosx-10.9.tar.gz", None),
+        ],
+    )
+    def test_version_from_filename(self, filename, expected):
+        assert version_from_filename(filename) == expected
+
+    @pytest.mark.parametrize(
+        "filename, project, expected",
+        [
+            ("foo-0.5-2.tar.gz", "foo", "0.5.post2"),
+            ("foo-1.0.macosx-10.9.tar.gz", "foo", None),
+            ("numpy-1.0.linux-x86_64.tar.gz", "numpy", None),
+            ("foo-1.0.win32.zip", "foo", None),
+            ("scikit-learn-0.9.tar.bz2", "scikit-learn", "0.9"),
+            ("Scikit_Learn-0.10.tar.gz", "scikit-learn", "0.10"),
+            ("numpy-1.0-py2.5-linux.egg", "numpy", "1.0"),
+            ("other-1.0.tar.gz", "foo", None),
+        ],
+    )
+    def test_version_from_filename_project(self, filename, project, expected):
+        assert version_from_filename(filename, project) == expected
+
     @pytest.mark.parametrize("package_name", ["pandas", "numpy", "scipy"])
     @requires_internet
     def test_integration_packages(self, package_name):
@@ -175,6 +384,81 @@ MOCK_REPODATA = {
 }
 
 
+def add_repodata_responses(url, body, suffix=""):
+    """Mock a channel that only publishes repodata with the given suffix."""
+    for other in [".zst", ".bz2", ""]:
+        if other != suffix:
+            responses.add(responses.GET, f"{url}{other}", status=404)
+    if suffix:
+        responses.add(responses.GET, f"{url}{suffix}", body=body)
+    else:
+        responses.add(responses.GET, url, json=body)
+
+
+class TestLocalPyPIReleaseSource:
+    def make_mirror(self, root, simple=None, json_data=None):
+        web = root / "web"
+        if simple is not None:
+            (web / "simple" / "example-lib-valid").mkdir(parents=True)
+            path = web / "simple" / "example-lib-valid" / "index.v1_json"
+            path.write_text(json.dumps(simple))
+        if json_data is not None:
+            (web / "json").mkdir(parents=True)
+            (web / "json" / "example-lib-valid").write_text(json.dumps(json_data))
+        return web
+
+    @pytest.mark.parametrize("layout", ["simple", "json"])
+    @pytest.mark.parametrize("root", ["mirror", "web", "url"])
+    def test_get_releases(self, tmp_path, layout, root):
+        if layout == "simple":
+            web = self.make_mirror(
+                tmp_path, simple=TestPyPIReleaseSource.SIMPLE_RESPONSE
+            )
+        else:
+            web = self.make_mirror(tmp_path, json_data=MOCK_RESPONSE_VALID_ONLY)
+        root = {"mirror": tmp_path, "web": web, "url": tmp_path.as_uri()}[root]
+
+        source = LocalPyPIReleaseSource(root)
+        releases = list(source.get_releases("Example.Lib_Valid"))
+
+        assert [r.version for r in releases] == [
+            Version("2.2.0"),
+            Version("2.1.0"),
+            Version("1.9.0"),
+        ]
+        assert releases[0].release_date == datetime.datetime(
+            2023, 3, 3, 12, 0, tzinfo=datetime.timezone.utc
+        )
+
+    def test_not_a_pypi_source(self, tmp_path):
+        # it shares the parsing with PyPIReleaseSource, but nothing that
+        # needs a session or a cache
+        self.make_mirror(tmp_path, json_data=MOCK_RESPONSE_VALID_ONLY)
+        source = LocalPyPIReleaseSource(tmp_path)
+        assert not isinstance(source, PyPIReleaseSource)
+        since = datetime.datetime(2023, 2, 1, tzinfo=datetime.timezone.utc)
+        releases = source.get_releases("example-lib-valid", "minor", since)
+        assert [r.version for r in releases] == [Version("2.2.0"), Version("2.1.0")]
+
+    def test_unusable_simple_page(self, tmp_path):
+        # a Simple API page without upload times falls back to the JSON file
+        simple = {"meta": {"api-version": "1.0"}, "files": []}
+        self.make_mirror(tmp_path, simple=simple, json_data=MOCK_RESPONSE_VALID_ONLY)
+        source = LocalPyPIReleaseSource(tmp_path)
+        releases = list(source.get_releases("example-lib-valid"))
+        assert len(releases) == 3
+
+    def test_not_found(self, tmp_path):
+        self.make_mirror(tmp_path, json_data=MOCK_RESPONSE_VALID_ONLY)
+        source = LocalPyPIReleaseSource(tmp_path)
+        with pytest.raises(NoReleaseFound, match="No package 'missing'"):
+            list(source.get_releases("missing"))
+
+    def test_not_a_directory(self, tmp_path):
+        with pytest.raises(ValueError, match="is not a directory"):
+            LocalPyPIReleaseSource(tmp_path / "missing")
+
+
 class TestCondaReleaseSource:
     @responses.activate
     def test_valid_only_versions(self):
@@ -183,12 +467,7 @@ class TestCondaReleaseSource:
         in descending release_date order, with no warnings.
         """
         url = "https://conda.anaconda.org/mock-channel/mock-platform/repodata.json"
-        responses.add(
-            method=responses.GET,
-            url=url,
-            json=MOCK_REPODATA,
-            status=200,
-        )
+        add_repodata_responses(url, MOCK_REPODATA)
 
         # Instantiate the source. It will download the mocked repodata.
         source = CondaReleaseSource(["mock-channel/mock-platform"])
@@ -214,6 +493,225 @@ class TestCondaReleaseSource:
             datetime.datetime(2023, 1, 15, 20, 0, tzinfo=datetime.timezone.utc),
         ]
 
+    @pytest.mark.parametrize(
+        "builds",
+        [
+            # 1.5 was first released before the cutoff, then rebuilt after it
+            [("2.0.0", 0, 100), ("1.5.0", 1, 300), ("1.5.0", 0, 800)],
+            # 1.5 is the latest minor, and its first build is the oldest
+            [("1.5.1", 0, 100), ("1.5.0", 1, 300), ("1.5.0", 0, 800)],
+        ],
+    )
+    @responses.activate
+    def test_since_with_rebuilds(self, builds):
+        # the cutoff gives the same result as looking at every build
+        url = "https://conda.anaconda.org/mock-channel/mock-platform/repodata.json"
+        now = datetime.datetime.now(datetime.timezone.utc)
+        packages = {
+            f"mypackage-{version}-{build}.tar.bz2": {
+                "name": "mypackage",
+                "version": version,
+                "timestamp": int(
+                    (now - datetime.timedelta(days=days)).timestamp() * 1000
+                ),
+            }
+            for version, build, days in builds + [("1.4.0", 0, 900)]
+        }
+        add_repodata_responses(url, {"packages": packages})
+        source = CondaReleaseSource(["mock-channel/mock-platform"])
+        filter_ = SPEC0StrictDate()
+
+        def supported(**kwargs):
+            releases = source.get_releases("mypackage", aggregate="minor", **kwargs)
+            return filter_.filter("mypackage", releases)
+
+        assert supported(since=filter_.since("mypackage")) == supported()
+
+    @responses.activate
+    def test_multiple_packages_and_platforms(self, tmp_path, monkeypatch):
+        """
+        Test that lookups only return the requested package, merging records
+        from ``packages`` and ``packages.conda`` across platforms.
+        """
+        monkeypatch.setattr("spec0.cacheddownload.CACHE_DIR", tmp_path)
+        base = "https://conda.anaconda.org/mock-channel"
+        other = {
+            "packages.conda": {
+                "mypackage-2.3.0-0.conda": {
+                    "name": "mypackage",
+                    "version": "2.3.0",
+                    "timestamp": 1680000000000,
+                },
+                "otherpackage-0.1.0-0.conda": {
+                    "name": "otherpackage",
+                    "version": "0.1.0",
+                    "timestamp": 1690000000000,
+                },
+            }
+        }
+        add_repodata_responses(f"{base}/linux-64/repodata.json", other)
+        add_repodata_responses(f"{base}/noarch/repodata.json", MOCK_REPODATA)
+
+        source = CondaReleaseSource(["mock-channel/linux-64", "mock-channel/noarch"])
+        versions = [r.version for r in source.get_releases("mypackage")]
+        assert versions == [
+            Version("2.3.0"),
+            Version("2.2.0"),
+            Version("2.1.0"),
+            Version("1.9.0"),
+        ]
+        versions = [r.version for r in source.get_releases("otherpackage")]
+        assert versions == [Version("0.1.0")]
+
+        with pytest.raises(NoReleaseFound):
+            list(source.get_releases("missingpackage"))
+
+    @pytest.mark.parametrize(
+        "suffix, compress",
+        [
+            (".zst", lambda data: pytest.importorskip("zstandard").compress(data)),
+            (".bz2", bz2.compress),
+        ],
+    )
+    @responses.activate
+    def test_compressed_repodata(self, tmp_path, monkeypatch, suffix, compress):
+        monkeypatch.setattr("spec0.cacheddownload.CACHE_DIR", tmp_path)
+        url = "https://conda.anaconda.org/mock-channel/mock-platform/repodata.json"
+        body = compress(json.dumps(MOCK_REPODATA).encode("utf-8"))
+        add_repodata_responses(url, body, suffix)
+
+        source = CondaReleaseSource(["mock-channel/mock-platform"])
+        versions = [r.version for r in source.get_releases("mypackage")]
+        assert versions == [Version("2.2.0"), Version("2.1.0"), Version("1.9.0")]
+        cachefile = (
+            tmp_path / "mock-channel" / "mock-platform" / f"repodata.json{suffix}"
+        )
+        assert cachefile.read_bytes() == body
+        assert responses.calls[-1].request.url == f"{url}{suffix}"
+
+        # with a fresh cache, the variants that aren't published aren't
+        # asked for again
+        n_calls = len(responses.calls)
+        source = CondaReleaseSource(["mock-channel/mock-platform"])
+        assert len(list(source.get_releases("mypackage"))) == 3
+        assert len(responses.calls) == n_calls
+
+    @responses.activate
+    def test_offline(self, tmp_path):
+        platform = tmp_path / "mock-channel" / "mock-platform"
+        platform.mkdir(parents=True)
+        (platform / "repodata.json").write_text(json.dumps(MOCK_REPODATA))
+        old = time.time() - 7 * 86400
+        os.utime(platform / "repodata.json", (old, old))
+
+        source = CondaReleaseSource(
+            ["mock-channel/mock-platform"], offline=True, cache_dir=tmp_path
+        )
+        assert len(list(source.get_releases("mypackage"))) > 0
+        with pytest.raises(OfflineError, match="other-platform"):
+            CondaReleaseSource(
+                ["mock-channel/other-platform"], offline=True, cache_dir=tmp_path
+            )
+        assert len(responses.calls) == 0
+
+    @responses.activate
+    def test_repodata_download_error(self, tmp_path, monkeypatch):
+        # errors other than "not found" are not hidden by the fallback
+        monkeypatch.setattr("spec0.cacheddownload.CACHE_DIR", tmp_path)
+        url = "https://conda.anaconda.org/mock-channel/mock-platform/repodata.json"
+        for suffix in [".zst", ".bz2", ""]:
+            responses.add(responses.GET, f"{url}{suffix}", status=500)
+
+        with pytest.raises(requests.HTTPError):
+            CondaReleaseSource(["mock-channel/mock-platform"])
+        assert len(responses.calls) == 1
+
+    @pytest.mark.parametrize(
+        "aggregate, expected",
+        [
+            ("version", [("2.0.0rc1", 30), ("1.1.0", 20), ("1.0.1", 15), ("1.0.0", 5)]),
+            ("minor", [("1.1.0", 20), ("1.0.0", 5)]),
+        ],
+    )
+    @responses.activate
+    def test_aggregated_releases(self, tmp_path, monkeypatch, aggregate, expected):
+        monkeypatch.setattr("spec0.cacheddownload.CACHE_DIR", tmp_path)
+        builds = [
+            ("1.0.0", 10),
+            ("1.0.0", 5),
+            ("1.0", 7),  # same version, different string
+            ("1.0.1", 15),
+            ("1.1.0", 25),
+            ("1.1.0", 20),
+            ("2.0.0rc1", 30),
+        ]
+        packages = {
+            f"mypackage-{version}-{idx}.tar.bz2": {
+                "name": "mypackage",
+                "version": version,
+                "timestamp": day * 86400000,
+            }
+            for idx, (version, day) in enumerate(builds)
+        }
+        url = "https://conda.anaconda.org/mock-channel/mock-platform/repodata.json"
+        add_repodata_responses(url, {"packages": packages})
+
+        source = CondaReleaseSource(["mock-channel/mock-platform"])
+        releases = list(source.get_releases("mypackage", aggregate=aggregate))
+        assert [(r.version, r.release_date) for r in releases] == [
+            (
+                Version(version),
+                datetime.datetime.fromtimestamp(day * 86400, datetime.timezone.utc),
+            )
+            for version, day in expected
+        ]
+        # the generic aggregation gives the same result
+        generic = aggregate_releases(source.get_releases("mypackage"), aggregate)
+        assert generic == releases
+
+        with pytest.raises(NoReleaseFound):
+            list(source.get_releases("missing", aggregate=aggregate))
+        with pytest.raises(ValueError, match="Unknown aggregate"):
+            list(source.get_releases("mypackage", aggregate="major"))
+
+    @pytest.mark.parametrize("max_workers", [1, 2])
+    @responses.activate
+    def test_concurrent_downloads(self, tmp_path, monkeypatch, max_workers):
+        monkeypatch.setattr("spec0.cacheddownload.CACHE_DIR", tmp_path)
+        in_flight = []
+        max_in_flight = []
+        lock = threading.Lock()
+
+        def callback(request):
+            with lock:
+                in_flight.append(request.url)
+                max_in_flight.append(len(in_flight))
+            time.sleep(0.2)
+            with lock:
+                in_flight.remove(request.url)
+            # each platform has one version, released at a different time
+            platform = request.url.split("/")[-2]
+            timestamp = {"p1": 3000, "p2": 1000, "p3": 2000}[platform]
+            version = platform[1:]
+            record = {"name": "pkg", "version": version, "timestamp": timestamp}
+            body = {"packages": {f"pkg-{platform}.tar.bz2": record}}
+            return (200, {}, json.dumps(body))
+
+        platforms = ["p1", "p2", "p3"]
+        for platform in platforms:
+            url = f"https://conda.anaconda.org/mock-channel/{platform}/repodata.json"
+            responses.add(responses.GET, f"{url}.zst", status=404)
+            responses.add(responses.GET, f"{url}.bz2", status=404)
+            responses.add_callback(responses.GET, url, callback=callback)
+
+        source = CondaReleaseSource(
+            [f"mock-channel/{platform}" for platform in platforms],
+            max_workers=max_workers,
+        )
+        assert max(max_in_flight) == max_workers
+        versions = [str(r.version) for r in source.get_releases("pkg")]
+        assert versions == ["1", "3", "2"]  # p1, p3, p2 in release order
+
     @pytest.mark.parametrize("package_name", ["python", "numpy", "scipy"])
     @requires_internet
     def test_integration_releases(self, package_name):
@@ -300,6 +798,27 @@ MOCK_GH_RESPONSE_PAGE1 = {
     }
 }
 
+# a new tag on top of those in MOCK_GH_RESPONSE_PAGE1
+MOCK_GH_RESPONSE_NEW_TAG = {
+    "data": {
+        "repository": {
+            "refs": {
+                "pageInfo": {"endCursor": "CURSOR1", "hasNextPage": True},
+                "nodes": [
+                    {
+                        "name": "3.1.0",
+                        "target": {"committedDate": "2024-02-01T12:00:00Z"},
+                    },
+                    {
+                        "name": "3.0.0",
+                        "target": {"committedDate": "2024-01-05T12:00:00Z"},
+                    },
+                ],
+            }
+        }
+    }
+}
+
 MOCK_GH_RESPONSE_PAGE2 = {
     "data": {
         "repository": {
@@ -426,6 +945,127 @@ class TestGitHubReleaseSource:
         release_dates = [r.release_date for r in releases]
         assert_is_descending(release_dates)
 
+    @responses.activate
+    def test_since_stops_pagination(self):
+        # everything needed is on the first page, so the second isn't fetched
+        url = "https://api.github.com/graphql"
+        responses.add(responses.POST, url, json=MOCK_GH_RESPONSE_PAGE1, status=200)
+
+        source = GitHubReleaseSource("FAKE_TOKEN")
+        since = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+        releases = list(source.get_releases("octocat/Hello-World", since=since))
+
+        assert [r.version for r in releases] == [Version("3.0.0")]
+        assert len(responses.calls) == 1
+
+    @responses.activate
+    def test_get_releases_batch(self):
+        # one request for the first page of every repository, then another
+        # only for the repository with more pages
+        url = "https://api.github.com/graphql"
+        page1 = MOCK_GH_RESPONSE_PAGE1["data"]["repository"]
+        page2 = MOCK_GH_RESPONSE_PAGE2["data"]["repository"]
+        other = MOCK_GH_RESPONSE_VALID_ONLY["data"]["repository"]
+        responses.add(
+            responses.POST,
+            url,
+            json={"data": {"r0": page1, "r1": other, "r2": None}},
+        )
+        responses.add(responses.POST, url, json={"data": {"r0": page2}})
+
+        source = GitHubReleaseSource("FAKE_TOKEN")
+        releases = source.get_releases_batch(
+            ["octocat/Hello-World", "octocat/Other", "octocat/Missing", "nope"]
+        )
+
+        assert set(releases) == {"octocat/Hello-World", "octocat/Other"}
+        assert [r.version for r in releases["octocat/Hello-World"]] == [
+            Version("3.0.0"),
+            Version("2.5.0"),
+            Version("2.2.0"),
+            Version("2.0.0"),
+        ]
+        assert [r.version for r in releases["octocat/Other"]] == [
+            Version("2.2.0"),
+            Version("2.1.0"),
+            Version("1.9.0"),
+        ]
+        assert len(responses.calls) == 2
+        first = json.loads(responses.calls[0].request.body)
+        assert "r2: repository" in first["query"]
+        second = json.loads(responses.calls[1].request.body)
+        assert "r1: repository" not in second["query"]
+        assert second["variables"] == {
+            "o0": "octocat",
+            "n0": "Hello-World",
+            "a0": "CURSOR1",
+        }
+
+        # the results are cached
+        again = source.get_releases_batch(["octocat/Other"])
+        assert again["octocat/Other"] == releases["octocat/Other"]
+        assert len(responses.calls) == 2
+
+    @responses.activate
+    def test_get_releases_batch_since(self):
+        # with a cutoff, repositories stop being paged through early
+        url = "https://api.github.com/graphql"
+        page1 = MOCK_GH_RESPONSE_PAGE1["data"]["repository"]
+        responses.add(responses.POST, url, json={"data": {"r0": page1}})
+
+        source = GitHubReleaseSource("FAKE_TOKEN")
+        since = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+        releases = source.get_releases_batch(["octocat/Hello-World"], since=since)
+
+        assert [r.version for r in releases["octocat/Hello-World"]] == [
+            Version("3.0.0")
+        ]
+        assert len(responses.calls) == 1
+
+    @responses.activate
+    def test_sync_new_tags(self):
+        # once the cached tags expire, only tags newer than them are fetched
+        url = "https://api.github.com/graphql"
+        responses.add(responses.POST, url, json=MOCK_GH_RESPONSE_PAGE1)
+        responses.add(responses.POST, url, json=MOCK_GH_RESPONSE_PAGE2)
+        responses.add(responses.POST, url, json=MOCK_GH_RESPONSE_NEW_TAG)
+
+        source = GitHubReleaseSource("FAKE_TOKEN", ttl=0)
+        first = list(source.get_releases("octocat/Hello-World"))
+        assert len(responses.calls) == 2
+        second = list(source.get_releases("octocat/Hello-World"))
+        assert len(responses.calls) == 3
+
+        assert second[0] == Release(
+            Version("3.1.0"),
+            datetime.datetime(2024, 2, 1, 12, 0, tzinfo=datetime.timezone.utc),
+        )
+        assert second[1:] == first
+
+    @responses.activate
+    def test_sync_new_tags_batch(self):
+        url = "https://api.github.com/graphql"
+        page1 = MOCK_GH_RESPONSE_PAGE1["data"]["repository"]
+        page2 = MOCK_GH_RESPONSE_PAGE2["data"]["repository"]
+        new_tag = MOCK_GH_RESPONSE_NEW_TAG["data"]["repository"]
+        responses.add(responses.POST, url, json={"data": {"r0": page1}})
+        responses.add(responses.POST, url, json={"data": {"r0": page2}})
+        responses.add(responses.POST, url, json={"data": {"r0": new_tag}})
+
+        source = GitHubReleaseSource("FAKE_TOKEN", ttl=0)
+        first = source.get_releases_batch(["octocat/Hello-World"])
+        second = source.get_releases_batch(["octocat/Hello-World"])
+
+        assert len(responses.calls) == 3
+        versions = [r.version for r in second["octocat/Hello-World"]]
+        assert versions[0] == Version("3.1.0")
+        assert second["octocat/Hello-World"][1:] == first["octocat/Hello-World"]
+
+    def test_get_releases_batch_offline(self):
+        source = GitHubReleaseSource("FAKE_TOKEN", offline=True)
+        with pytest.raises(OfflineError):
+            source.get_releases_batch(["octocat/Hello-World"])
+
     @pytest.mark.skipif(
         not os.environ.get("GITHUB_TOKEN"), reason="GITHUB_TOKEN not set"
     )
@@ -512,6 +1152,94 @@ def make_release(version: str, date_str: str):
     return Release(Version(version), dt)
 
 
+@pytest.mark.skipif(shutil.which("git") is None, reason="git not installed")
+class TestGitReleaseSource:
+    @staticmethod
+    def git(repo, *args, date=None):
+        env = dict(os.environ)
+        if date is not None:
+            env["GIT_AUTHOR_DATE"] = env["GIT_COMMITTER_DATE"] = date
+        subprocess.run(
+            ["git", "-C", str(repo), "-c", "user.name=Test", "-c", "user.email=t@t"]
+            + list(args),
+            check=True,
+            capture_output=True,
+            env=env,
+        )
+
+    @pytest.fixture
+    def repo(self, tmp_path):
+        repo = tmp_path / "repo"
+        repo.mkdir()
+        self.git(repo, "init", "-q")
+        tags = [
+            ("1.9.0", "2023-01-15T20:00:00+00:00", False),
+            ("not-a-version", "2023-02-01T00:00:00+00:00", False),
+            ("2.1.0", "2023-02-10T10:00:00+01:00", True),
+            ("2.2.0", "2023-03-03T12:00:00+00:00", False),
+        ]
+        for name, date, annotated in tags:
+            self.git(repo, "commit", "-q", "--allow-empty", "-m", name, date=date)
+            if annotated:
+                self.git(repo, "tag", "-a", "-m", name, name, date=date)
+            else:
+                self.git(repo, "tag", name)
+        return repo
+
+    def test_get_releases(self, repo):
+        source = GitReleaseSource({"example": repo})
+        with pytest.warns(UserWarning, match="Skipping invalid version"):
+            releases = list(source.get_releases("example"))
+
+        assert releases == [
+            Release(
+                Version("2.2.0"),
+                datetime.datetime(2023, 3, 3, 12, 0, tzinfo=datetime.timezone.utc),
+            ),
+            Release(
+                Version("2.1.0"),
+                datetime.datetime(2023, 2, 10, 9, 0, tzinfo=datetime.timezone.utc),
+            ),
+            Release(
+                Version("1.9.0"),
+                datetime.datetime(2023, 1, 15, 20, 0, tzinfo=datetime.timezone.utc),
+            ),
+        ]
+
+    def test_repository_path_as_package(self, repo):
+        source = GitReleaseSource()
+        with pytest.warns(UserWarning, match="Skipping invalid version"):
+            releases = list(source.get_releases(str(repo), aggregate="minor"))
+        assert [r.version for r in releases] == [
+            Version("2.2.0"),
+            Version("2.1.0"),
+            Version("1.9.0"),
+        ]
+
+    def test_not_a_repository(self, tmp_path):
+        source = GitReleaseSource({"example": tmp_path})
+        with pytest.raises(NoReleaseFound, match="Unable to list tags"):
+            list(source.get_releases("example"))
+
+    def test_git_not_found(self, tmp_path):
+        source = GitReleaseSource(
+            {"example": tmp_path}, git=str(tmp_path / "no-such-git")
+        )
+        with pytest.raises(GitError, match="Unable to run"):
+            list(source.get_releases("example"))
+
+    def test_unknown_package(self):
+        source = GitReleaseSource()
+        with pytest.raises(NoReleaseFound, match="No git repository"):
+            list(source.get_releases("example"))
+
+    def test_no_tags(self, tmp_path):
+        self.git(tmp_path, "init", "-q")
+        source = GitReleaseSource({"example": tmp_path})
+        with pytest.raises(NoReleaseFound, match="No releases found"):
+            list(source.get_releases("example"))
+
+
 class TestDefaultReleaseSource:
     def test_get_releases_github(self):
         with ExitStack() as stack:
@@ -532,7 +1260,11 @@ class TestDefaultReleaseSource:
             )
 
             source = DefaultReleaseSource("fake-token")
+            mock_github_cls.assert_not_called()
             releases = list(source.get_releases("somegithub/repo"))
+            mock_github_cls.assert_called_once_with(
+                "fake-token", session=source.session, offline=False, ttl=3600
+            )
 
             assert len(releases) == 1
             assert releases[0].version == Version("1.0.0")
@@ -568,6 +1300,8 @@ class TestDefaultReleaseSource:
             mock_github.get_releases.assert_not_called()
             mock_pypi.get_releases.assert_called_once()
             mock_conda_cls.return_value.get_releases.assert_not_called()
+            # the conda source (which downloads repodata) is never created
+            mock_conda_cls.assert_not_called()
 
     def test_get_releases_conda(self):
         with ExitStack() as stack:
@@ -601,6 +1335,26 @@ class TestDefaultReleaseSource:
             mock_pypi.get_releases.assert_called_once()
             mock_conda.get_releases.assert_called_once()
 
+    def test_get_releases_aggregate(self):
+        with ExitStack() as stack:
+            mock_github_cls = stack.enter_context(
+                patch("spec0.releasesource.GitHubReleaseSource")
+            )
+            mock_pypi_cls = stack.enter_context(
+                patch("spec0.releasesource.PyPIReleaseSource")
+            )
+            mock_github_cls.return_value.is_github_package.return_value = False
+            mock_pypi = mock_pypi_cls.return_value
+            mock_pypi.get_releases.return_value = iter(
+                [make_release("2.0.0", "2022-01-01T00:00:00")]
+            )
+
+            source = DefaultReleaseSource("fake-token")
+            releases = list(source.get_releases("package", aggregate="minor"))
+
+            assert len(releases) == 1
+            mock_pypi.get_releases.assert_called_once_with("package", aggregate="minor")
+
     def test_get_releases_fail(self):
         with ExitStack() as stack:
             mock_github_cls = stack.enter_context(
@@ -637,3 +1391,19 @@ class TestDefaultReleaseSource:
 
         with pytest.raises(ValueError, match="GitHub token not provided"):
             list(source.get_releases("someuser/someproject"))
+
+    @responses.activate
+    def test_offline_uses_cached_conda(self, tmp_path, monkeypatch):
+        monkeypatch.setattr("spec0.cacheddownload.CACHE_DIR", tmp_path)
+        for platform in ["linux-64", "noarch"]:
+            path = tmp_path / "conda-forge" / platform
+            path.mkdir(parents=True)
+            (path / "repodata.json").write_text(json.dumps(MOCK_REPODATA))
+
+        source = DefaultReleaseSource(offline=True)
+        versions = [r.version for r in source.get_releases("mypackage")]
+        assert Version("2.2.0") in versions
+        assert len(responses.calls) == 0
+
+        with pytest.raises(OfflineError):
+            list(source.get_releases("owner/repo"))
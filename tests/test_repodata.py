@@ -0,0 +1,210 @@
+import bz2
+import io
+import json
+import os
+
+import pytest
+
+from spec0.repodata import *
+
+MOCK_REPODATA = {
+    "info": {"subdir": "noarch"},
+    "packages": {
+        "mypackage-2.2.0-0.tar.bz2": {
+            "build": "0",
+            "depends": ["python >=3.9", "numpy"],
+            "name": "mypackage",
+            "version": "2.2.0",
+            "timestamp": 1677844800000,
+        },
+        "mypackage-2.1.0-0.tar.bz2": {
+            "name": "mypackage",
+            "version": "2.1.0",
+        },
+    },
+    "packages.conda": {
+        "other-1.0-0.conda": {
+            "name": "other",
+            "version": "1.0",
+            "timestamp": 1676019600000,
+            "size": 12345,
+        },
+    },
+    "removed": ["old-0.1-0.tar.bz2"],
+    "repodata_version": 1,
+}
+
+EXPECTED_RECORDS = [
+    RepodataRecord("mypackage-2.2.0-0.tar.bz2", "mypackage", "2.2.0", 1677844800000),
+    RepodataRecord("mypackage-2.1.0-0.tar.bz2", "mypackage", "2.1.0", None),
+    RepodataRecord("other-1.0-0.conda", "other", "1.0", 1676019600000),
+]
+
+
+@pytest.mark.parametrize("indent", [None, 1])
+@pytest.mark.parametrize("chunk_size", [1, 7, 65536])
+def test_iter_repodata_records(indent, chunk_size):
+    # small chunk sizes make sure values split across reads are handled
+    stream = io.StringIO(json.dumps(MOCK_REPODATA, indent=indent))
+    records = list(iter_repodata_records(stream, chunk_size=chunk_size))
+    assert records == EXPECTED_RECORDS
+
+
+@pytest.mark.parametrize(
+    "data, expected",
+    [
+        ({}, []),
+        ({"packages": {}, "packages.conda": {}}, []),
+        ({"repodata_version": 12345, "packages": {}}, []),
+    ],
+)
+def test_iter_repodata_records_empty(data, expected):
+    stream = io.StringIO(json.dumps(data))
+    assert list(iter_repodata_records(stream, chunk_size=2)) == expected
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "",
+        "[]",
+        '{"packages": {"a": {"name": "a"}',
+        '{"packages": {"a": {"name": "a"}} "x"}',
+    ],
+)
+def test_iter_repodata_records_invalid(text):
+    with pytest.raises(ValueError):
+        list(iter_repodata_records(io.StringIO(text), chunk_size=4))
+
+
+@pytest.mark.parametrize(
+    "suffix, compress",
+    [
+        (".zst", lambda data: pytest.importorskip("zstandard").compress(data)),
+        (".bz2", bz2.compress),
+        ("", lambda data: data),
+    ],
+)
+def test_open_repodata(tmp_path, suffix, compress):
+    path = tmp_path / f"repodata.json{suffix}"
+    path.write_bytes(compress(json.dumps(MOCK_REPODATA).encode("utf-8")))
+    with open_repodata(path) as f:
+        assert list(iter_repodata_records(f)) == EXPECTED_RECORDS
+
+
+def test_compression_suffixes(monkeypatch):
+    assert compression_suffixes()[-2:] == [".bz2", ""]
+    monkeypatch.setattr("spec0.repodata.zstandard", None)
+    assert compression_suffixes() == [".bz2", ""]
+
+
+class TestReleaseStore:
+    def setup_method(self):
+        records = [
+            RepodataRecord("a-1.0-0.tar.bz2", "a", "1.0", 100),
+            RepodataRecord("b-2.0-0.tar.bz2", "b", "2.0", 300),
+            RepodataRecord("a-1.1-0.tar.bz2", "a", "1.1", 200),
+            RepodataRecord("a-1.1-1.tar.bz2", "a", "1.1", 250),
+            RepodataRecord("a-1.2-0.tar.bz2", "a", "1.2", None),
+            RepodataRecord("b-1.0-0.conda", "b", "1.0", 50),
+        ]
+        self.store = ReleaseStore.from_records(records)
+
+    def test_interning(self):
+        assert self.store.names == ["a", "b"]
+        assert sorted(self.store.versions) == ["1.0", "1.1", "2.0"]
+        # record without a timestamp is dropped
+        assert len(self.store) == 5
+        assert list(self.store.offsets) == [0, 3, 5]
+
+    @pytest.mark.parametrize(
+        "name, expected",
+        [
+            ("a", [("1.1", 250), ("1.1", 200), ("1.0", 100)]),
+            ("b", [("2.0", 300), ("1.0", 50)]),
+            ("c", []),
+        ],
+    )
+    def test_get(self, name, expected):
+        version_ids, timestamps = self.store.get(name)
+        rows = [
+            (self.store.versions[vid], ts) for vid, ts in zip(version_ids, timestamps)
+        ]
+        assert rows == expected
+        assert self.store.get_rows(name) == [(ts, v) for v, ts in expected]
+        assert (name in self.store) == bool(expected)
+
+    def test_empty(self):
+        store = ReleaseStore.from_records([])
+        assert len(store) == 0
+        assert list(store.offsets) == [0]
+        version_ids, timestamps = store.get("a")
+        assert len(version_ids) == len(timestamps) == 0
+
+    def test_save_load(self, tmp_path):
+        path = tmp_path / "index"
+        self.store.save(path, {"size": 1})
+        loaded = ReleaseStore.load(path, {"size": 1})
+        assert loaded.names == self.store.names
+        assert loaded.versions == self.store.versions
+        assert list(loaded.offsets) == list(self.store.offsets)
+        assert list(loaded.timestamps) == list(self.store.timestamps)
+        assert list(loaded.version_ids) == list(self.store.version_ids)
+        for name in ["a", "b", "c"]:
+            assert [list(col) for col in loaded.get(name)] == [
+                list(col) for col in self.store.get(name)
+            ]
+
+    def test_save_load_empty(self, tmp_path):
+        path = tmp_path / "index"
+        ReleaseStore.from_records([]).save(path, {})
+        loaded = ReleaseStore.load(path, {})
+        assert len(loaded) == 0
+        assert loaded.names == loaded.versions == []
+
+    @pytest.mark.parametrize("contents", [None, b"", b"not json\n", b'{"format": 0}\n'])
+    def test_load_invalid(self, tmp_path, contents):
+        path = tmp_path / "index"
+        if contents is not None:
+            path.write_bytes(contents)
+        assert ReleaseStore.load(path, {}) is None
+
+    def test_load_wrong_key(self, tmp_path):
+        path = tmp_path / "index"
+        self.store.save(path, {"size": 1})
+        assert ReleaseStore.load(path, {"size": 2}) is None
+
+
+def test_load_release_store(tmp_path, monkeypatch):
+    repodata = tmp_path / "repodata.json"
+    repodata.write_text(json.dumps(MOCK_REPODATA))
+    store = load_release_store(repodata)
+    assert store.names == ["mypackage", "other"]
+    assert (tmp_path / f"repodata.json{INDEX_SUFFIX}").exists()
+
+    # the second load should use the index, not parse the repodata
+    def fail(*args, **kwargs):
+        raise AssertionError("repodata should not be parsed")
+
+    with monkeypatch.context() as m:
+        m.setattr("spec0.repodata.iter_repodata_records", fail)
+        store = load_release_store(repodata)
+    assert store.names == ["mypackage", "other"]
+
+    # changing the repodata invalidates the index
+    new_record = {"name": "new", "version": "1.0", "timestamp": 1}
+    repodata.write_text(json.dumps({"packages": {"new-1.0-0.tar.bz2": new_record}}))
+    store = load_release_store(repodata)
+    assert store.names == ["new"]
+
+
+def test_index_key_uses_validators(tmp_path):
+    # touching a file doesn't change the key when the cache has an ETag
+    repodata = tmp_path / "repodata.json"
+    repodata.write_text("{}")
+    (tmp_path / "repodata.json.meta").write_text('{"etag": "abc"}')
+    key = index_key(repodata)
+    os.utime(repodata, (1, 1))
+    assert (
+        index_key(repodata) == key == {"size": 2, "etag": "abc", "last_modified": None}
+    )
@@ -0,0 +1,131 @@
+import hashlib
+
+import pytest
+import responses
+from packaging.version import Version
+
+from spec0.releasesource import CondaReleaseSource
+from spec0.shards import *
+
+msgpack = pytest.importorskip("msgpack")
+zstandard = pytest.importorskip("zstandard")
+
+SUBDIR_URL = "https://conda.anaconda.org/mock-channel/noarch"
+
+SHARDS = {
+    "mypackage": {
+        "packages": {
+            "mypackage-2.1.0-0.tar.bz2": {
+                "name": "mypackage",
+                "version": "2.1.0",
+                "timestamp": 1676019600000,
+                "sha256": b"\x00" * 32,
+            },
+        },
+        "packages.conda": {
+            "mypackage-2.2.0-0.conda": {
+                "name": "mypackage",
+                "version": "2.2.0",
+                "timestamp": 1677844800000,
+            },
+        },
+        "removed": [],
+    },
+    "other": {"packages": {}, "packages.conda": {}, "removed": []},
+}
+
+
+def pack(obj):
+    return zstandard.compress(msgpack.packb(obj))
+
+
+def add_sharded_channel(subdir_url=SUBDIR_URL, shards_base_url="shards/"):
+    """Mock a channel subdir that serves sharded repodata."""
+    index = {
+        "version": 1,
+        "info": {"base_url": "", "shards_base_url": shards_base_url},
+        "shards": {},
+    }
+    for name, shard in SHARDS.items():
+        data = pack(shard)
+        digest = hashlib.sha256(data).digest()
+        index["shards"][name] = digest
+        shard_url = f"{subdir_url}/shards/{digest.hex()}.msgpack.zst"
+        responses.add(responses.GET, shard_url, body=data)
+    responses.add(responses.GET, f"{subdir_url}/{SHARD_INDEX_NAME}", body=pack(index))
+
+
+class TestShardedRepodata:
+    @responses.activate
+    def test_get_rows(self, tmp_path):
+        add_sharded_channel()
+        repodata = ShardedRepodata(SUBDIR_URL, tmp_path)
+        assert "mypackage" in repodata
+        assert "missing" not in repodata
+        # only the index has been downloaded so far
+        assert len(responses.calls) == 1
+
+        rows = repodata.get_rows("mypackage")
+        assert rows == [(1677844800000, "2.2.0"), (1676019600000, "2.1.0")]
+        assert len(responses.calls) == 2
+        assert repodata.get_rows("other") == []
+        assert repodata.get_rows("missing") == []
+        assert len(responses.calls) == 3
+
+    @responses.activate
+    def test_shards_cached(self, tmp_path):
+        add_sharded_channel()
+        ShardedRepodata(SUBDIR_URL, tmp_path).get_rows("mypackage")
+        ShardedRepodata(SUBDIR_URL, tmp_path).get_rows("mypackage")
+        assert len(responses.calls) == 2
+
+    @responses.activate
+    def test_absolute_shards_base_url(self, tmp_path):
+        add_sharded_channel(shards_base_url=f"{SUBDIR_URL}/shards/")
+        repodata = ShardedRepodata(SUBDIR_URL, tmp_path)
+        assert len(repodata.get_records("mypackage")) == 2
+
+    @responses.activate
+    def test_not_available(self, tmp_path):
+        responses.add(responses.GET, f"{SUBDIR_URL}/{SHARD_INDEX_NAME}", status=404)
+        with pytest.raises(ShardsNotAvailable):
+            ShardedRepodata(SUBDIR_URL, tmp_path)
+
+    def test_missing_dependencies(self, tmp_path, monkeypatch):
+        monkeypatch.setattr("spec0.shards.msgpack", None)
+        assert not shards_supported()
+        with pytest.raises(ShardsNotAvailable, match="msgpack"):
+            ShardedRepodata(SUBDIR_URL, tmp_path)
+
+
+class TestCondaReleaseSourceShards:
+    @responses.activate
+    def test_sharded_channel(self, tmp_path, monkeypatch):
+        monkeypatch.setattr("spec0.cacheddownload.CACHE_DIR", tmp_path)
+        add_sharded_channel()
+        source = CondaReleaseSource(["mock-channel/noarch"], shards=True)
+        versions = [r.version for r in source.get_releases("mypackage")]
+        assert versions == [Version("2.2.0"), Version("2.1.0")]
+        # repodata.json was never requested
+        assert not any("repodata.json" in call.request.url for call in responses.calls)
+
+    @responses.activate
+    def test_fallback_to_repodata(self, tmp_path, monkeypatch):
+        monkeypatch.setattr("spec0.cacheddownload.CACHE_DIR", tmp_path)
+        add_sharded_channel()
+        url = "https://conda.anaconda.org/mock-channel/linux-64"
+        responses.add(responses.GET, f"{url}/{SHARD_INDEX_NAME}", status=404)
+        responses.add(responses.GET, f"{url}/repodata.json.zst", status=404)
+        responses.add(responses.GET, f"{url}/repodata.json.bz2", status=404)
+        record = {"name": "mypackage", "version": "2.3.0", "timestamp": 1680000000000}
+        responses.add(
+            responses.GET,
+            f"{url}/repodata.json",
+            json={"packages": {"mypackage-2.3.0-0.tar.bz2": record}},
+        )
+
+        source = CondaReleaseSource(
+            ["mock-channel/linux-64", "mock-channel/noarch"], shards=True
+        )
+        versions = [r.version for r in source.get_releases("mypackage")]
+        assert versions == [Version("2.3.0"), Version("2.2.0"), Version("2.1.0")]
@@ -1,4 +1,6 @@
-from packaging.version import Version
+import concurrent.futures
+
+from packaging.version import InvalidVersion, Version
 from packaging.specifiers import SpecifierSet
 
 import pytest
@@ -102,3 +104,48 @@ def test_major_minor_str(version_str, expected):
     v = Version(version_str)
     result = major_minor_str(v)
     assert result == expected
+
+
+class TestVersionCache:
+    def test_parse_interns(self):
+        cache = VersionCache()
+        version = cache.parse("1.2.3")
+        assert version == Version("1.2.3")
+        assert cache.parse("1.2.3") is version
+        assert len(cache) == 1
+
+    def test_invalid_cached(self, monkeypatch):
+        cache = VersionCache()
+        with pytest.raises(InvalidVersion):
+            cache.parse("not-a-version")
+
+        # the second failure doesn't parse again
+        def fail(version_str):
+            raise AssertionError("should not be parsed")
+
+        monkeypatch.setattr("spec0.utils.packaging.Version", fail)
+        with pytest.raises(InvalidVersion, match="not-a-version"):
+            cache.parse("not-a-version")
+
+    def test_bounded(self):
+        cache = VersionCache(maxsize=2)
+        first = cache.parse("1.0")
+        cache.parse("2.0")
+        cache.parse("1.0")  # most recently used
+        cache.parse("3.0")  # evicts 2.0
+        assert len(cache) == 2
+        assert cache.parse("1.0") is first
+        cache.clear()
+        assert len(cache) == 0
+
+    def test_threads(self):
+        cache = VersionCache()
+        with concurrent.futures.ThreadPoolExecutor(8) as executor:
+            results = list(executor.map(cache.parse, ["1.0"] * 100))
+        assert all(result is results[0] for result in results)
+
+
+def test_parse_version():
+    assert parse_version("2.0") is parse_version("2.0")
+    with pytest.raises(InvalidVersion):
+        parse_version("bad version")